@@ -21,6 +21,7 @@ class Agency(transitfeed.Agency):
   """Extension of transitfeed.Agency:
   - Overriding ValidateAgencyLang() for supporting BCP-47 agency_lang codes.
   """
+  __slots__ = ()
 
   # Overrides transitfeed.Agency.ValidateAgencyLang() and validates agency_lang
   # using the new pybcp47 module via extension_util.py
@@ -25,6 +25,7 @@ class FareAttribute(transitfeed.FareAttribute):
   """
 
   _FIELD_NAMES = transitfeed.FareAttribute._FIELD_NAMES + [ 'agency_id' ]
+  __slots__ = ('agency_id',)
 
   def ValidateAgencyId(self, problems):
     agencies = self._schedule.GetAgencyList()
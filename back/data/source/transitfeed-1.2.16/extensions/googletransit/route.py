@@ -28,6 +28,7 @@ class Route(transitfeed.Route):
   """
 
   _FIELD_NAMES = transitfeed.Route._FIELD_NAMES + [ 'co2_per_km' ]
+  __slots__ = ('co2_per_km',)
 
   _ROUTE_TYPES = dict(transitfeed.Route._ROUTE_TYPES.items() + {
     8: {'name':'Horse Carriage', 'max_speed':50},
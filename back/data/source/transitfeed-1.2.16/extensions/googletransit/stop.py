@@ -27,6 +27,7 @@ class Stop(transitfeed.Stop):
   """
 
   _FIELD_NAMES = transitfeed.Stop._FIELD_NAMES + ['vehicle_type']
+  __slots__ = ('vehicle_type',)
 
   LOCATION_TYPE_ENTRANCE = 2
 
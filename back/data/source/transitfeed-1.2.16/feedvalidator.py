@@ -139,6 +139,9 @@ class CountingConsoleProblemAccumulator(transitfeed.SimpleProblemAccumulator):
     self._notice_count = 0
     self._ignore_types = ignore_types or set()
 
+  def _IsReported(self, exception_class, type):
+    return exception_class.__name__ not in self._ignore_types
+
   def _Report(self, e):
     if e.__class__.__name__ in self._ignore_types:
       return
@@ -191,6 +194,13 @@ class BoundedProblemList(object):
       if self._count > self._size_bound:
         del self._exceptions[-1]
 
+  def IsFull(self):
+    return self._count >= self._size_bound
+
+  def AddDropped(self):
+    """Count a problem that is dropped without creating its exception."""
+    self._count += 1
+
   def _GetDroppedCount(self):
     return self._count - len(self._exceptions)
 
@@ -227,6 +237,19 @@ class LimitPerTypeProblemAccumulator(transitfeed.ProblemAccumulatorInterface):
   def HasNotices(self):
     return self._type_to_name_to_problist[TYPE_NOTICE]
 
+  def _IsReported(self, exception_class, type):
+    class_name = exception_class.__name__
+    if class_name in self._ignore_types:
+      return False
+    problist = self._type_to_name_to_problist[type][class_name]
+    if (problist.IsFull() and exception_class.__cmp__.im_func is
+        transitfeed.ExceptionWithContext.__cmp__.im_func):
+      # Problems that can't be compared are kept in the order they are
+      # reported so this one would be dropped by BoundedProblemList.Add.
+      problist.AddDropped()
+      return False
+    return True
+
   def _Report(self, e):
     if e.__class__.__name__ in self._ignore_types:
       return
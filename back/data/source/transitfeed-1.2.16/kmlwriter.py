@@ -523,27 +523,32 @@ class KMLWriter(object):
       parent: The parent ElementTree.Element instance.
       route: The transitfeed.Route instance.
       style_id: A style id string for the placemarks or None.
+      schedule: The transitfeed.Schedule instance of the route or None to use
+        the schedule of its trips.
 
     Returns:
       The Folder ElementTree.Element instance or None.
     """
     if not route.trips:
       return None
-    trips = list(route.trips)
-    trips.sort(key=lambda x: x.trip_id)
+    if schedule is None:
+      schedule = route.trips[0]._schedule
+    if self.date_filter:
+      active_trips = schedule.GetTripsActiveOnDate(self.date_filter)
+      trip_ids = [trip.trip_id for trip in route.trips
+                  if trip in active_trips]
+    else:
+      trip_ids = [trip.trip_id for trip in route.trips]
     trips_folder = self._CreateFolder(parent, 'Trips', visible=False)
-    for trip in trips:
-      if (self.date_filter and
-          not trip.service_period.IsActiveOn(self.date_filter)):
-        continue
-
+    # The stop times of the trips, in trip_id order, are read in one pass
+    for trip, stoptimes in schedule.IterStopTimesByTrip(trip_ids):
       if trip.trip_headsign:
         description = 'Headsign: %s' % trip.trip_headsign
       else:
         description = None
 
       coordinate_list = []
-      for secs, stoptime, tp in trip.GetTimeInterpolatedStops():
+      for secs, stoptime, tp in trip.GetTimeInterpolatedStops(stoptimes):
         if self.altitude_per_sec > 0:
           coordinate_list.append((stoptime.stop.stop_lon, stoptime.stop.stop_lat,
                                   (secs - 3600 * 4) * self.altitude_per_sec))
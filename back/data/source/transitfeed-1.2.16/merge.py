@@ -1420,12 +1420,35 @@ class TripMerger(DataSetMerger):
   def _ReportSameIdButNotMerged(self, trip_id, reason):
     pass
 
+  def __init__(self, feed_merger):
+    DataSetMerger.__init__(self, feed_merger)
+    # Map from schedule to its Schedule.IterStopTimesByTrip generator
+    self._stop_times_iters = {}
+
   def _GetIter(self, schedule):
-    return schedule.GetTripList()
+    # Trips are migrated in trip_id order, see _GetStopTimes
+    return sorted(schedule.GetTripList(), key=lambda trip: trip.trip_id)
 
   def _GetById(self, schedule, trip_id):
     return schedule.GetTrip(trip_id)
 
+  def _GetStopTimes(self, original_trip, schedule):
+    """Return the list of StopTime objects of original_trip.
+
+    Trips are migrated in trip_id order so the stop times of each schedule are
+    read in a single Schedule.IterStopTimesByTrip pass instead of a query for
+    each trip."""
+    stop_times_iter = self._stop_times_iters.get(schedule)
+    if stop_times_iter is None:
+      stop_times_iter = schedule.IterStopTimesByTrip()
+      self._stop_times_iters[schedule] = stop_times_iter
+    for trip, stop_times in stop_times_iter:
+      if trip is original_trip:
+        return stop_times
+    # original_trip was passed already so start a new pass for the next trip
+    del self._stop_times_iters[schedule]
+    return original_trip.GetStopTimes()
+
   def _MergeEntities(self, a, b):
     """Raises a MergeError because currently trips cannot be merged."""
     raise MergeError('Cannot merge trips')
@@ -1463,7 +1486,7 @@ class TripMerger(DataSetMerger):
       original_shape = schedule.GetShape(original_trip.shape_id)
       migrated_trip.shape_id = merge_map[original_shape].shape_id
 
-    for original_stop_time in original_trip.GetStopTimes():
+    for original_stop_time in self._GetStopTimes(original_trip, schedule):
       migrated_stop_time = transitfeed.StopTime(
           None,
           merge_map[original_stop_time.stop],
@@ -1492,6 +1515,7 @@ class TripMerger(DataSetMerger):
 
   def MergeDataSets(self):
     self._MergeSameId()
+    self._stop_times_iters = {}
     self.feed_merger.problem_reporter.MergeNotImplemented(self)
     return True
 
@@ -197,6 +197,8 @@ class ScheduleRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
 
     pattern_id_trip_dict = route.GetPatternIdTripDict()
     patterns = []
+    if date:
+      active_trips = schedule.GetTripsActiveOnDate(date)
 
     for pattern_id, trips in pattern_id_trip_dict.items():
       time_stops = trips[0].GetTimeStops()
@@ -207,10 +209,7 @@ class ScheduleRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
       # Iterating over a copy so we can remove from trips inside the loop
       trips_with_service = []
       for trip in trips:
-        service_id = trip.service_id
-        service_period = schedule.GetServicePeriod(service_id)
-
-        if date and not service_period.IsActiveOn(date):
+        if date and trip not in active_trips:
           continue
         trips_with_service.append(trip)
 
@@ -344,25 +343,27 @@ class ScheduleRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
 
   def handle_json_GET_boundboxstops(self, params):
     """Return a list of up to 'limit' stops within bounding box with 'n','e'
-    and 's','w' in the NE and SW corners. Does not handle boxes crossing
-    longitude line 180."""
+    and 's','w' in the NE and SW corners, spread over the box when more stops
+    are in it. Does not handle boxes crossing longitude line 180."""
     schedule = self.server.schedule
     n = float(params.get('n'))
     e = float(params.get('e'))
     s = float(params.get('s'))
     w = float(params.get('w'))
     limit = int(params.get('limit'))
-    stops = schedule.GetStopsInBoundingBox(north=n, east=e, south=s, west=w, n=limit)
+    stops = schedule.GetStopsInBoundingBox(north=n, east=e, south=s, west=w,
+                                           n=limit, sample=True)
     return [StopToTuple(s) for s in stops]
 
   def handle_json_GET_stopsearch(self, params):
+    """Return a list of the stops with 'q' in their id or name, best matches
+    first and at most 'limit' of them if it is given."""
     schedule = self.server.schedule
-    query = params.get('q', None).lower()
-    matches = []
-    for s in schedule.GetStopList():
-      if s.stop_id.lower().find(query) != -1 or s.stop_name.lower().find(query) != -1:
-        matches.append(StopToTuple(s))
-    return matches
+    query = params.get('q', None)
+    limit = params.get('limit', None)
+    if limit is not None:
+      limit = int(limit)
+    return [StopToTuple(s) for s in schedule.SearchStops(query, limit)]
 
   def handle_json_GET_stoptrips(self, params):
     """Given a stop_id and time in seconds since midnight return the next
@@ -372,18 +373,17 @@ class ScheduleRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
     time = int(params.get('time', 0))
     date = params.get('date', "")
 
-    time_trips = stop.GetStopTimeTrips(schedule)
-    time_trips.sort()  # OPT: use bisect.insort to make this O(N*ln(N)) -> O(N)
+    time_trips = stop.GetStopTimeTrips(schedule)  # Sorted by time
     # Keep the first 5 after param 'time'.
     # Need make a tuple to find correct bisect point
     time_trips = time_trips[bisect.bisect_left(time_trips, (time, 0)):]
     time_trips = time_trips[:5]
+    if date:
+      active_trips = schedule.GetTripsActiveOnDate(date)
     # TODO: combine times for a route to show next 2 departure times
     result = []
     for time, (trip, index), tp in time_trips:
-      service_id = trip.service_id
-      service_period = schedule.GetServicePeriod(service_id)
-      if date and not service_period.IsActiveOn(date):
+      if date and trip not in active_trips:
         continue
       headsign = None
       # Find the most recent headsign from the StopTime objects
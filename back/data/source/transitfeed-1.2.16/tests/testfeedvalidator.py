@@ -307,6 +307,17 @@ class FeedValidatorTestCase(util.TempDirTestCaseBase):
     self.assertMatchesRegex(filename, output_file.getvalue())
 
 
+class CreatedProblemRecorder(transitfeed.ProblemReporter):
+  """Record the class name of each exception passed to the accumulator."""
+  def __init__(self, accumulator):
+    transitfeed.ProblemReporter.__init__(self, accumulator)
+    self.created = []
+
+  def AddToAccumulator(self, e):
+    self.created.append(e.__class__.__name__)
+    transitfeed.ProblemReporter.AddToAccumulator(self, e)
+
+
 class LimitPerTypeProblemReporterTestCase(util.TestCase):
 
   def CreateLimitPerTypeProblemReporter(self, limit):
@@ -353,6 +364,28 @@ class LimitPerTypeProblemReporterTestCase(util.TestCase):
     self.assertProblemsAttribute(transitfeed.TYPE_WARNING,  "OtherProblem",
         "description", "w1 w2")
 
+  def testSkipDroppedAndIgnoredProblems(self):
+    """Problems that would be dropped are counted without creating them."""
+    accumulator = feedvalidator.LimitPerTypeProblemAccumulator(
+        2, ignore_types=['InvalidValue'])
+    self.problems = CreatedProblemRecorder(accumulator)
+
+    self.problems.InvalidValue('stop_id', 'x')
+    self.assertEquals(0, accumulator.ErrorCount())
+    for i in range(3):
+      self.problems.OtherProblem("e%i" % i)
+    self.assertEquals(3, accumulator.ErrorCount())
+    self.assertProblemsAttribute(transitfeed.TYPE_ERROR,  "OtherProblem",
+        "description", "e0 e1")
+    # Sorted problems may replace one that was kept so they are all created
+    for i in range(3):
+      self.problems.TooFastTravel("t%i" % i, "prev stop", "next stop",
+                                  1000.0 + i, 5, None)
+    self.assertEquals(6, accumulator.ErrorCount())
+    self.assertEquals(['OtherProblem', 'OtherProblem', 'TooFastTravel',
+                       'TooFastTravel', 'TooFastTravel'],
+                      self.problems.created)
+
   def testKeepUnsorted(self):
     """An imperfect test that insort triggers ExceptionWithContext.__cmp__."""
     # If ExceptionWithContext.__cmp__ doesn't trigger TypeError in
@@ -15,7 +15,10 @@
 # Unit tests for the loader module.
 from __future__ import absolute_import
 
+import codecs
+import os
 import re
+import sqlite3
 from StringIO import StringIO
 import tempfile
 from tests import util
@@ -169,6 +172,60 @@ class EndOfLineCheckerTestCase(util.TestCase):
     self.accumulator.AssertNoMoreExceptions()
 
 
+class ProblemListAccumulator(transitfeed.ProblemAccumulatorInterface):
+  """Keep a description of each reported problem."""
+  def __init__(self):
+    self.problems = []
+
+  def _Report(self, e):
+    self.problems.append((e.__class__.__name__, getattr(e, 'row_num', None),
+                          e.FormatProblem()))
+
+
+class BulkEndOfLineCheckerTestCase(util.TestCase):
+  TEXTS = [
+      "line1\nline2\n",
+      "line1\r\nline2\r\nline3",
+      "line1\nline2\r\nline3\nline4",
+      "1\n2\n3\n4\n5\n6\n7\r\n8\r\n9\r\n10\r\n11\r\n",
+      "line1\r\r\nline2",
+      "line1\nline2\r\nline3\r\r\r\n",
+      "line1\rline1b",
+      "line1\r",
+      "\n\r\n\n",
+      "a\x0cb\x0cc\nd\r\ne\xe2\x80\xa8f\xc2\x85\n\x0c\n",
+      "a\x0cb\r\nc\rd\n\xe2\x80\xa9",
+  ]
+
+  def CheckLines(self, checker_class, f):
+    accumulator = ProblemListAccumulator()
+    problems = transitfeed.ProblemReporter(accumulator)
+    checker = checker_class(f, "<StringIO>", problems)
+    lines = []
+    for line in checker:
+      lines.append((line, len(accumulator.problems)))
+    return lines, accumulator.problems
+
+  def testSameAsEndOfLineChecker(self):
+    for text in self.TEXTS:
+      expected = self.CheckLines(transitfeed.EndOfLineChecker, StringIO(text))
+      for chunk_size in (1, 2, 3, 5, len(text)):
+        chunks = [text[i:i + chunk_size]
+                  for i in range(0, len(text), chunk_size)]
+        self.assertEqual(
+            expected,
+            self.CheckLines(transitfeed.BulkEndOfLineChecker, chunks),
+            "%r in chunks of %d" % (text, chunk_size))
+
+  def testLargeChunksAreSliced(self):
+    class SmallBufferChecker(transitfeed.BulkEndOfLineChecker):
+      _BUFFER_SIZE = 3
+    for text in self.TEXTS:
+      expected = self.CheckLines(transitfeed.EndOfLineChecker, StringIO(text))
+      self.assertEqual(expected, self.CheckLines(SmallBufferChecker, [text]),
+                       "%r in slices of 3" % text)
+
+
 class LoadFromZipTestCase(util.TestCase):
   def runTest(self):
     loader = transitfeed.Loader(
@@ -729,6 +786,158 @@ class CsvDictTestCase(util.TestCase):
     self.accumulator.AssertNoMoreExceptions()
 
 
+class StreamingCsvDictTestCase(CsvDictTestCase):
+  """Runs the CsvDictTestCase tests with a streaming Loader."""
+  def setUp(self):
+    CsvDictTestCase.setUp(self)
+    self.loader = transitfeed.Loader(
+        problems=self.problems,
+        zip=self.zip,
+        streaming=True)
+    self.loader._STREAM_CHUNK_SIZE = 4
+
+  def testUtf16(self):
+    self.zip.writestr("test.txt",
+                      u"test_id,test_name\nid1,name1\n".encode("utf-16"))
+    results = list(self.loader._ReadCsvDict("test.txt",
+                                            ["test_id", "test_name"], [], []))
+    self.assertEquals(1, len(results))
+    self.assertEquals({"test_id": u"id1", "test_name": u"name1"},
+                      results[0][0])
+    e = self.accumulator.PopException("FileFormat")
+    self.assertTrue(e.FormatProblem().find("utf-16") != -1)
+    self.accumulator.AssertNoMoreExceptions()
+
+  def testUtf8Bom(self):
+    self.zip.writestr("test.txt",
+                      codecs.BOM_UTF8 + "test_id,test_name\nid1,name1\n")
+    results = list(self.loader._ReadCsvDict("test.txt",
+                                            ["test_id", "test_name"], [], []))
+    self.assertEquals([({"test_id": u"id1", "test_name": u"name1"}, 2,
+                        ["test_id", "test_name"], [u"id1", u"name1"])],
+                      results)
+    self.accumulator.AssertNoMoreExceptions()
+
+  def testNullAfterFirstChunk(self):
+    self.zip.writestr("test.txt", "test_id,test_name\nid1,na\0me1\n")
+    list(self.loader._ReadCsvDict("test.txt", ["test_id", "test_name"], [], []))
+    e = self.accumulator.PopException("FileFormat")
+    self.assertEquals("test.txt", e.file_name)
+    self.assertTrue(e.FormatProblem().find("at byte 25") != -1)
+    self.assertTrue(
+        e.FormatProblem().find(r"test_name\\nid1,na\\x00me1") != -1)
+    self.accumulator.AssertNoMoreExceptions()
+
+  def testNullInLaterChunk(self):
+    # The line with the null starts in an earlier chunk
+    self.zip.writestr("test.txt", "test_id,test_name,test_x\n"
+                      "id1,name1,x1\nid2,name2,x\0\nid3,name3,x3\n")
+    results = list(self.loader._ReadCsvDict(
+        "test.txt", ["test_id", "test_name", "test_x"], [], []))
+    self.assertEquals([({"test_id": u"id1", "test_name": u"name1",
+                         "test_x": u"x1"}, 2,
+                        ["test_id", "test_name", "test_x"],
+                        [u"id1", u"name1", u"x1"])],
+                      results)
+    e = self.accumulator.PopException("FileFormat")
+    self.assertTrue(e.FormatProblem().find("at byte 50") != -1)
+    self.accumulator.AssertNoMoreExceptions()
+
+  def testMissingFile(self):
+    results = list(self.loader._ReadCsvDict("test.txt", [], [], []))
+    self.assertEquals([], results)
+    e = self.accumulator.PopException("MissingFile")
+    self.assertEquals("test.txt", e.file_name)
+    self.accumulator.AssertNoMoreExceptions()
+
+
+class CsvColumnsTestCase(CsvDictTestCase):
+  """Runs the CsvDictTestCase tests with the rows of _ReadCsvColumns."""
+  def setUp(self):
+    CsvDictTestCase.setUp(self)
+    self.loader._ReadCsvDict = self.loader._IterCsvColumnRows
+
+  def testColumns(self):
+    self.zip.writestr("test.txt",
+                      "test_id,test_name\n"
+                      "id1, name1 \n"
+                      "id2,name2\n")
+    [(header, columns, row_nums, short_rows)] = list(
+        self.loader._IterCsvColumnBlocks(
+            "test.txt", ["test_id", "test_name"], [], []))
+    self.assertEquals(["test_id", "test_name"], header)
+    self.assertEquals([["id1", "id2"], ["name1", "name2"]], columns)
+    self.assertEquals([2, 3], row_nums)
+    self.assertEquals({}, short_rows)
+    self.accumulator.AssertNoMoreExceptions()
+
+  def testBlocks(self):
+    self.zip.writestr("test.txt",
+                      "test_id,test_name\n"
+                      "id1,name1\n"
+                      "\n"
+                      "id2\n"
+                      "id3,name3\n")
+    self.loader._CSV_BLOCK_SIZE = 2
+    blocks = list(self.loader._IterCsvColumnBlocks(
+        "test.txt", ["test_id", "test_name"], [], []))
+    self.assertEquals(
+        [(["test_id", "test_name"], [["id1", "id2"], ["name1", ""]], [2, 4],
+          {1: 1}),
+         (["test_id", "test_name"], [["id3"], ["name3"]], [5], {})],
+        blocks)
+    self.accumulator.PopException("OtherProblem")
+    self.accumulator.AssertNoMoreExceptions()
+
+  def testUnicodeError(self):
+    self.zip.writestr("test.txt",
+                      "test_id,test_name\n"
+                      "id1,name1\n"
+                      "id2,na\xffme2\n")
+    results = list(self.loader._ReadCsvDict("test.txt",
+                                            ["test_id", "test_name"], [], []))
+    self.assertEquals(2, len(results))
+    self.assertEquals(u"na\ufffdme2", results[1][0]["test_name"])
+    e = self.accumulator.PopInvalidValue("test_name")
+    self.assertEquals(3, e.row_num)
+    self.assertEquals(u"na\ufffdme2", e.value)
+    self.accumulator.AssertNoMoreExceptions()
+
+
+class InitStop(transitfeed.Stop):
+  def __init__(self, field_dict=None):
+    transitfeed.Stop.__init__(self, field_dict=field_dict)
+    self.stop_desc = 'Made by __init__'
+
+
+class FieldValuesFactoryTestCase(util.TestCase):
+  def assertSameObjects(self, object_class, names, values):
+    make_object = object_class._GetFieldValuesFactory(names)
+    expected = object_class(field_dict=dict(zip(names, values)))
+    made = make_object(values)
+    self.assertTrue(made.__class__ is object_class)
+    self.assertEqual(sorted(expected._IterSetAttributes()),
+                     sorted(made._IterSetAttributes()))
+
+  def testSameAsFieldDict(self):
+    self.assertSameObjects(transitfeed.Stop,
+                           ['stop_id', 'stop_name', 'stop_lat', 'stop_lon',
+                            'extra_column'],
+                           [u'S1', u'Stop', u'36.1', u'-117.2', u'extra'])
+    self.assertSameObjects(transitfeed.Trip,
+                           ['route_id', 'service_id', 'trip_id'],
+                           [u'R1', u'WE', u'T1'])
+    self.assertSameObjects(transitfeed.Route,
+                           ['route_id', 'route_type', 'route_short_name'],
+                           [u'R1', u'3'])
+    # Classes whose __init__ does more than set the values use it
+    self.assertSameObjects(transitfeed.Transfer,
+                           ['from_stop_id', 'to_stop_id', 'transfer_type'],
+                           [u'S1', u'S2', u''])
+    self.assertSameObjects(InitStop, ['stop_id', 'stop_desc'],
+                           [u'S1', u'Desc'])
+
+
 class ReadCsvTestCase(util.TestCase):
   def setUp(self):
     self.accumulator = util.RecordingProblemAccumulator(self)
@@ -786,6 +995,17 @@ class ReadCsvTestCase(util.TestCase):
     self.accumulator.AssertNoMoreExceptions()
 
 
+class StreamingReadCsvTestCase(ReadCsvTestCase):
+  """Runs the ReadCsvTestCase tests with a streaming Loader."""
+  def setUp(self):
+    ReadCsvTestCase.setUp(self)
+    self.loader = transitfeed.Loader(
+        problems=self.problems,
+        zip=self.zip,
+        streaming=True)
+    self.loader._STREAM_CHUNK_SIZE = 4
+
+
 class BasicParsingTestCase(util.TestCase):
   """Checks that we're getting the number of child objects that we expect."""
   def assertLoadedCorrectly(self, schedule):
@@ -839,3 +1059,399 @@ class BasicParsingTestCase(util.TestCase):
 class UndefinedStopAgencyTestCase(util.LoadTestCase):
   def runTest(self):
     self.ExpectInvalidValue('undefined_stop', 'stop_id')
+
+
+class BatchedStopTimesTestCase(util.MemoryZipTestCase):
+  def setUp(self):
+    super(BatchedStopTimesTestCase, self).setUp()
+    self.SetArchiveContents(
+        "stop_times.txt",
+        "trip_id,arrival_time,departure_time,stop_id,stop_sequence\n"
+        "AB1,10:00:00,10:00:00,BEATTY_AIRPORT,1\n"
+        "AB1,10:20:00,10:20:00,BULLFROG,2\n"
+        "AB1,10:22:00,10:22:00,NOSUCHSTOP,3\n"
+        "AB1,10:25:00,10:25:00,STAGECOACH,4\n")
+
+  def runTest(self):
+    self.CreateZip()
+    loader = transitfeed.Loader(problems=self.problems,
+                                extra_validation=True,
+                                zip=self.zip,
+                                stop_times_batch_size=2)
+    schedule = loader.Load()
+    e = self.accumulator.PopInvalidValue('stop_id', 'stop_times.txt')
+    self.assertEqual(4, e.row_num)
+    self.accumulator.AssertNoMoreExceptions()
+
+    stop_ids = [st.stop_id for st in schedule.GetTrip('AB1').GetStopTimes()]
+    self.assertEqual(['BEATTY_AIRPORT', 'BULLFROG', 'STAGECOACH'], stop_ids)
+    cursor = schedule._connection.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='index' "
+                   "ORDER BY name")
+    self.assertEqual([('stop_index',), ('trip_index',)], cursor.fetchall())
+
+
+class ParallelLoadTestCase(util.MemoryZipTestCase):
+  def setUp(self):
+    super(ParallelLoadTestCase, self).setUp()
+    (fd, self.tempfilepath) = tempfile.mkstemp(".zip")
+    os.close(fd)
+    self.SetArchiveContents(
+        "stop_times.txt",
+        "trip_id,arrival_time,departure_time,stop_id,stop_sequence,extra\n"
+        "AB1,10:00:00,10:00:00,BEATTY_AIRPORT,1,x\n"
+        "AB1,10:20:00,10:20:00,BULLFROG,2,x\n"
+        "AB1,10:22:00,10:22:00,NOSUCHSTOP,3,x\n"
+        "AB1,10:25:00,10:25:00,STAGECOACH,4,x\n")
+
+  def tearDown(self):
+    os.remove(self.tempfilepath)
+
+  def Load(self, **kwargs):
+    self.CreateZip()
+    self.zip.close()
+    open(self.tempfilepath, 'wb').write(self.zipfile.getvalue())
+    self.loader = transitfeed.Loader(self.tempfilepath,
+                                     problems=self.problems,
+                                     extra_validation=True,
+                                     parallel=2,
+                                     **kwargs)
+    return self.loader.Load()
+
+  def testLoad(self):
+    schedule = self.Load()
+    e = self.accumulator.PopException('UnrecognizedColumn')
+    self.assertEqual('extra', e.column_name)
+    e = self.accumulator.PopInvalidValue('stop_id', 'stop_times.txt')
+    self.assertEqual(4, e.row_num)
+    self.accumulator.AssertNoMoreExceptions()
+
+    self.assertEqual(['BEATTY_AIRPORT', 'BULLFROG', 'STAGECOACH'],
+                     [st.stop_id for st in
+                      schedule.GetTrip('AB1').GetStopTimes()])
+    self.assertEqual(3, len(schedule.GetStopList()))
+    self.assertTrue('stop_name' in schedule.GetTableColumns('stops'))
+
+  def testBatches(self):
+    self.SetArchiveContents(
+        "stop_times.txt",
+        "trip_id,arrival_time,departure_time,stop_id,stop_sequence\n"
+        "AB1,10:00:00,10:00:00,BEATTY_AIRPORT,1\n"
+        "AB1,10:20:00,10:20:00,BULLFROG,2\n"
+        "AB1,10:25:00,10:25:00,STAGECOACH\n"
+        "AB1,10:40:00,10:40:00,NOSUCHSTOP,4\n")
+    schedule = self.Load(stop_times_batch_size=1)
+    e = self.accumulator.PopException('OtherProblem')
+    self.assertEqual(4, e.row_num)
+    e = self.accumulator.PopInvalidValue('stop_sequence', 'stop_times.txt')
+    self.assertEqual(4, e.row_num)
+    e = self.accumulator.PopInvalidValue('stop_id', 'stop_times.txt')
+    self.assertEqual(5, e.row_num)
+    self.accumulator.PopException('UnusedStop')
+    self.accumulator.AssertNoMoreExceptions()
+    self.assertEqual([36000, 37200], [st.arrival_secs for st in
+                                      schedule.GetTrip('AB1').GetStopTimes()])
+
+  def testRouteIds(self):
+    # trips.txt is read by a worker and only once
+    read_files = []
+    iter_blocks = transitfeed.Loader._IterCsvColumnBlocks
+    def IterCsvColumnBlocks(loader, file_name, *args):
+      read_files.append(file_name)
+      return iter_blocks(loader, file_name, *args)
+    transitfeed.Loader._IterCsvColumnBlocks = IterCsvColumnBlocks
+    try:
+      schedule = self.Load(route_ids=['AB'])
+    finally:
+      transitfeed.Loader._IterCsvColumnBlocks = iter_blocks
+    self.accumulator.PopException('UnrecognizedColumn')
+    self.accumulator.PopInvalidValue('stop_id', 'stop_times.txt')
+    self.accumulator.AssertNoMoreExceptions()
+    self.assertEqual([], read_files)
+    self.assertEqual(['AB1'], schedule.trips.keys())
+    self.assertEqual(3, len(schedule.GetTrip('AB1').GetStopTimes()))
+
+
+class FilteredLoadTestCase(util.MemoryZipTestCase):
+  def setUp(self):
+    super(FilteredLoadTestCase, self).setUp()
+    self.SetArchiveContents(
+        "routes.txt",
+        "route_id,agency_id,route_short_name,route_long_name,route_type\n"
+        "AB,DTA,,Airport Bullfrog,3\n"
+        "BS,DTA,,Bullfrog Stagecoach,3\n")
+    self.SetArchiveContents(
+        "trips.txt",
+        "route_id,service_id,trip_id,shape_id\n"
+        "AB,FULLW,AB1,ABSHAPE\n"
+        "BS,WE,BS1,BSSHAPE\n")
+    self.SetArchiveContents(
+        "shapes.txt",
+        "shape_id,shape_pt_lat,shape_pt_lon,shape_pt_sequence\n"
+        "ABSHAPE,36.868446,-116.784582,1\n"
+        "ABSHAPE,36.88108,-116.81797,2\n"
+        "BSSHAPE,36.88108,-116.81797,1\n"
+        "BSSHAPE,36.915682,-116.751677,2\n")
+    self.SetArchiveContents(
+        "frequencies.txt",
+        "trip_id,start_time,end_time,headway_secs\n"
+        "BS1,10:00:00,12:00:00,600\n")
+    self.SetArchiveContents(
+        "stop_times.txt",
+        "trip_id,arrival_time,departure_time,stop_id,stop_sequence\n"
+        "AB1,10:00:00,10:00:00,BEATTY_AIRPORT,1\n"
+        "AB1,10:20:00,10:20:00,BULLFROG,2\n"
+        "BS1,10:00:00,10:00:00,BULLFROG,1\n"
+        "BS1,10:25:00,10:25:00,STAGECOACH,2\n")
+
+  def Load(self, **kwargs):
+    self.CreateZip()
+    loader = transitfeed.Loader(problems=self.problems, zip=self.zip,
+                                **kwargs)
+    schedule = loader.Load()
+    self.accumulator.AssertNoMoreExceptions()
+    return schedule
+
+  def testRouteIds(self):
+    schedule = self.Load(route_ids=['AB'])
+    self.assertEqual(['AB'], schedule.routes.keys())
+    self.assertEqual(['AB1'], schedule.trips.keys())
+    self.assertEqual(['ABSHAPE'], [s.shape_id for s in schedule.GetShapeList()])
+    self.assertEqual(2, len(schedule.GetTrip('AB1').GetStopTimes()))
+    self.assertEqual(3, len(schedule.GetStopList()))
+
+  def testAgencyIds(self):
+    schedule = self.Load(agency_ids=['OTHER'])
+    self.assertEqual([], schedule.GetAgencyList())
+    self.assertEqual({}, schedule.routes)
+    self.assertEqual({}, schedule.trips)
+    self.assertEqual([], schedule.GetShapeList())
+
+  def testEmptyFilters(self):
+    for kwargs in ({'route_ids': []}, {'agency_ids': []}, {'dates': []}):
+      schedule = self.Load(**kwargs)
+      self.assertEqual({}, schedule.trips, kwargs)
+      self.assertEqual([], schedule.GetShapeList(), kwargs)
+    self.assertEqual({}, self.Load(route_ids=[]).routes)
+    self.assertEqual([], self.Load(agency_ids=[]).GetAgencyList())
+
+  def testDates(self):
+    # Tuesday, only FULLW is active
+    schedule = self.Load(dates=['20070102'])
+    self.assertEqual(['AB1'], schedule.trips.keys())
+    self.assertEqual(['ABSHAPE'], [s.shape_id for s in schedule.GetShapeList()])
+    schedule = self.Load(dates=['20070102', '20070106'])
+    self.assertEqual(['AB1', 'BS1'], sorted(schedule.trips.keys()))
+    self.assertEqual(1, len(schedule.GetTrip('BS1').GetFrequencyTuples()))
+
+  def testBoundingBox(self):
+    schedule = self.Load(bounding_box=(36.8, -116.9, 36.9, -116.7))
+    self.assertEqual(['BEATTY_AIRPORT', 'BULLFROG'],
+                     sorted(s.stop_id for s in schedule.GetStopList()))
+    self.assertEqual(['AB1', 'BS1'], sorted(schedule.trips.keys()))
+    self.assertEqual(['BULLFROG'], [st.stop_id for st in
+                                    schedule.GetTrip('BS1').GetStopTimes()])
+    self.assertEqual(2, len(schedule.GetShapeList()))
+
+  def testBoundingBoxSkipsParentStation(self):
+    self.SetArchiveContents(
+        "stops.txt",
+        "stop_id,stop_name,stop_lat,stop_lon,location_type,parent_station\n"
+        "BEATTY_AIRPORT,Airport,36.868446,-116.784582,0,STATION\n"
+        "BULLFROG,Bullfrog,36.88108,-116.81797,0,\n"
+        "STAGECOACH,Stagecoach,36.915682,-116.751677,0,STATION\n"
+        "STATION,Station,36.95,-116.75,1,\n")
+    schedule = self.Load(bounding_box=(36.8, -116.9, 36.9, -116.7))
+    self.assertEqual(['BEATTY_AIRPORT', 'BULLFROG'],
+                     sorted(s.stop_id for s in schedule.GetStopList()))
+    self.assertFalse(schedule.GetStop('BEATTY_AIRPORT').parent_station)
+    schedule.Validate(self.problems, validate_children=False)
+    # BS1 only keeps its stop_time at BULLFROG
+    e = self.accumulator.PopException('OtherProblem')
+    self.assertTrue('BS1' in e.FormatProblem())
+    self.accumulator.AssertNoMoreExceptions()
+
+  def testAgencyIdsWithRouteWithoutAgencyId(self):
+    self.SetArchiveContents(
+        "routes.txt",
+        "route_id,route_short_name,route_long_name,route_type\n"
+        "AB,,Airport Bullfrog,3\n"
+        "BS,,Bullfrog Stagecoach,3\n")
+    schedule = self.Load(agency_ids=['DTA'])
+    self.assertEqual(['AB', 'BS'], sorted(schedule.routes.keys()))
+    schedule = self.Load(agency_ids=['OTHER'])
+    self.assertEqual({}, schedule.routes)
+
+    # With several agencies the route can't use the one left after filtering
+    self.SetArchiveContents(
+        "agency.txt",
+        "agency_id,agency_name,agency_url,agency_timezone\n"
+        "DTA,Demo Agency,http://google.com,America/Los_Angeles\n"
+        "OTHER,Other Agency,http://google.com,America/Los_Angeles\n")
+    self.CreateZip()
+    schedule = transitfeed.Loader(problems=self.problems, zip=self.zip,
+                                  agency_ids=['DTA']).Load()
+    self.assertEqual({}, schedule.routes)
+    self.assertEqual({}, schedule.trips)
+
+
+class SnapshotOtherStop(transitfeed.Stop):
+  pass
+
+
+class SnapshotCacheTestCase(util.MemoryZipTestCase):
+  def setUp(self):
+    super(SnapshotCacheTestCase, self).setUp()
+    self.snapshot_dir = tempfile.mkdtemp()
+    self.SetArchiveContents(
+        "transfers.txt",
+        "from_stop_id,to_stop_id,transfer_type\n"
+        "BULLFROG,BULLFROG,0\n")
+
+  def tearDown(self):
+    for file_name in os.listdir(self.snapshot_dir):
+      os.remove(os.path.join(self.snapshot_dir, file_name))
+    os.rmdir(self.snapshot_dir)
+
+  def Load(self, share_snapshots=False, **kwargs):
+    self.CreateZip()
+    loader = transitfeed.Loader(problems=self.problems,
+                                zip=self.zip,
+                                snapshot_cache_dir=self.snapshot_dir,
+                                share_snapshots=share_snapshots, **kwargs)
+    return loader.Load()
+
+  def testRestore(self):
+    schedule = self.Load()
+    self.assertEqual(1, len(os.listdir(self.snapshot_dir)))
+    restored = self.Load()
+    self.assertEqual(1, len(os.listdir(self.snapshot_dir)))
+
+    self.assertEqual(sorted(schedule.stops.keys()),
+                     sorted(restored.stops.keys()))
+    self.assertEqual(schedule.GetTableColumns('stops'),
+                     restored.GetTableColumns('stops'))
+    trip = restored.GetTrip('AB1')
+    self.assertTrue(trip in restored.GetRoute('AB').trips)
+    self.assertEqual(['BEATTY_AIRPORT', 'BULLFROG', 'STAGECOACH'],
+                     [st.stop_id for st in trip.GetStopTimes()])
+    self.assertTrue(trip.GetStopTimes()[0].stop is
+                    restored.GetStop('BEATTY_AIRPORT'))
+    self.assertEqual(1, len(restored.GetTransferList()))
+    self.assertTrue(restored.GetTransferList()[0]._schedule.stops is
+                    restored.stops)
+    self.assertEqual(['FULLW', 'WE'], sorted(restored.service_periods.keys()))
+    self.assertTrue(restored.GetServicePeriod('FULLW').IsActiveOn('20070101'))
+    restored.Validate(self.problems)
+    self.accumulator.AssertNoMoreExceptions()
+
+  def testSharedRestore(self):
+    self.Load()
+    restored = self.Load(share_snapshots=True)
+    other = self.Load(share_snapshots=True)
+    trip = restored.GetTrip('AB1')
+    self.assertEqual(['BEATTY_AIRPORT', 'BULLFROG', 'STAGECOACH'],
+                     [st.stop_id for st in trip.GetStopTimes()])
+    self.assertEqual(3, other.GetTrip('AB1').GetCountStopTimes())
+    self.assertEqual([(trip, 2)],
+                     restored.GetStop('BULLFROG')._GetTripSequence())
+    restored.Validate(self.problems)
+    self.accumulator.AssertNoMoreExceptions()
+    self.assertRaises(sqlite3.OperationalError, trip.ClearStopTimes)
+
+  def testSnapshotTables(self):
+    self.Load()
+    (file_name,) = os.listdir(self.snapshot_dir)
+    connection = sqlite3.connect(os.path.join(self.snapshot_dir, file_name))
+    cursor = connection.cursor()
+    cursor.execute("SELECT stop_name FROM stops WHERE stop_id='BULLFROG';")
+    self.assertEqual([(u'Bullfrog',)], cursor.fetchall())
+    cursor.execute("SELECT trips.trip_id, count(*) FROM trips "
+                   "JOIN stop_times ON trips.trip_id = stop_times.trip_id "
+                   "WHERE route_id='AB' GROUP BY trips.trip_id;")
+    self.assertEqual([(u'AB1', 3)], cursor.fetchall())
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='index' AND "
+                   "tbl_name IN ('stop_times', 'transfers') ORDER BY name;")
+    self.assertEqual([(u'stop_index',), (u'transfers_from_stop_id_to_stop_id_'
+                                         'index',), (u'trip_index',)],
+                     cursor.fetchall())
+    connection.close()
+
+  def testChangedFeed(self):
+    self.Load()
+    self.SetArchiveContents(
+        "stops.txt",
+        "stop_id,stop_name,stop_lat,stop_lon\n"
+        "BEATTY_AIRPORT,Airport,36.868446,-116.784582\n"
+        "BULLFROG,Bullfrog,36.88108,-116.81797\n"
+        "STAGECOACH,Stagecoach,36.915682,-116.751677\n")
+    schedule = self.Load()
+    self.assertEqual(2, len(os.listdir(self.snapshot_dir)))
+    self.assertEqual('Stagecoach', schedule.GetStop('STAGECOACH').stop_name)
+
+  def testChangedStopTimesStorage(self):
+    self.Load()
+    schedule = self.Load(stop_times_storage='array')
+    self.assertEqual(2, len(os.listdir(self.snapshot_dir)))
+    self.assertEqual(3, schedule.GetTrip('AB1').GetCountStopTimes())
+
+  def testChangedFactory(self):
+    self.Load()
+    gtfs_factory = transitfeed.GetGtfsFactory()
+    gtfs_factory.UpdateClass('Stop', SnapshotOtherStop)
+    schedule = self.Load(gtfs_factory=gtfs_factory)
+    self.assertEqual(2, len(os.listdir(self.snapshot_dir)))
+    self.assertTrue(isinstance(schedule.GetStop('BULLFROG'),
+                               SnapshotOtherStop))
+
+
+class ReloadTestCase(util.MemoryZipTestCase):
+  def setUp(self):
+    super(ReloadTestCase, self).setUp()
+    self.feed_dir = tempfile.mkdtemp()
+    self.feed_path = os.path.join(self.feed_dir, 'feed.zip')
+
+  def tearDown(self):
+    os.remove(self.feed_path)
+    os.rmdir(self.feed_dir)
+
+  def WriteFeed(self):
+    self.CreateZip()
+    self.zip.close()
+    feed_file = open(self.feed_path, 'wb')
+    feed_file.write(self.zipfile.getvalue())
+    feed_file.close()
+
+  def testReloadChangedFiles(self):
+    self.WriteFeed()
+    loader = transitfeed.Loader(self.feed_path, problems=self.problems)
+    schedule = loader.Load()
+    stop = schedule.GetStop('BULLFROG')
+    trip = schedule.GetTrip('AB1')
+    self.SetArchiveContents(
+        "routes.txt",
+        "route_id,agency_id,route_short_name,route_long_name,route_type\n"
+        "AB,DTA,,Airport Express,3\n")
+    self.WriteFeed()
+
+    self.assertTrue(loader.Reload() is schedule)
+    self.assertEqual('Airport Express', schedule.GetRoute('AB').route_long_name)
+    # Stops didn't change and trips are read again because they depend on routes
+    self.assertTrue(schedule.GetStop('BULLFROG') is stop)
+    self.assertFalse(schedule.GetTrip('AB1') is trip)
+    new_trip = schedule.GetTrip('AB1')
+    self.assertEqual([new_trip], schedule.GetRoute('AB').trips)
+    self.assertEqual(['BEATTY_AIRPORT', 'BULLFROG', 'STAGECOACH'],
+                     [st.stop_id for st in new_trip.GetStopTimes()])
+    schedule.Validate(self.problems)
+    self.accumulator.AssertNoMoreExceptions()
+
+  def testReloadUnchangedFeed(self):
+    self.WriteFeed()
+    loader = transitfeed.Loader(self.feed_path, problems=self.problems)
+    schedule = loader.Load()
+    trip = schedule.GetTrip('AB1')
+    loader.Reload()
+    self.assertTrue(schedule.GetTrip('AB1') is trip)
+    self.assertEqual(3, len(trip.GetStopTimes()))
+    self.accumulator.AssertNoMoreExceptions()
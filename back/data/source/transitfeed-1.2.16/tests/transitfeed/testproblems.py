@@ -54,6 +54,30 @@ class ProblemReporterTestCase(util.RedirectStdOutTestCaseBase):
     self.assertTrue(re.search(r"help, my context", self.this_stdout.getvalue()))
     self.assertTrue(re.search(r"filename.foo:23", self.this_stdout.getvalue()))
 
+  def testContextFunction(self):
+    accumulator = util.RecordingProblemAccumulator(self)
+    pr = transitfeed.ProblemReporter(accumulator)
+    calls = []
+    def GetContext():
+      calls.append(None)
+      return ('filename.foo', 23, [u'a', u'b'], [u'1', u'2'])
+    pr.SetFileContextFunction(GetContext)
+    self.assertEqual([], calls)
+    pr.OtherProblem('test string')
+    self.assertEqual(1, len(calls))
+    e = accumulator.PopException('OtherProblem')
+    self.assertEqual('filename.foo', e.file_name)
+    self.assertEqual(23, e.row_num)
+    pr.SetFileContext('other.foo', 2, [u'c'], [u'3'])
+    pr.OtherProblem('test string')
+    self.assertEqual('other.foo',
+                     accumulator.PopException('OtherProblem').file_name)
+    self.assertEqual(1, len(calls))
+    pr.SetFileContextFunction(GetContext)
+    pr.ClearContext()
+    self.assertEqual(None, pr.GetFileContext())
+    accumulator.AssertNoMoreExceptions()
+
   def testLongWord(self):
     # Make sure LineWrap doesn't puke
     pr = transitfeed.ProblemReporter()
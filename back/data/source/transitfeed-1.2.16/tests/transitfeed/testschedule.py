@@ -386,6 +386,175 @@ class GetServicePeriodsActiveEachDateTestCase(util.TestCase):
     self.assertEquals([sp1], date_services[1][1])
 
 
+class GetTripsActiveOnDateTestCase(util.MemoryZipTestCase):
+  def setUp(self):
+    util.MemoryZipTestCase.setUp(self)
+    self.SetArchiveContents(
+        "trips.txt",
+        "route_id,service_id,trip_id\n"
+        "AB,FULLW,AB1\n"
+        "AB,WE,AB2\n"
+        "AB,WE,AB3\n")
+    self.AppendToArchiveContents(
+        "stop_times.txt",
+        "AB2,09:00:00,09:00:00,BULLFROG,1\n"
+        "AB2,09:10:00,09:10:00,STAGECOACH,2\n")
+    self.SetArchiveContents(
+        "frequencies.txt",
+        "trip_id,start_time,end_time,headway_secs\n"
+        "AB3,08:00:00,09:00:00,1800\n")
+    self.schedule = self.MakeLoaderAndLoad(extra_validation=False)
+
+  def assertActiveTrips(self, trip_ids, date):
+    self.assertEqual(sorted(trip_ids),
+                     sorted(trip.trip_id for trip in
+                            self.schedule.GetTripsActiveOnDate(date)))
+
+  def testActiveTrips(self):
+    # Monday and Saturday
+    self.assertActiveTrips(['AB1'], '20070604')
+    self.assertActiveTrips(['AB1', 'AB2', 'AB3'], '20070609')
+    self.assertActiveTrips(['AB1', 'AB2', 'AB3'], date(2007, 6, 9))
+    self.assertActiveTrips([], '20110101')
+    self.assertActiveTrips([], '2007-06-09')
+    self.assertTrue(self.schedule.GetTripsActiveOnDate('20070609') is
+                    self.schedule.GetTripsActiveOnDate(date(2007, 6, 9)))
+
+  def testChanges(self):
+    self.assertActiveTrips(['AB1'], '20070604')
+    self.schedule.GetServicePeriod('WE').SetDateHasService('20070604')
+    self.assertActiveTrips(['AB1', 'AB2', 'AB3'], '20070604')
+    self.schedule.GetTrip('AB2').service_id = 'FULLW'
+    self.schedule.GetServicePeriod('WE').day_of_week[5] = False
+    self.assertActiveTrips(['AB1', 'AB2'], '20070609')
+
+    trip = self.schedule.GetRoute('AB').AddTrip(self.schedule, trip_id='AB4')
+    trip.service_id = 'WE'
+    self.assertActiveTrips(['AB1', 'AB2', 'AB3', 'AB4'], '20070610')
+
+  def testTripRuns(self):
+    self.assertEqual(
+        [(8 * 3600, 'AB3'), (8 * 3600 + 1800, 'AB3'), (9 * 3600, 'AB2'),
+         (10 * 3600, 'AB1')],
+        [(start_secs, trip.trip_id) for start_secs, trip in
+         self.schedule.GetTripRunsActiveOnDate('20070609')])
+    self.assertEqual([(10 * 3600, 'AB1')],
+                     [(start_secs, trip.trip_id) for start_secs, trip in
+                      self.schedule.GetTripRunsActiveOnDate('20070604')])
+
+
+class GenerateDateTripsDeparturesListTestCase(util.MemoryZipTestCase):
+  def runTest(self):
+    self.SetArchiveContents(
+        "trips.txt",
+        "route_id,service_id,trip_id\n"
+        "AB,FULLW,AB1\n"
+        "AB,WE,AB2\n"
+        "AB,WE,AB3\n")
+    self.AppendToArchiveContents(
+        "stop_times.txt",
+        "AB2,09:00:00,09:00:00,BULLFROG,1\n"
+        "AB2,09:10:00,09:10:00,STAGECOACH,2\n")
+    self.SetArchiveContents(
+        "frequencies.txt",
+        "trip_id,start_time,end_time,headway_secs\n"
+        "AB2,08:00:00,09:00:00,1800\n")
+    schedule = self.MakeLoaderAndLoad(extra_validation=False)
+    # AB3 has no stop_times, so it has one trip and -1 departures
+    self.assertEqual(
+        [(date(2007, 6, 8), 1, 2),
+         (date(2007, 6, 9), 4, 3),
+         (date(2007, 6, 10), 4, 3),
+         (date(2007, 6, 11), 1, 2)],
+        schedule.GenerateDateTripsDeparturesList(date(2007, 6, 8),
+                                                 date(2007, 6, 12)))
+    self.assertEqual(
+        [(date(2010, 12, 31), 1, 2), (date(2011, 1, 1), 0, 0)],
+        schedule.GenerateDateTripsDeparturesList(date(2010, 12, 31),
+                                                 date(2011, 1, 2)))
+    self.assertEqual(
+        [], schedule.GenerateDateTripsDeparturesList(date(2007, 6, 8),
+                                                     date(2007, 6, 8)))
+
+
+class IterStopTimesByTripTestCase(util.MemoryZipTestCase):
+  def setUp(self):
+    util.MemoryZipTestCase.setUp(self)
+    self.SetArchiveContents(
+        "trips.txt",
+        "route_id,service_id,trip_id\n"
+        "AB,FULLW,AB1\n"
+        "AB,FULLW,AB0\n"
+        "AB,FULLW,AB2\n"
+        "AB,FULLW,AB3\n")
+    self.AppendToArchiveContents(
+        "stop_times.txt",
+        "AB0,09:00:00,09:00:00,BULLFROG,1\n"
+        "AB3,11:10:00,11:10:00,STAGECOACH,5\n"
+        "AB3,11:00:00,11:00:00,BULLFROG,2\n")
+
+  def testAllTrips(self):
+    for storage in ('sqlite', 'array'):
+      self.CreateZip()
+      schedule = transitfeed.Loader(zip=self.zip, problems=self.problems,
+                                    stop_times_storage=storage).Load()
+      self.assertEqual(
+          [('AB0', ['BULLFROG']),
+           ('AB1', ['BEATTY_AIRPORT', 'BULLFROG', 'STAGECOACH']),
+           ('AB2', []),
+           ('AB3', ['BULLFROG', 'STAGECOACH'])],
+          [(trip.trip_id, [st.stop_id for st in stop_times])
+           for trip, stop_times in schedule.IterStopTimesByTrip()])
+      for trip, stop_times in schedule.IterStopTimesByTrip():
+        self.assertEqual([st.GetFieldValuesTuple(trip.trip_id)
+                          for st in trip.GetStopTimes()],
+                         [st.GetFieldValuesTuple(trip.trip_id)
+                          for st in stop_times])
+
+  def testSomeTrips(self):
+    schedule = self.MakeLoaderAndLoad(extra_validation=False)
+    self.assertEqual(
+        ['AB2', 'AB3'],
+        [trip.trip_id for trip, _ in
+         schedule.IterStopTimesByTrip(['AB3', 'AB2', 'AB3', 'unknown'])])
+    self.assertEqual([], list(schedule.IterStopTimesByTrip([])))
+
+
+class PatternIdTestCase(util.MemoryZipTestCase):
+  def runTest(self):
+    self.SetArchiveContents(
+        "trips.txt",
+        "route_id,service_id,trip_id\n"
+        "AB,FULLW,AB1\n"
+        "AB,FULLW,AB2\n"
+        "AB,FULLW,AB0\n"
+        "AB,FULLW,AB3\n")
+    self.AppendToArchiveContents(
+        "stop_times.txt",
+        "AB0,09:00:00,09:00:00,STAGECOACH,1\n"
+        "AB0,09:10:00,09:10:00,BULLFROG,2\n"
+        "AB2,11:00:00,11:00:00,BEATTY_AIRPORT,1\n"
+        "AB2,11:10:00,11:10:00,BULLFROG,2\n"
+        "AB2,11:20:00,11:20:00,STAGECOACH,3\n")
+    schedule = self.MakeLoaderAndLoad(extra_validation=False)
+    # Ids are given in trip_id order
+    self.assertEqual([0, 1, 1, 2], [schedule.GetTrip(trip_id).pattern_id
+                                    for trip_id in ('AB0', 'AB1', 'AB2', 'AB3')])
+    self.assertEqual(
+        ('STAGECOACH', 'BULLFROG'),
+        tuple(stop.stop_id for stop in schedule.GetPattern(0)))
+    self.assertEqual((), schedule.GetPattern(2))
+    self.assertEqual({0: ['AB0'], 1: ['AB1', 'AB2'], 2: ['AB3']},
+                     dict((pattern_id, sorted(t.trip_id for t in trips))
+                          for pattern_id, trips in
+                          schedule.GetRoute('AB').GetPatternIdTripDict().items()))
+
+    trip = schedule.GetTrip('AB3')
+    trip.AddStopTime(schedule.GetStop('STAGECOACH'), stop_time='12:00:00')
+    trip.AddStopTime(schedule.GetStop('BULLFROG'), stop_time='12:10:00')
+    self.assertEqual(0, trip.pattern_id)
+
+
 class DuplicateTripTestCase(util.ValidationTestCase):
   def runTest(self):
 
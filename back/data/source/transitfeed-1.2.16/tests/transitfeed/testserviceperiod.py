@@ -15,6 +15,7 @@
 # Unit tests for the serviceperiod module.
 from __future__ import absolute_import
 
+import cPickle as pickle
 import datetime
 from datetime import date
 from tests import util
@@ -295,6 +296,92 @@ class ServicePeriodTestCase(util.TestCase):
     self.assertFalse(period_empty.IsActiveOn('20071231', date(2007, 12, 31)))
     self.assertEquals(period_empty.ActiveDates(), [])
 
+  def testChangesAfterUse(self):
+    """Test that changing a period used before changes its active dates"""
+    period = transitfeed.ServicePeriod()
+    period.start_date = '20071226'
+    period.end_date = '20071231'
+    period.SetWeekdayService(True)
+    self.assertEquals(period.ActiveDates(),
+                      ['20071226', '20071227', '20071228', '20071231'])
+
+    period.day_of_week[5] = True
+    self.assertTrue(period.IsActiveOn('20071229'))
+    period.SetDateHasService('20071226', False)
+    self.assertFalse(period.IsActiveOn('20071226'))
+    del period.date_exceptions['20071226']
+    self.assertTrue(period.IsActiveOn('20071226'))
+    period.end_date = '20071228'
+    self.assertEquals(period.ActiveDates(),
+                      ['20071226', '20071227', '20071228'])
+    period.day_of_week = [False] * 7
+    self.assertEquals(period.ActiveDates(), [])
+
+    period.date_exceptions = {'20071227': (1, None)}
+    copied_period = pickle.loads(pickle.dumps(period, 2))
+    self.assertEquals(copied_period.ActiveDates(), ['20071227'])
+    copied_period.day_of_week[3] = True
+    self.assertEquals(copied_period.ActiveDates(), ['20071227'])
+    copied_period.day_of_week[2] = True
+    self.assertEquals(copied_period.ActiveDates(), ['20071226', '20071227'])
+    self.assertEquals(period.ActiveDates(), ['20071227'])
+
+  def testInvalidStartDate(self):
+    period = transitfeed.ServicePeriod()
+    period.start_date = '2007-12-26'
+    period.end_date = '20071231'
+    period.SetWeekdayService(True)
+    self.assertTrue(period.IsActiveOn('20071228'))
+    self.assertFalse(period.IsActiveOn('20071229'))
+
+  def testHasActiveDateInCommon(self):
+    weekdays = transitfeed.ServicePeriod()
+    weekdays.start_date = '20071201'
+    weekdays.end_date = '20071231'
+    weekdays.SetWeekdayService(True)
+    weekends = transitfeed.ServicePeriod()
+    weekends.start_date = '20071101'
+    weekends.end_date = '20080131'
+    weekends.SetWeekendService(True)
+    self.assertFalse(weekdays.HasActiveDateInCommon(weekends))
+    self.assertFalse(weekends.HasActiveDateInCommon(weekdays))
+
+    # Tuesday
+    weekends.SetDateHasService('20071225', True)
+    self.assertTrue(weekdays.HasActiveDateInCommon(weekends))
+    self.assertTrue(weekends.HasActiveDateInCommon(weekdays))
+    weekdays.SetDateHasService('20071225', False)
+    self.assertFalse(weekends.HasActiveDateInCommon(weekdays))
+
+    self.assertFalse(weekdays.HasActiveDateInCommon(
+        transitfeed.ServicePeriod()))
+
+  def testGetServicePeriodsActiveEachDate(self):
+    schedule = transitfeed.Schedule()
+    weekdays = transitfeed.ServicePeriod('WEEKDAY')
+    weekdays.start_date = '20071226'
+    weekdays.end_date = '20071231'
+    weekdays.SetWeekdayService(True)
+    schedule.AddServicePeriodObject(weekdays)
+    holiday = transitfeed.ServicePeriod('HOLIDAY')
+    holiday.SetDateHasService('20071225', True)
+    holiday.SetDateHasService('20071228', True)
+    schedule.AddServicePeriodObject(holiday)
+
+    dates = schedule.GetServicePeriodsActiveEachDate(date(2007, 12, 24),
+                                                     date(2007, 12, 30))
+    self.assertEquals(
+        [(d, sorted(p.service_id for p in periods)) for d, periods in dates],
+        [(date(2007, 12, 24), []),
+         (date(2007, 12, 25), ['HOLIDAY']),
+         (date(2007, 12, 26), ['WEEKDAY']),
+         (date(2007, 12, 27), ['WEEKDAY']),
+         (date(2007, 12, 28), ['HOLIDAY', 'WEEKDAY']),
+         (date(2007, 12, 29), [])])
+    self.assertEquals(
+        schedule.GetServicePeriodsActiveEachDate(date(2007, 12, 30),
+                                                 date(2007, 12, 30)), [])
+
 
 class OnlyCalendarDatesTestCase(util.LoadTestCase):
   def runTest(self):
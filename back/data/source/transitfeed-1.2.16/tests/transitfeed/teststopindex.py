@@ -0,0 +1,191 @@
+# Copyright (C) 2007 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Unit tests for the stopindex module.
+from __future__ import absolute_import
+
+import random
+
+import transitfeed
+from tests import util
+
+
+class StopGridIndexTestCase(util.TestCase):
+  def setUp(self):
+    rand = random.Random(20)
+    self.stops = []
+    for i in range(300):
+      stop = transitfeed.Stop(lat=36 + rand.random() * 0.5,
+                              lng=-117 + rand.random() * 0.5,
+                              name='Stop %d' % i, stop_id='S%d' % i)
+      self.stops.append(stop)
+    self.stops.append(transitfeed.Stop(name='Nowhere', stop_id='N'))
+
+  def assertSameAsScan(self, index, lat, lon, n, max_distance=None):
+    by_distance = sorted(
+        (transitfeed.ApproximateDistance(lat, lon, s.stop_lat, s.stop_lon), s)
+        for s in self.stops if s.stop_lat is not None)
+    expected = [s for d, s in by_distance
+                if max_distance is None or d <= max_distance][:n]
+    self.assertEqual([s.stop_id for s in expected],
+                     [s.stop_id for s in index.GetNearestStops(
+                         lat, lon, n, max_distance)])
+
+  def testNearestStops(self):
+    for cell_size in (None, 0.01, 0.05, 2):
+      index = transitfeed.StopGridIndex(self.stops, cell_size=cell_size)
+      self.assertEqual(300, len(index))
+      for lat, lon in ((36.2, -116.8), (36, -117), (35, -118), (40, -116.7)):
+        for n in (1, 5, 50, 400):
+          self.assertSameAsScan(index, lat, lon, n)
+        self.assertSameAsScan(index, lat, lon, 20, max_distance=5000)
+      self.assertEqual([], index.GetNearestStops(36.2, -116.8, 0))
+    self.assertEqual([], transitfeed.StopGridIndex().GetNearestStops(0, 0))
+
+  def testNearestStopsAcrossAntimeridian(self):
+    rand = random.Random(21)
+    self.stops = [transitfeed.Stop(lat=-20 + rand.random() * 10,
+                                   lng=rand.choice((-180, 170)) +
+                                   rand.random() * 10, stop_id='A%d' % i)
+                  for i in range(200)]
+    self.stops.append(transitfeed.Stop(lat=-15, lng=-169.4, stop_id='EAST'))
+    for cell_size in (None, 0.3, 2, 7):
+      index = transitfeed.StopGridIndex(self.stops, cell_size=cell_size)
+      for lat, lon in ((-15, 169.9), (-15, -179.9), (-12, 179.99), (-15, 0)):
+        for n in (1, 5, 50, 300):
+          self.assertSameAsScan(index, lat, lon, n)
+        self.assertSameAsScan(index, lat, lon, 20, max_distance=100000)
+
+  def testStopsInBoundingBox(self):
+    box = (36.3, -116.7, 36.1, -116.9)
+    expected = set(s.stop_id for s in self.stops if s.stop_lat is not None and
+                   36.1 <= s.stop_lat <= 36.3 and -116.9 <= s.stop_lon <= -116.7)
+    for cell_size in (None, 0.0001, 0.05, 2):
+      index = transitfeed.StopGridIndex(self.stops, cell_size=cell_size)
+      self.assertEqual(expected, set(
+          s.stop_id for s in index.GetStopsInBoundingBox(*box)))
+      first = index.GetStopsInBoundingBox(*box, n=10)
+      self.assertEqual(10, len(first))
+      self.assertTrue(set(s.stop_id for s in first) <= expected)
+      self.assertEqual([], index.GetStopsInBoundingBox(*box, n=0))
+      self.assertEqual([], index.GetStopsInBoundingBox(50, 10, 49, 9))
+
+  def testSampledStopsAreSpread(self):
+    # A dense cluster in the south west corner and a few stops elsewhere
+    stops = [transitfeed.Stop(lat=10 + i * 1e-5, lng=20 + i * 1e-5,
+                              stop_id='C%d' % i) for i in range(100)]
+    stops += [transitfeed.Stop(lat=10.9, lng=20.9, stop_id='NE'),
+              transitfeed.Stop(lat=10.9, lng=20.1, stop_id='NW'),
+              transitfeed.Stop(lat=10.1, lng=20.9, stop_id='SE')]
+    index = transitfeed.StopGridIndex(stops)
+    sample = index.GetStopsInBoundingBox(11, 21, 10, 20, n=4, sample=True)
+    self.assertEqual(4, len(sample))
+    self.assertEqual(set(['NE', 'NW', 'SE']),
+                     set(s.stop_id for s in sample) - set(
+                         s.stop_id for s in stops[:100]))
+    self.assertEqual(103, len(index.GetStopsInBoundingBox(
+        11, 21, 10, 20, n=200, sample=True)))
+
+  def testMoveAndRemove(self):
+    index = transitfeed.StopGridIndex(self.stops, cell_size=0.01)
+    stop = self.stops[0]
+    stop.stop_lat, stop.stop_lon = 10.0, 10.0
+    index.MoveStop(stop)
+    self.assertEqual([stop], index.GetNearestStops(10.0, 10.0))
+    index.RemoveStop(stop)
+    self.assertFalse(stop in index)
+    self.assertEqual(299, len(index))
+    self.assertNotEqual(stop, index.GetNearestStops(10.0, 10.0)[0])
+
+
+class ScheduleStopIndexTestCase(util.TestCase):
+  def testIndexIsUpdated(self):
+    schedule = transitfeed.Schedule()
+    stop1 = schedule.AddStop(36.0, -117.0, 'Stop 1')
+    stop2 = schedule.AddStop(36.1, -117.0, 'Stop 2')
+    self.assertEqual([stop1, stop2], schedule.GetNearestStops(36.01, -117, 2))
+    self.assertEqual([stop1], schedule.GetNearestStops(36.01, -117, 2,
+                                                       max_distance=2000))
+
+    stop3 = schedule.AddStop(36.02, -117.0, 'Stop 3')
+    self.assertEqual([stop3], schedule.GetNearestStops(36.019, -117))
+    stop2.stop_lat = 36.019
+    self.assertEqual([stop2], schedule.GetNearestStops(36.019, -117))
+
+    self.assertEqual(set([stop2, stop3]), set(schedule.GetStopsInBoundingBox(
+        36.03, -116.9, 36.01, -117.1, 5)))
+
+    del schedule.stops[stop2.stop_id]
+    self.assertEqual([stop3, stop1], schedule.GetNearestStops(36.019, -117, 3))
+    self.assertEqual([stop3], schedule.GetStopsInBoundingBox(
+        36.03, -116.9, 36.01, -117.1, 5, sample=True))
+
+
+class StopSearchIndexTestCase(util.TestCase):
+  def setUp(self):
+    names = [u'Main St & 1st Ave', u'Mainz Hauptbahnhof', u'Old Main Street',
+             u'Caf\xe9 Central', u'Domain Road', u'Airport']
+    self.stops = [transitfeed.Stop(name=name, stop_id='S%d' % i)
+                  for i, name in enumerate(names)]
+    self.stops.append(transitfeed.Stop(name='Main', stop_id='MAIN'))
+    self.index = transitfeed.StopSearchIndex(self.stops)
+
+  def assertSearch(self, expected_ids, query, limit=None):
+    self.assertEqual(expected_ids,
+                     [s.stop_id for s in self.index.Search(query, limit)])
+
+  def testRankedSearch(self):
+    # Exact, prefix, word prefix and then substring matches
+    expected = ['MAIN', 'S0', 'S1', 'S2', 'S4']
+    self.assertSearch(expected, 'main')
+    self.assertSearch(expected, '  MAIN ')
+    self.assertSearch(expected[:3], 'Main', limit=3)
+    self.assertSearch(['S1'], 'mainz')
+    self.assertSearch(['S3'], 'cafe')
+    self.assertSearch(['S3'], 'CAF\xc3\xa9')
+    self.assertSearch(['S0', 'S2'], 'main st')
+    self.assertSearch(['S5'], 's5')
+    self.assertSearch([], 'xyz')
+    self.assertSearch([], '')
+    self.assertSearch([], 'main', limit=0)
+
+  def testShortQueries(self):
+    self.assertSearch(['S5', 'S0', 'S3', 'S4', 'MAIN', 'S1', 'S2'], 'a')
+    self.assertSearch(['S5', 'S0'], 'a', limit=2)
+    self.assertSearch(['MAIN', 'S0', 'S1', 'S2', 'S4'], 'ma')
+    self.assertSearch(['S0', 'S2'], 'st')
+    self.assertSearch(['S3', 'S4', 'MAIN', 'S0'], 'n', limit=4)
+
+  def testUpdates(self):
+    stop = self.stops[5]
+    stop.stop_name = 'Main Airport'
+    self.index.UpdateStop(stop)
+    self.assertSearch(['MAIN', 'S5', 'S0', 'S1', 'S2', 'S4'], 'main')
+    self.index.RemoveStop(self.stops[0])
+    self.assertFalse(self.stops[0] in self.index)
+    self.assertSearch(['MAIN', 'S5', 'S1', 'S2', 'S4'], 'main')
+    self.assertSearch(['MAIN', 'S5', 'S1', 'S2'], 'ma', limit=4)
+    self.assertEqual(6, len(self.index))
+
+
+class ScheduleSearchStopsTestCase(util.TestCase):
+  def testIndexIsUpdated(self):
+    schedule = transitfeed.Schedule()
+    stop1 = schedule.AddStop(36.0, -117.0, 'Airport')
+    self.assertEqual([stop1], schedule.SearchStops('air'))
+    stop2 = schedule.AddStop(36.1, -117.0, 'Airport North')
+    self.assertEqual([stop1, stop2], schedule.SearchStops('air'))
+    stop1.stop_name = 'Downtown'
+    self.assertEqual([stop2], schedule.SearchStops('air'))
+    self.assertEqual([stop1], schedule.SearchStops('down', limit=1))
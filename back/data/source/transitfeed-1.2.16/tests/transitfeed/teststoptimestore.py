@@ -0,0 +1,179 @@
+# Copyright (C) 2007 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Unit tests for the stoptimestore module.
+from __future__ import absolute_import
+
+import sqlite3
+
+import transitfeed
+from tests import util
+
+
+class StopTimeStoreTestCase(util.TestCase):
+  """Check that ArrayStopTimeStore returns the same as SqliteStopTimeStore."""
+  # trip_id, arrival_secs, departure_secs, stop_id, stop_sequence,
+  # stop_headsign, pickup_type, drop_off_type, shape_dist_traveled, timepoint
+  ROWS = [
+      (u'T2', 100, 110, u'S1', 1, None, None, None, None, None),
+      (u'T1', 0, 0, u'S1', 1, u'Downtown', 0, 1, 0.0, 1),
+      (u'T1', None, None, u'S2', 2, None, None, None, 1.5, 0),
+      (u'T2', 200, 220, u'S3', 3, u'', 2, 3, None, None),
+      (u'T1', 300, 310, u'S3', 3, u'Downtown', 0, 0, 2.5, 1),
+  ]
+  MORE_ROWS = [
+      (u'T2', 150, 160, u'S2', 2, None, None, None, None, None),
+      (u'T3', 10, 10, u'S1', 5, None, None, None, None, None),
+      (u'T3', 10, 10, u'S1', 5, None, None, None, None, None),
+  ]
+
+  def setUp(self):
+    self.stores = [
+        transitfeed.SqliteStopTimeStore(
+            sqlite3.connect(':memory:'), transitfeed.StopTime._SQL_FIELD_NAMES),
+        transitfeed.ArrayStopTimeStore()]
+
+  def assertSameResults(self, method_name, *args):
+    results = [getattr(store, method_name)(*args) for store in self.stores]
+    if method_name == 'GetStopVisits':
+      results = map(sorted, results)
+    self.assertEqual(results[0], results[1],
+                     '%s%r: %r' % (method_name, args, results))
+
+  def assertSameStoreContents(self):
+    for trip_id in (u'T1', u'T2', u'T3', u'T4'):
+      for method_name in ('GetTripRows', 'GetTripFirstTimes',
+                          'GetTripLastTimes', 'GetTripDuplicateSequences'):
+        self.assertSameResults(method_name, trip_id)
+      self.assertEqual(*[store.CountTripRows(trip_id)
+                         for store in self.stores])
+      self.assertEqual(*[tuple(store.GetTripMaxima(trip_id))
+                         for store in self.stores])
+    self.assertSameResults('CountRowsByTrip')
+    for trip_ids in (None, [u'T3', u'T1', u'T4']):
+      self.assertEqual(*[list(store.IterTripRows(trip_ids))
+                         for store in self.stores])
+    for stop_id in (u'S1', u'S2', u'S3', u'S4'):
+      self.assertSameResults('GetStopVisits', stop_id)
+      self.assertEqual(*[store.CountStopRows(stop_id)
+                         for store in self.stores])
+
+  def testSameResults(self):
+    for store in self.stores:
+      store.BeginBulkAdd()
+      store.AddRows(self.ROWS)
+      store.EndBulkAdd()
+    self.assertSameStoreContents()
+
+    for store in self.stores:
+      store.AddRows(self.MORE_ROWS)
+    self.assertSameStoreContents()
+
+    for store in self.stores:
+      self.assertEqual(1, store.DeleteTripRow(u'T1', 2, u'S2'))
+      self.assertEqual(0, store.DeleteTripRow(u'T1', 3, u'S1'))
+      store.DeleteTripRows(u'T3')
+    self.assertSameStoreContents()
+
+    for store in self.stores:
+      store.Clear()
+    self.assertSameStoreContents()
+
+  def testUnsortedAdds(self):
+    # Rows added one at a time are sorted by the first lookup after more than
+    # _MIN_UNSORTED_ROWS of them
+    rows = []
+    for i in range(transitfeed.ArrayStopTimeStore._MIN_UNSORTED_ROWS + 500):
+      rows.append((u'T%d' % (i % 3 + 1), i, i, u'S%d' % (i % 4 + 1), i // 3,
+                   None, None, None, None, None))
+    rows.append((u'T1', 5000, 5000, u'S4', 10, None, None, None, None, None))
+    for store in self.stores:
+      for row in reversed(rows):
+        store.AddRows([row])
+    self.assertSameResults('GetTripDuplicateSequences', u'T1')
+    self.assertEqual([10], self.stores[1].GetTripDuplicateSequences(u'T1'))
+
+    self.setUp()
+    for store in self.stores:
+      for row in reversed(rows):
+        store.AddRows([row])
+      self.assertEqual(1, store.DeleteTripRow(u'T1', 10, u'S3'))
+    self.assertSameResults('GetTripDuplicateSequences', u'T1')
+    self.assertSameStoreContents()
+
+  def testValuesOutOfArrayRange(self):
+    store = transitfeed.ArrayStopTimeStore()
+    store.AddRows(self.ROWS)
+    store.AddRows([(u'T1', 400, 400, u'S4', 2 ** 40, None, 1000, None, None,
+                    None)])
+    self.assertEqual((400, 400, None, 1000, None, None, u'S4', 2 ** 40, None),
+                     store.GetTripRows(u'T1')[-1])
+    self.assertEqual((0, 0, u'Downtown', 0, 1, 0.0, u'S1', 1, 1),
+                     store.GetTripRows(u'T1')[0])
+
+  def testFloatValues(self):
+    for store in self.stores:
+      store.AddRows(self.ROWS)
+      store.AddRows([(u'T1', 400.5, 410.5, u'S4', 4, None, None, None, None,
+                      None)])
+    self.assertSameStoreContents()
+    self.assertEqual((400.5, 410.5, None, None, None, None, u'S4', 4, None),
+                     self.stores[1].GetTripRows(u'T1')[-1])
+    self.assertEqual((0, 0, u'Downtown', 0, 1, 0.0, u'S1', 1, 1),
+                     self.stores[1].GetTripRows(u'T1')[0])
+
+  def testInvalidValuesAreNotAdded(self):
+    store = transitfeed.ArrayStopTimeStore()
+    store.AddRows(self.ROWS)
+    self.assertRaises(OverflowError, store.AddRows,
+                      [(u'T1', 400, 400, u'S4', 2 ** 70, None, None, None,
+                        None, None)])
+    self.assertRaises(TypeError, store.AddRows,
+                      [(u'T1', 400, 400, u'S4', 4, None, u'x', None, None,
+                        None)])
+    self.assertEqual([len(self.ROWS)] * len(store._columns),
+                     map(len, store._columns))
+    self.assertEqual(3, store.CountTripRows(u'T1'))
+
+
+class ArrayStorageLoadTestCase(util.MemoryZipTestCase):
+  def testLoad(self):
+    self.CreateZip()
+    schedule = transitfeed.Loader(problems=self.problems,
+                                  extra_validation=True,
+                                  zip=self.zip,
+                                  stop_times_storage='array').Load()
+    trip = schedule.GetTrip('AB1')
+    self.assertEqual(3, trip.GetCountStopTimes())
+    self.assertEqual(['BEATTY_AIRPORT', 'BULLFROG', 'STAGECOACH'],
+                     [st.stop_id for st in trip.GetStopTimes()])
+    self.assertEqual([(trip, 2)],
+                     schedule.GetStop('BULLFROG')._GetTripSequence())
+    schedule.Validate(self.problems)
+    self.accumulator.AssertNoMoreExceptions()
+
+    first_secs = trip.GetStartTime()
+    trip.AddStopTime(schedule.GetStop('BULLFROG'), arrival_secs=first_secs +
+                     3600, departure_secs=first_secs + 3600)
+    self.assertEqual(4, trip.GetCountStopTimes())
+    self.assertEqual(first_secs + 3600, trip.GetEndTime())
+    trip.AddStopTime(schedule.GetStop('STAGECOACH'), arrival_secs=first_secs +
+                     7200.5, departure_secs=first_secs + 7200.5)
+    self.assertEqual(first_secs + 7200.5, trip.GetEndTime())
+    trip.ClearStopTimes()
+    self.assertEqual([], trip.GetStopTimes())
+
+  def testUnknownStorage(self):
+    self.assertRaises(ValueError, transitfeed.Schedule,
+                      stop_times_storage='csv')
@@ -15,6 +15,8 @@
 # Unit tests for the trip module.
 from __future__ import absolute_import
 
+import copy
+import pickle
 from StringIO import StringIO
 from tests import util
 import transitfeed
@@ -106,6 +108,44 @@ class TripMemoryZipTestCase(util.MemoryZipTestCase):
     self.assertLoadAndCheckExtraValues(saved_schedule_file)
 
 
+class TripAttributeStorageTestCase(util.TestCase):
+  def testSlotsAndExtraAttributes(self):
+    trip = transitfeed.Trip(field_dict={'trip_id': 'T1', 'route_id': 'R1',
+                                        't_foo': 'foo'})
+    self.assertFalse(hasattr(trip, '__dict__'))
+    self.assertEqual(set(['trip_id', 'route_id', 't_foo']), trip.keys())
+    self.assertEqual('foo', trip.t_foo)
+    self.assertEqual('foo', trip['t_foo'])
+    self.assertEqual(None, trip.shape_id)
+    self.assertEqual('', trip['shape_id'])
+    self.assertRaises(AttributeError, getattr, trip, 'n_foo')
+
+    trip.shape_id = 'S1'
+    trip.n_foo = 'bar'
+    del trip.t_foo
+    self.assertEqual(set(['trip_id', 'route_id', 'shape_id', 'n_foo']),
+                     trip.keys())
+    self.assertEqual([('n_foo', 'bar'), ('route_id', 'R1'), ('shape_id', 'S1'),
+                      ('trip_id', 'T1')], sorted(trip.iteritems()))
+
+    restored = pickle.loads(pickle.dumps(trip, pickle.HIGHEST_PROTOCOL))
+    self.assertEqual(trip, restored)
+    self.assertEqual('bar', restored.n_foo)
+    self.assertEqual(trip, copy.copy(trip))
+
+  def testColumnsAddedToSchedule(self):
+    schedule = transitfeed.Schedule()
+    schedule.AddAgency('Agency', 'http://example.com', 'America/Los_Angeles')
+    route = schedule.AddRoute('1', '', 'Bus', route_id='R1')
+    trip = route.AddTrip(schedule, trip_id='T1')
+    trip.t_foo = 'foo'
+    trip.t_foo = 'bar'
+    self.assertEqual(1, schedule.GetTableColumns('trips').count('t_foo'))
+    schedule.AddTableColumns('trips', ['t_foo', 'n_foo'])
+    self.assertEqual(['t_foo', 'n_foo'],
+                     schedule.GetTableColumns('trips')[-2:])
+
+
 class TripValidationTestCase(util.ValidationTestCase):
   def runTest(self):
     trip = transitfeed.Trip()
@@ -575,6 +615,138 @@ class TripGetStopTimesTestCase(SingleTripTestCase):
         tuples[1])
 
 
+class TripGetStopTimesCacheTestCase(SingleTripTestCase):
+  def testCacheIsUpdated(self):
+    cache = self.schedule._stop_times_cache
+    self.trip.AddStopTime(self.stop1, stop_time="5:11:00")
+    stop_times = self.trip.GetStopTimes()
+    self.assertEqual(1, cache.GetWeight())
+    # Callers get their own StopTime objects made from the cached rows
+    stop_times.append(None)
+    stop_times[0].stop_headsign = 'Changed'
+    stop_times[0].arrival_secs += 60
+    self.assertEqual(1, len(self.trip.GetStopTimes()))
+    self.assertFalse(stop_times[0] is self.trip.GetStopTimes()[0])
+    self.assertEqual(None, self.trip.GetStopTimes()[0].stop_headsign)
+    self.assertEqual(5 * 3600 + 11 * 60,
+                     self.trip.GetStopTimes()[0].arrival_secs)
+    self.assertEqual(1, cache.GetWeight())
+
+    self.trip.AddStopTime(self.stop2, stop_time="5:15:00")
+    self.assertEqual([self.stop1, self.stop2],
+                     [st.stop for st in self.trip.GetStopTimes()])
+
+    stoptime = transitfeed.StopTime(transitfeed.default_problem_reporter,
+                                    self.stop2, stop_time="5:16:00",
+                                    stop_sequence=2)
+    self.trip.ReplaceStopTimeObject(stoptime)
+    self.assertEqual(5 * 3600 + 16 * 60,
+                     self.trip.GetStopTimes()[1].departure_secs)
+
+    self.trip.ClearStopTimes()
+    self.assertEqual([], self.trip.GetStopTimes())
+
+  def testCacheIsBounded(self):
+    schedule = transitfeed.Schedule(stop_time_cache_size=3)
+    route = schedule.AddRoute(short_name="54C", long_name="", route_type=3)
+    stop = schedule.AddStop(36.425288, -117.133162, "Demo Stop 1")
+    trips = []
+    for i in range(3):
+      trip = route.AddTrip(schedule, 'trip %d' % i)
+      trip.AddStopTime(stop, stop_time="5:11:00")
+      trip.AddStopTime(stop, stop_time="5:12:00")
+      trip.GetStopTimes()
+      trips.append(trip)
+    cache = schedule._stop_times_cache
+    self.assertEqual(2, cache.GetWeight())
+    self.assertEqual([trips[2].trip_id], list(cache._entries))
+    self.assertEqual(2, len(trips[0].GetStopTimes()))
+
+    schedule = transitfeed.Schedule(stop_time_cache_size=0)
+    route = schedule.AddRoute(short_name="54C", long_name="", route_type=3)
+    trip = route.AddTrip(schedule, 'trip')
+    trip.AddStopTime(schedule.AddStop(36, -117, "Stop"), stop_time="5:11:00")
+    self.assertEqual(1, len(trip.GetStopTimes()))
+    self.assertEqual(0, len(schedule._stop_times_cache))
+
+  def testProblemsAreReportedOnEachCall(self):
+    self.trip.AddStopTime(self.stop1, stop_time="5:11:00")
+    self.schedule._stop_time_store.AddRows(
+        [(self.trip.trip_id, 5 * 3600, 4 * 3600, self.stop2.stop_id, 2,
+          None, None, None, None, None)])
+    accumulator = util.RecordingProblemAccumulator(self)
+    problems = transitfeed.ProblemReporter(accumulator)
+    for _ in range(2):
+      self.assertEqual(2, len(self.trip.GetStopTimes(problems)))
+      accumulator.PopInvalidValue('departure_time')
+      accumulator.AssertNoMoreExceptions()
+    self.assertEqual(0, len(self.schedule._stop_times_cache))
+    self.assertFalse(
+        self.trip.trip_id in self.schedule._trusted_stop_time_trip_ids)
+
+  def testTrustedRowsMakeSameStopTimes(self):
+    trusted_trip_ids = self.schedule._trusted_stop_time_trip_ids
+    self.trip.AddStopTime(self.stop1, arrival_time="5:11:00",
+                          departure_time="5:12:00", stop_headsign="Downtown",
+                          pickup_type="1", shape_dist_traveled="0")
+    self.trip.AddStopTime(self.stop2, stop_time="5:15:00",
+                          shape_dist_traveled="1.5", timepoint="1")
+    self.trip.AddStopTime(self.stop1)
+    self.trip.AddStopTime(self.stop2, stop_time="5:30:00")
+    self.assertFalse(self.trip.trip_id in trusted_trip_ids)
+    checked = self.trip.GetStopTimes()
+    self.assertTrue(self.trip.trip_id in trusted_trip_ids)
+
+    self.schedule._stop_times_cache.Clear()
+    trusted = self.trip.GetStopTimes()
+    self.assertFalse(checked[0] is trusted[0])
+    for checked_stop_time, trusted_stop_time in zip(checked, trusted):
+      self.assertEqual(checked_stop_time.GetFieldValuesTuple('T'),
+                       trusted_stop_time.GetFieldValuesTuple('T'))
+      self.assertEqual(checked_stop_time.GetSqlValuesTuple('T'),
+                       trusted_stop_time.GetSqlValuesTuple('T'))
+    self.assertTrue(trusted[0].stop is self.stop1)
+
+    self.trip.AddStopTime(self.stop1, stop_time="5:40:00")
+    self.assertFalse(self.trip.trip_id in trusted_trip_ids)
+
+
+class TripSummaryTestCase(SingleTripTestCase):
+  def assertSummary(self, start, end, pattern):
+    self.assertEqual(start, self.trip.GetStartTime())
+    self.assertEqual(end, self.trip.GetEndTime())
+    self.assertEqual(len(pattern), self.trip.GetCountStopTimes())
+    self.assertEqual(pattern, self.trip.GetPattern())
+    self.assertEqual(pattern, self.schedule.GetPattern(self.trip.pattern_id))
+
+  def runTest(self):
+    self.assertEqual(0, self.trip.GetCountStopTimes())
+    self.assertEqual((), self.trip.GetPattern())
+    self.trip.AddStopTime(self.stop1, stop_time="5:11:00")
+    self.trip.AddStopTime(self.stop2, stop_time="5:15:00")
+    self.assertSummary(18660, 18900, (self.stop1, self.stop2))
+
+    self.trip.AddStopTime(self.stop1, stop_time="5:20:00")
+    self.assertSummary(18660, 19200, (self.stop1, self.stop2, self.stop1))
+
+    stoptime = transitfeed.StopTime(transitfeed.default_problem_reporter,
+                                    self.stop1, stop_time="5:10:00",
+                                    stop_sequence=1)
+    self.trip.ReplaceStopTimeObject(stoptime)
+    self.assertSummary(18600, 19200, (self.stop1, self.stop2, self.stop1))
+
+    self.trip.ClearStopTimes()
+    self.assertEqual(0, self.trip.GetCountStopTimes())
+    self.assertEqual((), self.trip.GetPattern())
+
+    # Trips added after the summaries were made
+    trip2 = self.schedule.GetRoute(self.trip.route_id).AddTrip(
+        self.schedule, 'trip2')
+    trip2.AddStopTime(self.stop2, stop_time="6:00:00")
+    self.assertEqual(21600, trip2.GetStartTime())
+    self.assertEqual((self.stop2,), trip2.GetPattern())
+
+
 class TripClearStopTimesTestCase(util.TestCase):
   def runTest(self):
     schedule = transitfeed.Schedule(
@@ -782,6 +954,26 @@ class GetTripTimeTestCase(util.TestCase):
     self.assertEqual((2, 1, 3), tuple([ti[1] for ti in trip_index]))
     self.assertEqual((False, True, True), istimepoints)
 
+  def testGetStopTimeTripsAfterChanges(self):
+    self.assertEqual([(400, 'trip1'), (700, 'trip2')],
+                     [(secs, ti[0].trip_id) for secs, ti, _ in
+                      self.stop4.GetStopTimeTrips(self.schedule)])
+    self.trip3.AddStopTime(self.stop4, schedule=self.schedule,
+                           departure_secs=300, arrival_secs=300)
+    self.assertEqual([(300, 'trip3'), (400, 'trip1'), (700, 'trip2')],
+                     [(secs, ti[0].trip_id) for secs, ti, _ in
+                      self.stop4.GetStopTimeTrips(self.schedule)])
+    # The times of trip2 can't be interpolated, which is only an error for the
+    # stops it visits
+    self.trip2.AddStopTime(self.stop5, schedule=self.schedule)
+    self.assertRaises(ValueError, self.stop5.GetStopTimeTrips, self.schedule)
+    self.assertRaises(ValueError, self.stop4.GetStopTimeTrips, self.schedule)
+    self.assertEqual([(100, 'trip1')],
+                     [(secs, ti[0].trip_id) for secs, ti, _ in
+                      self.stop1.GetStopTimeTrips(self.schedule)])
+    self.assertEqual([('trip2', 4)],
+                     [(t.trip_id, i) for t, i in self.stop5.trip_index])
+
   def testStopTripIndex(self):
     trip_index = self.stop3.trip_index
     trip_ids = [t.trip_id for t, i in trip_index]
@@ -845,6 +1037,8 @@ class GetFrequencyTimesTestCase(util.TestCase):
     # result as GetFrequencyStartTimes
     self.assertEqual(start_times,
                      self.trip1.GetFrequencyStartTimes())
+    self.assertEqual(len(start_times),
+                     self.trip1.GetCountFrequencyStartTimes())
 
   def testGetFrequencyStopTimes(self):
     stoptimes_list = self.trip1.GetFrequencyStopTimes()
@@ -97,6 +97,28 @@ class TimeConversionHelpersTestCase(test_util.TestCase):
     else:
       self.fail("Should have thrown Error")
 
+  def testTimesToSecondsSinceMidnight(self):
+    memo = {}
+    self.assertEqual([3723, None, 0, None, None, 91463, 3723, 36000],
+                     util.TimesToSecondsSinceMidnight(
+                         ["01:02:03", "", "00:00:00", None, "10:15:00am",
+                          "25:24:23", "01:02:03", "10:00:00"], memo))
+    self.assertEqual({"01:02:03": 3723, "00:00:00": 0, "10:15:00am": None,
+                      "25:24:23": 91463, "10:00:00": 36000}, memo)
+    self.assertEqual([], util.TimesToSecondsSinceMidnight([]))
+
+  def testTimesToSecondsSinceMidnightManyValues(self):
+    # Enough distinct values to use numpy if it is installed
+    time_strings = []
+    for secs in xrange(0, 200000, 7):
+      time_strings.append(util.FormatSecondsSinceMidnight(secs))
+    time_strings += ["1:02:03", "100:00:00", "12:60:00", "12:00:00 ", u"12:00"]
+    expected = range(0, 200000, 7) + [3723, 360000, None, None, None]
+    self.assertEqual(expected,
+                     util.TimesToSecondsSinceMidnight(time_strings))
+    self.assertEqual(expected, util.TimesToSecondsSinceMidnight(
+        [unicode(s) for s in time_strings]))
+
   def testFormatSecondsSinceMidnight(self):
     self.assertEqual(util.FormatSecondsSinceMidnight(3723), "01:02:03")
     self.assertEqual(util.FormatSecondsSinceMidnight(0), "00:00:00")
@@ -186,6 +208,39 @@ class ValidationUtilsTestCase(test_util.TestCase):
 
 
 
+class LruCacheTestCase(test_util.TestCase):
+  def testEvictsLeastRecentlyUsed(self):
+    cache = util.LruCache(4)
+    cache.Set('a', 'A', 2)
+    cache.Set('b', 'B', 1)
+    cache.Set('c', 'C', 1)
+    self.assertEqual('A', cache.Get('a'))
+    cache.Set('d', 'D', 1)
+    self.assertFalse('b' in cache)
+    self.assertEqual(['A', 'C', 'D'],
+                     [cache.Get(k) for k in ('a', 'c', 'd')])
+    self.assertEqual(4, cache.GetWeight())
+    cache.Set('e', 'E', 3)
+    self.assertEqual(['d', 'e'], sorted(cache._entries))
+    self.assertEqual(None, cache.Get('a'))
+    self.assertEqual('default', cache.Get('a', 'default'))
+
+  def testReplacePopAndClear(self):
+    cache = util.LruCache(2)
+    cache.Set('a', 'A', 1)
+    cache.Set('a', 'AA', 2)
+    self.assertEqual('AA', cache.Get('a'))
+    self.assertEqual(2, cache.GetWeight())
+    cache.Set('b', 'B', 3)  # Heavier than the cache
+    self.assertFalse('b' in cache)
+    cache.Pop('a')
+    cache.Pop('missing')
+    self.assertEqual((0, 0), (len(cache), cache.GetWeight()))
+    cache.Set('a', 'A', 1)
+    cache.Clear()
+    self.assertEqual((0, 0), (len(cache), cache.GetWeight()))
+
+
 class FloatStringToFloatTestCase(test_util.TestCase):
   def runTest(self):
     accumulator = test_util.RecordingProblemAccumulator(self)
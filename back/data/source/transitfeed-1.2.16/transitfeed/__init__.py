@@ -81,7 +81,9 @@ from shapelib import *
 from shapeloader import *
 from shapepoint import *
 from stop import *
+from stopindex import *
 from stoptime import *
+from stoptimestore import *
 from transfer import *
 from trip import *
 
@@ -33,6 +33,7 @@ class Agency(GtfsObjectBase):
                                           'agency_phone', 'agency_fare_url', 'agency_email']
   _DEPRECATED_FIELD_NAMES = [('agency_ticket_url','agency_fare_url')]
   _TABLE_NAME = 'agency'
+  __slots__ = tuple(_FIELD_NAMES)
 
   def __init__(self, name=None, url=None, timezone=None, id=None, email=None,
                field_dict=None, lang=None, **kwargs):
@@ -64,7 +65,9 @@ class Agency(GtfsObjectBase):
         kwargs['agency_email'] = email
       field_dict = kwargs
 
-    self.__dict__.update(field_dict)
+    self._SetAttributes(field_dict)
+
+  _FIELD_DICT_INIT = __init__
 
   def ValidateAgencyUrl(self, problems):
     return not util.ValidateURL(self.agency_url, 'agency_url', problems)
@@ -24,6 +24,7 @@ class FareAttribute(GtfsObjectBase):
                            'payment_method', 'transfers']
   _FIELD_NAMES = _REQUIRED_FIELD_NAMES + ['transfer_duration']
   _TABLE_NAME = "fare_attributes"
+  __slots__ = tuple(_FIELD_NAMES)
 
   def __init__(self,
                fare_id=None, price=None, currency_type=None,
@@ -39,10 +40,9 @@ class FareAttribute(GtfsObjectBase):
       if isinstance(field_dict, FareAttribute):
         # Special case so that we don't need to re-parse the attributes to
         # native types iteritems returns all attributes that don't start with _
-        for k, v in field_dict.iteritems():
-          self.__dict__[k] = v
+        self._SetAttributes(dict(field_dict.iteritems()))
       else:
-        self.__dict__.update(field_dict)
+        self._SetAttributes(field_dict)
     self.rules = []
 
     try:
@@ -26,6 +26,7 @@ class FareRule(GtfsObjectBase):
                                          'destination_id',
                                          'contains_id']
   _TABLE_NAME = "fare_rules"
+  __slots__ = tuple(_FIELD_NAMES)
 
   def __init__(self, fare_id=None, route_id=None,
                origin_id=None, destination_id=None, contains_id=None,
@@ -38,10 +39,9 @@ class FareRule(GtfsObjectBase):
       if isinstance(field_dict, self.GetGtfsFactory().FareRule):
         # Special case so that we don't need to re-parse the attributes to
         # native types iteritems returns all attributes that don't start with _
-        for k, v in field_dict.iteritems():
-          self.__dict__[k] = v
+        self._SetAttributes(dict(field_dict.iteritems()))
       else:
-        self.__dict__.update(field_dict)
+        self._SetAttributes(field_dict)
 
     # canonicalize non-content values as None
     if not self.route_id:
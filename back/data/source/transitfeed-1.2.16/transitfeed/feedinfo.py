@@ -27,11 +27,14 @@ class FeedInfo(transitfeed.GtfsObjectBase):
                              ('feed_valid_until', 'feed_end_date'),
                              ('feed_timezone', None)]
   _TABLE_NAME = 'feed_info'
+  __slots__ = tuple(_FIELD_NAMES)
 
   def __init__(self, field_dict=None):
     self._schedule = None
     if field_dict:
-      self.__dict__.update(field_dict)
+      self._SetAttributes(field_dict)
+
+  _FIELD_DICT_INIT = __init__
 
   def ValidateFeedInfoLang(self, problems):
     return not transitfeed.ValidateLanguageCode(self.feed_lang, 'feed_lang',
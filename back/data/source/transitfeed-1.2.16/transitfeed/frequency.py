@@ -24,16 +24,19 @@ class Frequency(GtfsObjectBase):
     _REQUIRED_FIELD_NAMES = ['trip_id', 'start_time', 'end_time',
                              'headway_secs']
     _FIELD_NAMES = _REQUIRED_FIELD_NAMES + ['exact_times']
+    _TIME_FIELD_NAMES = ['start_time', 'end_time']
     _TABLE_NAME = "frequencies"
+    __slots__ = tuple(_FIELD_NAMES)
 
     def __init__(self, field_dict=None):
       self._schedule = None
       if field_dict:
         if isinstance(field_dict, self.__class__):
-          for k, v in field_dict.iteritems():
-            self.__dict__[k] = v
+          self._SetAttributes(dict(field_dict.iteritems()))
         else:
-          self.__dict__.update(field_dict)
+          self._SetAttributes(field_dict)
+
+    _FIELD_DICT_INIT = __init__
 
     def StartTime(self):
       return self.start_time
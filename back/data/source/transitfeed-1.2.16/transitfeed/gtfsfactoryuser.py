@@ -19,6 +19,7 @@ class GtfsFactoryUser(object):
      be able to instantiate Gtfs classes.
 
      If a non-default GtfsFactory is to be used, it must be set explicitly."""
+  __slots__ = ()
 
   _gtfs_factory = None
 
@@ -14,8 +14,62 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import itertools
+
 from gtfsfactoryuser import GtfsFactoryUser
 
+# Map from class to the frozenset of the names of its slots, see _GetSlotNames
+_slot_names = {}
+# Map from class to the names assigned to its instances, see _GetAssignedNames
+_assigned_names = {}
+# Map from class to (len(_assigned_names[cls]), tuple of slot names, tuple of
+# public slot names), see _GetAssignedSlotNames
+_assigned_slot_names = {}
+
+
+def _GetSlotNames(cls):
+  """Return the names of the slots of cls and its base classes."""
+  try:
+    return _slot_names[cls]
+  except KeyError:
+    names = set()
+    for base in cls.__mro__:
+      names.update(base.__dict__.get('__slots__', ()))
+    names.discard('__dict__')
+    _slot_names[cls] = frozenset(names)
+    return _slot_names[cls]
+
+
+def _GetAssignedNames(cls):
+  """Return the set of the names assigned to instances of cls. Slots that are
+  not in it are unset on every instance, which is much cheaper to know than to
+  check. Private slots are always in it so assigning them isn't recorded."""
+  try:
+    return _assigned_names[cls]
+  except KeyError:
+    _assigned_names[cls] = set(name for name in _GetSlotNames(cls)
+                               if name[0] == '_')
+    return _assigned_names[cls]
+
+
+def _GetAssignedSlotNames(cls):
+  """Return a tuple of the names of the slots of cls that may be set on an
+  instance and a tuple of the public ones."""
+  assigned_names = _GetAssignedNames(cls)
+  try:
+    count, names, public_names = _assigned_slot_names[cls]
+    if count == len(assigned_names):
+      return names, public_names
+  except KeyError:
+    pass
+  # Names are only ever added to assigned_names so its size tells if the cached
+  # tuples are still current.
+  names = tuple(sorted(_GetSlotNames(cls).intersection(assigned_names)))
+  public_names = tuple(name for name in names if name[0] != '_')
+  _assigned_slot_names[cls] = (len(assigned_names), names, public_names)
+  return names, public_names
+
+
 class GtfsObjectBase(GtfsFactoryUser):
   """Object with arbitrary attributes which may be added to a schedule.
 
@@ -36,7 +90,13 @@ class GtfsObjectBase(GtfsFactoryUser):
     * ValidateAfterAdd, which is called after an object is added to a Schedule.
       With the default Loader the return value, if any, is not used.
 
+  Subclasses should also set __slots__ to their _FIELD_NAMES and the private
+  attributes set by __init__. Those attributes are then stored in the object
+  itself, which uses much less memory than a __dict__. Other attributes, such
+  as the extra columns of a feed, are kept in the _extra_attributes dict, which
+  is only created for objects that have some.
   """
+  __slots__ = ('_schedule', '_gtfs_factory', '_extra_attributes')
 
   # list of all required field names for the GTFS object
   _REQUIRED_FIELD_NAMES = []
@@ -46,19 +106,130 @@ class GtfsObjectBase(GtfsFactoryUser):
   # e.g. [('old_name', 'new_name')]
   # use None if there is no new name, e.g. [('old_name', None)]
   _DEPRECATED_FIELD_NAMES = []
+  # list of the field names holding a time as "HH:MM:SS". When loading a feed
+  # valid values are converted to seconds since midnight before __init__.
+  _TIME_FIELD_NAMES = []
+  # The __init__ of the class if calling it with field_dict does nothing more
+  # than calling it without arguments and then _SetAttributes(field_dict), see
+  # _GetFieldValuesFactory. A subclass overriding __init__ doesn't use it.
+  _FIELD_DICT_INIT = None
+
+  def __new__(cls, *args, **kwargs):
+    self = object.__new__(cls)
+    # Use the slot descriptors directly, skipping __setattr__
+    _SetScheduleSlot(self, None)
+    _SetGtfsFactorySlot(self, None)
+    _SetExtraAttributesSlot(self, None)
+    return self
+
+  def _GetSetAttribute(self, name):
+    """Return the value of name if it is set on this object, otherwise None.
+
+    Unlike getattr the defaults of _GetDefaultAttribute are not used."""
+    if name in _GetSlotNames(self.__class__):
+      try:
+        return object.__getattribute__(self, name)
+      except AttributeError:
+        return None
+    for extra_name, value in self._IterExtraAttributes():
+      if extra_name == name:
+        return value
+    return None
+
+  def _IterExtraAttributes(self):
+    """Yield (name, value) for the attributes not stored in slots."""
+    if self._extra_attributes:
+      for item in self._extra_attributes.iteritems():
+        yield item
+    if self.__class__.__dictoffset__:
+      # A subclass without __slots__
+      for item in vars(self).iteritems():
+        yield item
+
+  def _IterSetAttributes(self):
+    """Yield (name, value) for every attribute set on this object, including
+    the private ones."""
+    for name in _GetAssignedSlotNames(self.__class__)[0]:
+      try:
+        yield name, object.__getattribute__(self, name)
+      except AttributeError:
+        pass
+    for item in self._IterExtraAttributes():
+      yield item
+
+  def _SetAttributes(self, field_dict):
+    """Set the attributes in field_dict, a dict or an object with keys() and
+    __getitem__, without adding them to the columns of the schedule."""
+    if not isinstance(field_dict, dict):
+      field_dict = dict((name, field_dict[name]) for name in field_dict.keys())
+    set_attribute = object.__setattr__
+    for name, value in field_dict.iteritems():
+      try:
+        set_attribute(self, name, value)
+      except AttributeError:
+        self._SetExtraAttribute(name, value)
+    _GetAssignedNames(self.__class__).update(field_dict)
+
+  @classmethod
+  def _GetFieldValuesFactory(cls, names):
+    """Return a function that makes an object of cls from a sequence of the
+    values of the fields names, or of the first ones, like
+    cls(field_dict=dict(zip(names, values))) does.
+
+    When _FIELD_DICT_INIT is the __init__ of cls the values are set on an
+    object made without arguments, without making a dict for each object."""
+    init = getattr(cls._FIELD_DICT_INIT, 'im_func', None)
+    if init is None or getattr(cls.__init__, 'im_func', None) is not init:
+      def MakeObjectFromDict(values):
+        return cls(field_dict=dict(itertools.izip(names, values)))
+      return MakeObjectFromDict
+
+    _GetAssignedNames(cls).update(names)
+    set_attribute = object.__setattr__
+    def MakeObject(values):
+      instance = cls()
+      for name, value in itertools.izip(names, values):
+        try:
+          set_attribute(instance, name, value)
+        except AttributeError:
+          instance._SetExtraAttribute(name, value)
+      return instance
+    return MakeObject
+
+  def _SetExtraAttribute(self, name, value):
+    if self._extra_attributes is None:
+      object.__setattr__(self, '_extra_attributes', {})
+    self._extra_attributes[name] = value
+
+  def __getstate__(self):
+    return dict(self._IterSetAttributes())
+
+  def __setstate__(self, state):
+    # pickle and copy might not call __new__
+    object.__setattr__(self, '_extra_attributes', None)
+    self._SetAttributes(state)
 
   def __getitem__(self, name):
     """Return a unicode or str representation of name or "" if not set."""
-    if name in self.__dict__ and self.__dict__[name] is not None:
-      return "%s" % self.__dict__[name]
+    value = self._GetSetAttribute(name)
+    if value is not None:
+      return "%s" % value
     else:
       return ""
 
   def __getattr__(self, name):
-    """Return None or the default value if name is a known attribute.
+    """Return the value of name if it is one of the _extra_attributes,
+    otherwise the value of _GetDefaultAttribute.
 
-    This method is only called when name is not found in __dict__.
+    This method is only called when name is not found in a slot.
     """
+    extra_attributes = self._extra_attributes
+    if extra_attributes and name in extra_attributes:
+      return extra_attributes[name]
+    return self._GetDefaultAttribute(name)
+
+  def _GetDefaultAttribute(self, name):
+    """Return None or the default value if name is a known attribute."""
     if name in self.__class__._FIELD_NAMES:
       return None
     elif name in [dfn[0] for dfn in self.__class__._DEPRECATED_FIELD_NAMES]:
@@ -66,16 +237,30 @@ class GtfsObjectBase(GtfsFactoryUser):
     else:
       raise AttributeError(name)
 
+  def __delattr__(self, name):
+    extra_attributes = self._extra_attributes
+    if extra_attributes and name in extra_attributes:
+      del extra_attributes[name]
+    else:
+      object.__delattr__(self, name)
+
   def iteritems(self):
     """Return a iterable for (name, value) pairs of public attributes."""
-    for name, value in self.__dict__.iteritems():
+    for name, value in self._IterSetAttributes():
       if (not name) or name[0] == "_":
         continue
       yield name, value
 
   def __setattr__(self, name, value):
     """Set an attribute, adding name to the list of columns as needed."""
-    object.__setattr__(self, name, value)
+    try:
+      object.__setattr__(self, name, value)
+    except AttributeError:
+      self._SetExtraAttribute(name, value)
+    else:
+      if name[0] == '_':
+        return
+      _GetAssignedNames(self.__class__).add(name)
     if name[0] != '_' and self._schedule:
       self._schedule.AddTableColumn(self.__class__._TABLE_NAME, name)
 
@@ -106,11 +291,24 @@ class GtfsObjectBase(GtfsFactoryUser):
 
   def keys(self):
     """Return iterable of columns used by this object."""
-    columns = set()
-    for name in vars(self):
-      if (not name) or name[0] == "_":
-        continue
-      columns.add(name)
+    public_names = _GetAssignedSlotNames(self.__class__)[1]
+    get_attribute = object.__getattribute__
+    try:
+      # Usually every assigned slot is set on every object
+      for name in public_names:
+        get_attribute(self, name)
+      columns = set(public_names)
+    except AttributeError:
+      columns = set()
+      for name in public_names:
+        try:
+          get_attribute(self, name)
+        except AttributeError:
+          continue
+        columns.add(name)
+    if self._extra_attributes or self.__class__.__dictoffset__:
+      columns.update(name for name, _ in self._IterExtraAttributes()
+                     if name and name[0] != "_")
     return columns
 
   def _ColumnNames(self):
@@ -118,3 +316,8 @@ class GtfsObjectBase(GtfsFactoryUser):
 
   def AddToSchedule(self, schedule, problems):
     self._schedule = schedule
+
+
+_SetScheduleSlot = GtfsObjectBase._schedule.__set__
+_SetGtfsFactorySlot = GtfsObjectBase._gtfs_factory.__set__
+_SetExtraAttributesSlot = GtfsObjectBase._extra_attributes.__set__
@@ -15,17 +15,38 @@
 # limitations under the License.
 
 import codecs
-import cStringIO as StringIO
 import csv
+import hashlib
+import itertools
+import multiprocessing
 import os
+import Queue
 import re
 import zipfile
 
 import gtfsfactory as gtfsfactory_module
 import problems
 import util
+from version import __version__
 
 class Loader:
+  # Number of bytes read at a time from each file when streaming is enabled.
+  _STREAM_CHUNK_SIZE = 1 << 20
+  # Number of rows decoded and made into objects at a time by _LoadFeed.
+  _CSV_BLOCK_SIZE = 10000
+  # Number of batches of rows a worker process of a parallel Loader reads
+  # ahead of the main process, see _StartTableWorkers.
+  _TABLE_QUEUE_SIZE = 4
+  # Map from a file name to the files that Reload loads again when it changes,
+  # because their objects are stored in or linked to the objects of the file.
+  _RELOAD_DEPENDENT_FILES = {
+      'calendar.txt': ['calendar_dates.txt'],
+      'calendar_dates.txt': ['calendar.txt'],
+      'routes.txt': ['trips.txt'],
+      'trips.txt': ['stop_times.txt', 'frequencies.txt'],
+      'fare_attributes.txt': ['fare_rules.txt'],
+  }
+
   def __init__(self,
                feed_path=None,
                schedule=None,
@@ -35,7 +56,17 @@ class Loader:
                memory_db=True,
                zip=None,
                check_duplicate_trips=False,
-               gtfs_factory=None):
+               gtfs_factory=None,
+               stop_times_batch_size=10000,
+               streaming=False,
+               parallel=None,
+               route_ids=None,
+               agency_ids=None,
+               dates=None,
+               bounding_box=None,
+               snapshot_cache_dir=None,
+               stop_times_storage='sqlite',
+               share_snapshots=False):
     """Initialize a new Loader object.
 
     Args:
@@ -49,13 +80,46 @@ class Loader:
       memory_db: if creating a new Schedule object use an in-memory sqlite
         database instead of creating one in a temporary file
       zip: a zipfile.ZipFile object, optionally used instead of path
+      stop_times_batch_size: number of stop_times rows buffered in memory
+        before they are written to the database in one batch
+      streaming: read each file in chunks of _STREAM_CHUNK_SIZE bytes instead
+        of reading the whole file into memory before parsing it. If a file
+        contains a null, the rows before the chunk with the null are still
+        loaded, while without streaming no row of the file is.
+      parallel: number of worker processes used to read and decode the files
+        of the feed while the main process adds the objects to the schedule.
+        None or 1 reads every file in the main process. Only used when
+        feed_path is the path of a zip file or directory.
+      route_ids: if not None, only the routes with a route_id in this list
+        are loaded, with their trips, stop_times, frequencies and shapes
+      agency_ids: if not None, only the agencies with an agency_id in this
+        list are loaded, with their routes and everything using the routes
+      dates: if not None, a list of "YYYYMMDD" strings. Only the trips of
+        service periods active on at least one of these dates are loaded.
+      bounding_box: if not None, a (min_lat, min_lon, max_lat, max_lon)
+        tuple. Only the stops inside it are loaded, with the stop_times and
+        transfers that use them. Trips are loaded whether or not they visit
+        the box, so a trip crossing its edge only has the stop_times of the
+        stops inside it and a trip outside of it has none. A stop inside the
+        box whose parent_station is outside of it is loaded without
+        parent_station.
+      snapshot_cache_dir: if not None, a directory of snapshots written by
+        Schedule.SaveSnapshot. A feed that was already loaded with the same
+        arguments is restored from its snapshot instead of being parsed, and
+        the problems found when it was parsed are not reported again.
+      stop_times_storage: if creating a new Schedule object, 'sqlite' or
+        'array', see Schedule.__init__
+      share_snapshots: read the stop_times of a schedule restored from
+        snapshot_cache_dir directly from the read-only snapshot file, which
+        processes loading the same feed share, see Schedule.LoadSnapshot
     """
     if gtfs_factory is None:
       gtfs_factory = gtfsfactory_module.GetGtfsFactory()
 
     if not schedule:
       schedule = gtfs_factory.Schedule(problem_reporter=problems,
-          memory_db=memory_db, check_duplicate_trips=check_duplicate_trips)
+          memory_db=memory_db, check_duplicate_trips=check_duplicate_trips,
+          stop_times_storage=stop_times_storage)
 
     self._extra_validation = extra_validation
     self._schedule = schedule
@@ -64,6 +128,34 @@ class Loader:
     self._zip = zip
     self._load_stop_times = load_stop_times
     self._gtfs_factory = gtfs_factory
+    self._stop_times_batch_size = stop_times_batch_size
+    self._streaming = streaming
+    self._parallel = parallel
+    # Map from file name to the _TableResult of a worker reading it
+    self._table_results = {}
+
+    self._route_ids = None if route_ids is None else set(route_ids)
+    self._agency_ids = None if agency_ids is None else set(agency_ids)
+    self._dates = dates
+    self._bounding_box = bounding_box
+    # Ids of the rows left out by the filters above. References to these are
+    # skipped silently instead of being reported as undefined.
+    self._skipped_stop_ids = set()
+    self._skipped_route_ids = set()
+    self._skipped_service_ids = set()
+    self._skipped_trip_ids = set()
+    # agency_id of every row of agency.txt, including the rows left out
+    self._feed_agency_ids = []
+    # shape_ids used by the trips that are loaded or None to load all shapes
+    self._shape_ids = None
+    # Map from time string to seconds, see util.TimesToSecondsSinceMidnight
+    self._time_memo = {}
+    # Map from id to itself so the objects referring to an id share one string
+    self._id_memo = {}
+    self._snapshot_cache_dir = snapshot_cache_dir
+    self._share_snapshots = share_snapshots
+    # Names of the files to load or None to load all files, see Reload
+    self._files_to_load = None
 
   def _DetermineFormat(self):
     """Determines whether the feed is in a form that we understand, and
@@ -104,6 +196,56 @@ class Loader:
     else:
       return os.listdir(self._path)
 
+  def _GetFileSignatures(self):
+    """Return a dict from the name of each file in the feed to a value that
+    changes when the file does, without reading the files.
+
+    This is the CRC and size stored in the zip directory or the size and
+    modification time of a file in a directory."""
+    signatures = {}
+    if self._zip:
+      for info in self._zip.infolist():
+        signatures[info.filename] = (info.CRC, info.file_size)
+    else:
+      for file_name in self._GetFileNames():
+        file_path = os.path.join(self._path, file_name)
+        if os.path.isfile(file_path):
+          stat = os.stat(file_path)
+          signatures[file_name] = (stat.st_size, stat.st_mtime)
+    return signatures
+
+  def _GetFactoryKey(self):
+    """Return a value identifying the files and classes of the gtfs_factory,
+    so that feeds loaded by different extensions don't share snapshots."""
+    def ClassName(gtfs_class):
+      return '%s.%s' % (gtfs_class.__module__, gtfs_class.__name__)
+
+    factory = self._gtfs_factory
+    files = []
+    for file_name in sorted(factory.GetKnownFilenames()):
+      try:
+        gtfs_classes = [factory.GetGtfsClassByFileName(file_name)]
+      except problems.NonStandardMapping:
+        gtfs_classes = [factory.Shape, factory.ShapePoint]
+      files.append((file_name, factory.IsFileRequired(file_name),
+                    [ClassName(c) for c in gtfs_classes]))
+    return (files, factory.GetLoadingOrder(),
+            ClassName(factory.Schedule), ClassName(factory.ServicePeriod))
+
+  def _GetFeedKey(self):
+    """Return a hex string identifying the contents of the feed and the
+    arguments of this Loader that change the loaded schedule."""
+    feed_hash = hashlib.sha1()
+    for value in (__version__, self._GetFactoryKey(),
+                  self._schedule._stop_times_storage, self._load_stop_times,
+                  self._route_ids, self._agency_ids, self._dates,
+                  self._bounding_box):
+      if isinstance(value, set):
+        value = sorted(value)
+      feed_hash.update(repr(value))
+    feed_hash.update(repr(sorted(self._GetFileSignatures().items())))
+    return feed_hash.hexdigest()
+
   def _CheckFileNames(self):
     filenames = self._GetFileNames()
     known_filenames = self._gtfs_factory.GetKnownFilenames()
@@ -143,16 +285,87 @@ class Loader:
     contents = contents.lstrip(codecs.BOM_UTF8)
     return contents
 
+  def _GetUtf8Chunks(self, file_name):
+    """Check for errors in file_name and return an iterable of strings that
+    joined are its contents or None if the file can not be read."""
+    if not self._streaming:
+      contents = self._GetUtf8Contents(file_name)
+      if not contents:
+        return None
+      return [contents]
+
+    data_file = self._OpenFile(file_name)
+    if data_file is None:  # Missing file
+      return None
+    chunk = data_file.read(self._STREAM_CHUNK_SIZE)
+    if not chunk:
+      data_file.close()
+      self._problems.EmptyFile(file_name)
+      return None
+    return self._IterUtf8Chunks(file_name, data_file, chunk)
+
+  def _IterUtf8Chunks(self, file_name, data_file, chunk):
+    """Yield utf-8 chunks of data_file, starting with chunk.
+
+    This does the checks of _GetUtf8Contents one chunk at a time. If a null is
+    found it is reported and no more chunks are returned, but unlike
+    _GetUtf8Contents the lines of the chunks before it are still read. The
+    last partial line of a chunk is only yielded with the next chunk, once
+    that chunk has been checked, so a line cut off by a null isn't read."""
+    decoder = None
+    if chunk[0:2] in (codecs.BOM_UTF16_BE, codecs.BOM_UTF16_LE):
+      self._problems.FileFormat("appears to be encoded in utf-16", (file_name, ))
+      # Convert and continue, so we can find more errors
+      decoder = codecs.getincrementaldecoder('utf-16')()
+
+    offset = 0  # Number of bytes before chunk
+    previous_tail = ''  # Last bytes of the previous chunk
+    partial_line = ''  # Last partial line of the previous chunk
+    first_chunk = True
+    try:
+      while chunk:
+        if decoder:
+          chunk = decoder.decode(chunk).encode('utf-8')
+        null_index = chunk.find('\0')
+        if null_index != -1:
+          m = re.search(r'.{,20}\0.{,20}', previous_tail + chunk, re.DOTALL)
+          self._problems.FileFormat(
+              "contains a null in text \"%s\" at byte %d" %
+              (codecs.getencoder('string_escape')(m.group()),
+               offset + null_index + 1),
+              (file_name, ))
+          return
+        offset += len(chunk)
+        if first_chunk:
+          # strip out any UTF-8 Byte Order Marker (otherwise it'll be
+          # treated as part of the first column name, causing a mis-parse)
+          chunk = chunk.lstrip(codecs.BOM_UTF8)
+          first_chunk = False
+        previous_tail = (previous_tail + chunk)[-20:]
+        chunk = partial_line + chunk
+        line_end = max(chunk.rfind('\n'), chunk.rfind('\r')) + 1
+        partial_line = chunk[line_end:]
+        if line_end:
+          yield chunk[:line_end]
+        chunk = data_file.read(self._STREAM_CHUNK_SIZE)
+      if partial_line:
+        yield partial_line
+    finally:
+      data_file.close()
+
   def _ReadCsvDict(self, file_name, cols, required, deprecated):
     """Reads lines from file_name, yielding a dict of unicode values."""
     assert file_name.endswith(".txt")
-    table_name = file_name[0:-4]
-    contents = self._GetUtf8Contents(file_name)
-    if not contents:
+    if file_name in self._table_results:
+      for item in self._ReplayTable(file_name):
+        yield item
       return
 
-    eol_checker = util.EndOfLineChecker(StringIO.StringIO(contents),
-                                   file_name, self._problems)
+    chunks = self._GetUtf8Chunks(file_name)
+    if chunks is None:
+      return
+
+    eol_checker = util.BulkEndOfLineChecker(chunks, file_name, self._problems)
     # The csv module doesn't provide a way to skip trailing space, but when I
     # checked 15/675 feeds had trailing space in a header row and 120 had spaces
     # after fields. Space after header fields can cause a serious parsing
@@ -160,6 +373,70 @@ class Loader:
     # integer and id fields; they will be validated at higher levels.
     reader = csv.reader(eol_checker, skipinitialspace=True)
 
+    (raw_header, header, valid_columns) = self._ReadCsvDictHeader(
+        reader, file_name, cols, required, deprecated)
+
+    line_num = 1  # First line read by reader.next() above
+    for raw_row in reader:
+      line_num += 1
+      if len(raw_row) == 0:  # skip extra empty lines in file
+        continue
+
+      if len(raw_row) > len(raw_header):
+        self._problems.OtherProblem('Found too many cells (commas) in line '
+                                    '%d of file "%s".  Every row in the file '
+                                    'should have the same number of cells as '
+                                    'the header (first line) does.' %
+                                    (line_num, file_name),
+                                    (file_name, line_num),
+                                    type=problems.TYPE_WARNING)
+
+      if len(raw_row) < len(raw_header):
+        self._problems.OtherProblem('Found missing cells (commas) in line '
+                                    '%d of file "%s".  Every row in the file '
+                                    'should have the same number of cells as '
+                                    'the header (first line) does.' %
+                                    (line_num, file_name),
+                                    (file_name, line_num),
+                                    type=problems.TYPE_WARNING)
+
+      # raw_row is a list of raw bytes which should be valid utf-8. Convert each
+      # valid_columns of raw_row into Unicode.
+      valid_values = []
+      unicode_error_columns = []  # index of valid_values elements with an error
+      for i in valid_columns:
+        try:
+          valid_values.append(raw_row[i].decode('utf-8'))
+        except UnicodeDecodeError:
+          # Replace all invalid characters with REPLACEMENT CHARACTER (U+FFFD)
+          valid_values.append(codecs.getdecoder("utf8")
+                              (raw_row[i], errors="replace")[0])
+          unicode_error_columns.append(len(valid_values) - 1)
+        except IndexError:
+          break
+
+      # The error report may contain a dump of all values in valid_values so
+      # problems can not be reported until after converting all of raw_row to
+      # Unicode.
+      for i in unicode_error_columns:
+        self._problems.InvalidValue(header[i], valid_values[i],
+                                    'Unicode error',
+                                    (file_name, line_num,
+                                     valid_values, header))
+
+      # We strip ALL whitespace from around values.  This matches the behavior
+      # of both the Google and OneBusAway GTFS parser.
+      valid_values = [value.strip() for value in valid_values]
+
+      d = dict(zip(header, valid_values))
+      yield (d, line_num, header, valid_values)
+
+  def _ReadCsvDictHeader(self, reader, file_name, cols, required, deprecated):
+    """Read and check the header row of file_name from reader.
+
+    Returns a tuple of the header row as read, the list of column names used
+    and the index in the raw rows of each of these columns."""
+    table_name = file_name[0:-4]
     raw_header = reader.next()
     header_occurrences = util.defaultdict(lambda: 0)
     header = []
@@ -222,72 +499,207 @@ class Loader:
       if deprecated_name in header:
         self._problems.DeprecatedColumn(file_name, deprecated_name, new_name,
                                         header_context)
+    return (raw_header, header, valid_columns)
+
+  def _IterCsvColumnBlocks(self, file_name, cols, required, deprecated):
+    """Reads file_name in blocks of up to _CSV_BLOCK_SIZE rows, yielding one
+    list of unicode values per column for each block.
+
+    The header and rows are checked like _ReadCsvDict does, but all the values
+    of a column of a block are decoded and stripped at once. A value is only
+    decoded on its own if its column is not valid utf-8. Equal values of id
+    columns are replaced by one shared string.
+
+    Yields:
+      Tuples (header, columns, row_nums, short_rows). columns[i] is the list
+      of values of the column header[i] in the rows of the block and row_nums
+      the line number of each row. short_rows maps the index in the block of a
+      row that doesn't have all columns to the number of values it has.
+    """
+    chunks = self._GetUtf8Chunks(file_name)
+    if chunks is None:
+      return
 
-    line_num = 1  # First line read by reader.next() above
+    eol_checker = util.BulkEndOfLineChecker(chunks, file_name, self._problems)
+    reader = csv.reader(eol_checker, skipinitialspace=True)
+    try:
+      (raw_header, header, valid_columns) = self._ReadCsvDictHeader(
+          reader, file_name, cols, required, deprecated)
+    except StopIteration:  # No header row
+      return
+    raw_header_len = len(raw_header)
+    last_valid_column = valid_columns and valid_columns[-1] or -1
+
+    raw_rows = []
+    row_nums = []
+    short_rows = {}
+    line_num = 1
     for raw_row in reader:
       line_num += 1
-      if len(raw_row) == 0:  # skip extra empty lines in file
-        continue
-
-      if len(raw_row) > len(raw_header):
-        self._problems.OtherProblem('Found too many cells (commas) in line '
-                                    '%d of file "%s".  Every row in the file '
-                                    'should have the same number of cells as '
-                                    'the header (first line) does.' %
-                                    (line_num, file_name),
-                                    (file_name, line_num),
-                                    type=problems.TYPE_WARNING)
-
-      if len(raw_row) < len(raw_header):
-        self._problems.OtherProblem('Found missing cells (commas) in line '
-                                    '%d of file "%s".  Every row in the file '
-                                    'should have the same number of cells as '
-                                    'the header (first line) does.' %
-                                    (line_num, file_name),
-                                    (file_name, line_num),
-                                    type=problems.TYPE_WARNING)
-
-      # raw_row is a list of raw bytes which should be valid utf-8. Convert each
-      # valid_columns of raw_row into Unicode.
-      valid_values = []
-      unicode_error_columns = []  # index of valid_values elements with an error
-      for i in valid_columns:
-        try:
-          valid_values.append(raw_row[i].decode('utf-8'))
-        except UnicodeDecodeError:
-          # Replace all invalid characters with REPLACEMENT CHARACTER (U+FFFD)
-          valid_values.append(codecs.getdecoder("utf8")
-                              (raw_row[i], errors="replace")[0])
-          unicode_error_columns.append(len(valid_values) - 1)
-        except IndexError:
-          break
-
-      # The error report may contain a dump of all values in valid_values so
-      # problems can not be reported until after converting all of raw_row to
-      # Unicode.
-      for i in unicode_error_columns:
-        self._problems.InvalidValue(header[i], valid_values[i],
-                                    'Unicode error',
-                                    (file_name, line_num,
-                                     valid_values, header))
-
-      # We strip ALL whitespace from around values.  This matches the behavior
-      # of both the Google and OneBusAway GTFS parser.
-      valid_values = [value.strip() for value in valid_values]
+      raw_row_len = len(raw_row)
+      if raw_row_len != raw_header_len:
+        if raw_row_len == 0:  # skip extra empty lines in file
+          continue
+
+        if raw_row_len > raw_header_len:
+          self._problems.OtherProblem('Found too many cells (commas) in line '
+                                      '%d of file "%s".  Every row in the '
+                                      'file should have the same number of '
+                                      'cells as the header (first line) '
+                                      'does.' % (line_num, file_name),
+                                      (file_name, line_num),
+                                      type=problems.TYPE_WARNING)
+        else:
+          self._problems.OtherProblem('Found missing cells (commas) in line '
+                                      '%d of file "%s".  Every row in the '
+                                      'file should have the same number of '
+                                      'cells as the header (first line) '
+                                      'does.' % (line_num, file_name),
+                                      (file_name, line_num),
+                                      type=problems.TYPE_WARNING)
+          if raw_row_len <= last_valid_column:
+            short_rows[len(raw_rows)] = len(
+                [i for i in valid_columns if i < raw_row_len])
+          raw_row = raw_row + [''] * (raw_header_len - raw_row_len)
+      raw_rows.append(raw_row)
+      row_nums.append(line_num)
+      if len(raw_rows) == self._CSV_BLOCK_SIZE:
+        yield self._InternIdColumns(self._DecodeCsvColumns(
+            file_name, header, valid_columns, raw_rows, row_nums, short_rows))
+        raw_rows = []
+        row_nums = []
+        short_rows = {}
+    if raw_rows:
+      yield self._InternIdColumns(self._DecodeCsvColumns(
+          file_name, header, valid_columns, raw_rows, row_nums, short_rows))
+
+  def _DecodeCsvColumns(self, file_name, header, valid_columns, raw_rows,
+                        row_nums, short_rows):
+    """Return the block of raw_rows, lists of utf-8 values padded to the
+    length of the raw header, in the format yielded by _IterCsvColumnBlocks.
+    """
+    # Transposing keeps the first raw header length values of each row
+    raw_columns = zip(*raw_rows)
+    columns = []
+    unicode_errors = []  # (row index, column index) of each invalid value
+    for column_index, i in enumerate(valid_columns):
+      # The file doesn't contain nulls so they can separate the values
+      try:
+        values = '\0'.join(raw_columns[i]).decode('utf-8').split(u'\0')
+      except UnicodeDecodeError:
+        values = []
+        for row_index, raw_value in enumerate(raw_columns[i]):
+          try:
+            values.append(raw_value.decode('utf-8'))
+          except UnicodeDecodeError:
+            # Replace all invalid characters with REPLACEMENT CHARACTER
+            # (U+FFFD)
+            values.append(codecs.getdecoder("utf8")
+                          (raw_value, errors="replace")[0])
+            unicode_errors.append((row_index, column_index))
+      columns.append(values)
+    del raw_columns
+
+    # The error report contains a dump of all values of the row, so problems
+    # are reported after converting all columns to Unicode.
+    for row_index, column_index in sorted(unicode_errors):
+      row = [values[row_index] for values in columns]
+      if row_index in short_rows:
+        row = row[:short_rows[row_index]]
+        if column_index >= len(row):
+          continue
+      self._problems.InvalidValue(header[column_index], row[column_index],
+                                  'Unicode error',
+                                  (file_name, row_nums[row_index], row,
+                                   header))
+
+    # We strip ALL whitespace from around values.  This matches the behavior
+    # of both the Google and OneBusAway GTFS parser.
+    columns = [map(unicode.strip, values) for values in columns]
+    return (header, columns, row_nums, short_rows)
+
+  def _InternIdColumns(self, block, value_columns=None):
+    """Replace equal values of the id columns of block, as yielded by
+    _IterCsvColumnBlocks, by one shared string and return block. The id
+    columns of value_columns, the columns of block returned by
+    _ConvertTimeColumns, are replaced too."""
+    (header, columns, row_nums, short_rows) = block
+    intern_id = self._id_memo.setdefault
+    for column_index, name in enumerate(header):
+      if name.endswith('_id') or name == 'parent_station':
+        columns[column_index] = [intern_id(value, value)
+                                 for value in columns[column_index]]
+        if value_columns is not None:
+          value_columns[column_index] = columns[column_index]
+    return block
+
+  def _ConvertTimeColumns(self, header, columns, time_cols):
+    """Return a copy of the list columns of a block in which the values of
+    the columns in time_cols are converted to seconds since midnight. Values
+    that are not valid times are left as they are, to be reported by the
+    object using them."""
+    value_columns = list(columns)
+    for name in time_cols:
+      if name in header:
+        column_index = header.index(name)
+        column = columns[column_index]
+        secs = util.TimesToSecondsSinceMidnight(column, self._time_memo)
+        value_columns[column_index] = [
+            value if time_secs is None else time_secs
+            for value, time_secs in itertools.izip(column, secs)]
+    return value_columns
+
+  def _IterCsvValueBlocks(self, file_name, cols, required, deprecated,
+                          time_cols, keep=False):
+    """Reads file_name with _IterCsvColumnBlocks, yielding (block,
+    value_columns) tuples where value_columns are the columns of the block
+    returned by _ConvertTimeColumns for time_cols.
+
+    If file_name is read by a worker process, keep is passed to
+    _ReplayTable."""
+    if file_name in self._table_results:
+      for (block, value_columns) in self._ReplayTable(file_name, keep):
+        # Equal values were only shared within the block by the worker
+        self._InternIdColumns(block, value_columns)
+        yield (block, value_columns)
+      return
 
-      d = dict(zip(header, valid_values))
-      yield (d, line_num, header, valid_values)
+    for block in self._IterCsvColumnBlocks(file_name, cols, required,
+                                           deprecated):
+      yield (block, self._ConvertTimeColumns(block[0], block[1], time_cols))
+
+  def _IterCsvColumnRows(self, file_name, cols, required, deprecated,
+                         time_cols=(), keep=False):
+    """Reads lines from file_name with _IterCsvValueBlocks, yielding the same
+    (dict, row_num, header, row) tuples as _ReadCsvDict.
+
+    The values of the columns in time_cols are converted to seconds since
+    midnight in the dict, see _ConvertTimeColumns."""
+    for ((header, columns, row_nums, short_rows), value_columns) in \
+        self._IterCsvValueBlocks(file_name, cols, required, deprecated,
+                                 time_cols, keep):
+      for row_index, values in enumerate(itertools.izip(*value_columns)):
+        row = [column[row_index] for column in columns]
+        if short_rows and row_index in short_rows:
+          row = row[:short_rows[row_index]]
+          values = values[:short_rows[row_index]]
+        yield (dict(itertools.izip(header, values)), row_nums[row_index],
+               header, row)
 
   # TODO: Add testing for this specific function
   def _ReadCSV(self, file_name, cols, required, deprecated):
     """Reads lines from file_name, yielding a list of unicode values
     corresponding to the column names in cols."""
-    contents = self._GetUtf8Contents(file_name)
-    if not contents:
+    if file_name in self._table_results:
+      for item in self._ReplayTable(file_name):
+        yield item
+      return
+
+    chunks = self._GetUtf8Chunks(file_name)
+    if chunks is None:
       return
 
-    eol_checker = util.EndOfLineChecker(StringIO.StringIO(contents),
-                                   file_name, self._problems)
+    eol_checker = util.BulkEndOfLineChecker(chunks, file_name, self._problems)
     reader = csv.reader(eol_checker)  # Use excel dialect
 
     header = reader.next()
@@ -371,6 +783,104 @@ class Loader:
                                     (file_name, row_num, result, cols))
       yield (result, row_num, cols)
 
+  def _StartTableWorkers(self):
+    """Start reading the files of the feed in worker processes.
+
+    Returns the multiprocessing.Pool doing the work or None if the files are
+    read by the main process."""
+    if (not self._parallel or self._parallel < 2 or
+        not isinstance(self._path, basestring)):
+      return None
+
+    # Files are submitted in the order Load reads them. Each task is the
+    # file name, the name of the method reading it, the arguments of the
+    # method and the number of rows yielded by the method in a batch.
+    tasks = []
+    service_period_class = self._gtfs_factory.ServicePeriod
+    tasks.append(('calendar.txt', '_ReadCSV',
+                  ('calendar.txt',
+                   service_period_class._FIELD_NAMES,
+                   service_period_class._REQUIRED_FIELD_NAMES,
+                   service_period_class._DEPRECATED_FIELD_NAMES),
+                  self._CSV_BLOCK_SIZE))
+    tasks.append(('calendar_dates.txt', '_ReadCSV',
+                  ('calendar_dates.txt',
+                   service_period_class._FIELD_NAMES_CALENDAR_DATES,
+                   service_period_class._REQUIRED_FIELD_NAMES_CALENDAR_DATES,
+                   service_period_class._DEPRECATED_FIELD_NAMES_CALENDAR_DATES),
+                  self._CSV_BLOCK_SIZE))
+    shape_class = self._gtfs_factory.Shape
+    tasks.append(('shapes.txt', '_ReadCsvDict',
+                  ('shapes.txt',
+                   shape_class._FIELD_NAMES,
+                   shape_class._REQUIRED_FIELD_NAMES,
+                   shape_class._DEPRECATED_FIELD_NAMES),
+                  self._CSV_BLOCK_SIZE))
+    for filename in self._gtfs_factory.GetLoadingOrder():
+      # Each block has _CSV_BLOCK_SIZE rows
+      object_class = self._gtfs_factory.GetGtfsClassByFileName(filename)
+      tasks.append((filename, '_IterCsvValueBlocks',
+                    (filename,
+                     object_class._FIELD_NAMES,
+                     object_class._REQUIRED_FIELD_NAMES,
+                     object_class._DEPRECATED_FIELD_NAMES,
+                     object_class._TIME_FIELD_NAMES),
+                    1))
+    if self._load_stop_times:
+      stop_time_class = self._gtfs_factory.StopTime
+      tasks.append(('stop_times.txt', '_ReadStopTimeRows',
+                    (stop_time_class._FIELD_NAMES,
+                     stop_time_class._REQUIRED_FIELD_NAMES,
+                     stop_time_class._DEPRECATED_FIELD_NAMES),
+                    self._stop_times_batch_size))
+
+    # Missing files are reported by the main process as usual
+    tasks = [task for task in tasks
+             if self._HasFile(task[0]) and self._ShouldLoad(task[0])]
+    # The workers put the batches they read on the queue of the file, which
+    # must be inherited by the worker processes
+    queues = dict((task[0], multiprocessing.Queue(self._TABLE_QUEUE_SIZE))
+                  for task in tasks)
+    pool = multiprocessing.Pool(self._parallel, _InitTableWorker, (queues, ))
+    for task in tasks:
+      async_result = pool.apply_async(
+          _ReadTableInWorker,
+          ((self._path, self._streaming, self._stop_times_batch_size) + task, ))
+      self._table_results[task[0]] = _TableResult(queues[task[0]],
+                                                  async_result)
+    return pool
+
+  def _ReplayTable(self, file_name, keep=False):
+    """Yield the rows of file_name read by a worker process.
+
+    The problems found by the worker are reported when the rows before them
+    have been yielded, so they get the same context as when file_name is read
+    by the main process. If keep is True, the rows are kept to be yielded
+    again by the next call, otherwise only the batches of rows the worker read
+    ahead are held in memory."""
+    if keep:
+      table_result = self._table_results[file_name]
+    else:
+      table_result = self._table_results.pop(file_name)
+
+    header_is_set = False
+    for (header, rows, calls) in table_result.IterBatches(keep):
+      # The objects of the rows can add columns to the stored header
+      if header is not None and not header_is_set:
+        self._schedule._table_columns[file_name[0:-4]] = header
+        header_is_set = True
+      calls = calls[::-1]
+      for row_index, row in enumerate(rows):
+        while calls and calls[-1][0] <= row_index:
+          self._ReplayProblem(calls.pop())
+        yield row
+      while calls:
+        self._ReplayProblem(calls.pop())
+
+  def _ReplayProblem(self, call):
+    (_, method_name, args, kwargs) = call
+    getattr(self._problems, method_name)(*args, **kwargs)
+
   def _HasFile(self, file_name):
     """Returns True if there's a file in the current feed with the
        given file_name in the current feed."""
@@ -380,6 +890,21 @@ class Loader:
       file_path = os.path.join(self._path, file_name)
       return os.path.exists(file_path) and os.path.isfile(file_path)
 
+  def _OpenFile(self, file_name):
+    """Return a file-like object for file_name or None if it is missing."""
+    if self._zip:
+      try:
+        return self._zip.open(file_name)
+      except KeyError:  # file not found in archve
+        self._problems.MissingFile(file_name)
+        return None
+    else:
+      try:
+        return open(os.path.join(self._path, file_name), 'rb')
+      except IOError:  # file not found
+        self._problems.MissingFile(file_name)
+        return None
+
   def _FileContents(self, file_name):
     results = None
     if self._zip:
@@ -400,31 +925,168 @@ class Loader:
       self._problems.EmptyFile(file_name)
     return results
 
+  def _IsFilteringTrips(self):
+    """Return True if route_ids, agency_ids or dates leave out some trips."""
+    return (self._route_ids is not None or self._agency_ids is not None or
+            self._dates is not None)
+
+  def _IsRowFiltered(self, file_name, d):
+    """Return True if the row d of file_name is left out by the route_ids,
+    agency_ids, dates or bounding_box filters. The ids of stops, routes and
+    trips that are left out are added to the matching _skipped_*_ids set."""
+    if file_name == 'agency.txt':
+      self._feed_agency_ids.append(d.get('agency_id'))
+      if (self._agency_ids is not None and
+          d.get('agency_id') not in self._agency_ids):
+        return True
+    elif file_name == 'stops.txt':
+      if self._bounding_box and not self._IsInBoundingBox(d):
+        self._skipped_stop_ids.add(d.get('stop_id'))
+        return True
+    elif file_name == 'routes.txt':
+      agency_id = d.get('agency_id')
+      if ((self._route_ids is not None and
+           d.get('route_id') not in self._route_ids) or
+          (self._agency_ids is not None and
+           agency_id not in self._agency_ids and
+           # A route without agency_id uses the only agency of the feed
+           (agency_id or len(self._feed_agency_ids) != 1 or
+            self._feed_agency_ids[0] not in self._agency_ids))):
+        self._skipped_route_ids.add(d.get('route_id'))
+        return True
+    elif file_name == 'trips.txt':
+      if (d.get('route_id') in self._skipped_route_ids or
+          d.get('service_id') in self._skipped_service_ids):
+        self._skipped_trip_ids.add(d.get('trip_id'))
+        return True
+    elif file_name == 'frequencies.txt':
+      return d.get('trip_id') in self._skipped_trip_ids
+    elif file_name == 'transfers.txt':
+      return (d.get('from_stop_id') in self._skipped_stop_ids or
+              d.get('to_stop_id') in self._skipped_stop_ids)
+    elif file_name == 'fare_rules.txt':
+      return d.get('route_id') in self._skipped_route_ids
+    return False
+
+  def _IsInBoundingBox(self, d):
+    """Return True if the stop row d is inside bounding_box. A stop with
+    invalid coordinates is kept so that they are reported."""
+    try:
+      lat = float(d.get('stop_lat'))
+      lon = float(d.get('stop_lon'))
+    except (TypeError, ValueError):
+      return True
+    (min_lat, min_lon, max_lat, max_lon) = self._bounding_box
+    return min_lat <= lat <= max_lat and min_lon <= lon <= max_lon
+
+  def _DetachSkippedParentStations(self):
+    """Clear the parent_station of the stops whose station was left out by
+    bounding_box, so that it isn't reported as undefined."""
+    for stop in self._schedule.stops.itervalues():
+      if stop.parent_station in self._skipped_stop_ids:
+        stop.parent_station = ''
+
+  def _FindSkippedServiceIds(self):
+    """Add the service periods not active on any of dates to
+    _skipped_service_ids."""
+    if self._dates is None:
+      return
+    for service_id, period in self._schedule.service_periods.items():
+      for date in self._dates:
+        if period.IsActiveOn(date):
+          break
+      else:
+        self._skipped_service_ids.add(service_id)
+
+  def _FindShapeIds(self):
+    """Set _shape_ids to the shape_ids of the trips that will be loaded.
+
+    trips.txt is read without reporting problems because they are reported
+    when it is loaded by _LoadFeed. If it is read by a worker process, its
+    rows are kept for _LoadFeed."""
+    trip_class = self._gtfs_factory.Trip
+    self._shape_ids = set()
+    problems = self._problems
+    self._problems = _ProblemRecorder()
+    try:
+      for (d, row_num, header, row) in self._IterCsvColumnRows(
+          'trips.txt',
+          trip_class._FIELD_NAMES,
+          trip_class._REQUIRED_FIELD_NAMES,
+          trip_class._DEPRECATED_FIELD_NAMES,
+          trip_class._TIME_FIELD_NAMES,
+          keep=True):
+        if not self._IsRowFiltered('trips.txt', d):
+          self._shape_ids.add(d.get('shape_id'))
+    finally:
+      self._problems = problems
+
   def _LoadFeed(self):
     loading_order = self._gtfs_factory.GetLoadingOrder()
     for filename in loading_order:
-      if not self._gtfs_factory.IsFileRequired(filename) and \
+      if filename == 'trips.txt' and self._IsFilteringTrips():
+        # Trips check their shape_id when they are added so the shapes of
+        # the trips that are loaded must be added first
+        if self._HasFile(filename):
+          self._FindShapeIds()
+        self._LoadShapes()
+      if not self._ShouldLoad(filename):
+        pass # Not changed since the schedule was loaded, see Reload.
+      elif not self._gtfs_factory.IsFileRequired(filename) and \
          not self._HasFile(filename):
         pass # File is not required, and feed does not have it.
       else:
-        object_class = self._gtfs_factory.GetGtfsClassByFileName(filename)
-        for (d, row_num, header, row) in self._ReadCsvDict(
-                                       filename,
-                                       object_class._FIELD_NAMES,
-                                       object_class._REQUIRED_FIELD_NAMES,
-                                       object_class._DEPRECATED_FIELD_NAMES):
-          self._problems.SetFileContext(filename, row_num, row, header)
-          instance = object_class(field_dict=d)
-          instance.SetGtfsFactory(self._gtfs_factory)
-          if not instance.ValidateBeforeAdd(self._problems):
-            continue
-          instance.AddToSchedule(self._schedule, self._problems)
-          instance.ValidateAfterAdd(self._problems)
-          self._problems.ClearContext()
+        self._LoadObjects(filename)
+        if filename == 'stops.txt' and self._skipped_stop_ids:
+          self._DetachSkippedParentStations()
+
+  def _LoadObjects(self, file_name):
+    """Add an object of the class of file_name to the schedule for each row
+    of file_name that isn't filtered out.
+
+    The objects are made from the columns of each block of rows by the
+    factory of the class, see GtfsObjectBase._GetFieldValuesFactory. The
+    file context of a row is only made if a problem is reported for it."""
+    object_class = self._gtfs_factory.GetGtfsClassByFileName(file_name)
+    is_filtering = self._IsFilteringTrips() or self._bounding_box
+    make_object = None
+    for ((header, columns, row_nums, short_rows), value_columns) in \
+        self._IterCsvValueBlocks(file_name,
+                                 object_class._FIELD_NAMES,
+                                 object_class._REQUIRED_FIELD_NAMES,
+                                 object_class._DEPRECATED_FIELD_NAMES,
+                                 object_class._TIME_FIELD_NAMES):
+      if make_object is None:
+        make_object = object_class._GetFieldValuesFactory(header)
+      row_context = _RowContext(file_name, header, columns, row_nums,
+                                short_rows)
+      get_context = row_context.GetContext
+      for row_index, values in enumerate(itertools.izip(*value_columns)):
+        if short_rows and row_index in short_rows:
+          values = values[:short_rows[row_index]]
+        if is_filtering and self._IsRowFiltered(
+            file_name, dict(itertools.izip(header, values))):
+          continue
+        row_context.row_index = row_index
+        self._problems.SetFileContextFunction(get_context)
+        instance = make_object(values)
+        instance.SetGtfsFactory(self._gtfs_factory)
+        if not instance.ValidateBeforeAdd(self._problems):
+          continue
+        instance.AddToSchedule(self._schedule, self._problems)
+        instance.ValidateAfterAdd(self._problems)
+    self._problems.ClearContext()
+
+  def _ShouldLoad(self, file_name):
+    """Return True if file_name is loaded, which is always the case unless
+    Reload limits loading to the files that changed."""
+    return self._files_to_load is None or file_name in self._files_to_load
 
   def _LoadCalendar(self):
     file_name = 'calendar.txt'
     file_name_dates = 'calendar_dates.txt'
+    if not self._ShouldLoad(file_name):
+      return
     if not self._HasFile(file_name) and not self._HasFile(file_name_dates):
       self._problems.MissingFile(file_name)
       return
@@ -491,7 +1153,7 @@ class Loader:
 
   def _LoadShapes(self):
     file_name = 'shapes.txt'
-    if not self._HasFile(file_name):
+    if not self._HasFile(file_name) or not self._ShouldLoad(file_name):
       return
     shapes = {}  # shape_id to shape object
 
@@ -502,8 +1164,10 @@ class Loader:
         shape_class._FIELD_NAMES,
         shape_class._REQUIRED_FIELD_NAMES,
         shape_class._DEPRECATED_FIELD_NAMES):
-      file_context = (file_name, row_num, row, header)
-      self._problems.SetFileContext(*file_context)
+      if self._shape_ids is not None and d.get('shape_id') not in \
+          self._shape_ids:
+        continue
+      self._problems.SetFileContext(file_name, row_num, row, header)
 
       shapepoint = self._gtfs_factory.ShapePoint(field_dict=d)
       if not shapepoint.ParseAttributes(self._problems):
@@ -524,18 +1188,46 @@ class Loader:
       del shapes[shape_id]
 
   def _LoadStopTimes(self):
-    stop_time_class = self._gtfs_factory.StopTime
+    # Rows are buffered and added to the stop_times store in batches between
+    # BeginBulkAdd and EndBulkAdd, which for SQLite drop and rebuild the
+    # stop_times indexes. EndBulkAdd is called even if a problem reporter
+    # raised. The rows bypass Trip, so what the schedule cached about the
+    # stop_times of trips read while loading is dropped.
+    store = self._schedule._stop_time_store
+    store.BeginBulkAdd()
+    rows = []
+    try:
+      for trip, stop_time in self._ReadStopTimes():
+        rows.append(stop_time.GetSqlValuesTuple(trip.trip_id))
+        if len(rows) >= self._stop_times_batch_size:
+          store.AddRows(rows)
+          rows = []
+    finally:
+      store.AddRows(rows)
+      store.EndBulkAdd()
+      self._schedule._StopTimesChanged()
+
+    # stop_times are validated in Trip.ValidateChildren, called by
+    # Schedule.Validate
+
+  def _ReadStopTimes(self):
+    """Yield a (trip, stop_time) tuple for each valid row of stop_times.txt.
 
-    for (row, row_num, cols) in self._ReadCSV('stop_times.txt',
-        stop_time_class._FIELD_NAMES,
-        stop_time_class._REQUIRED_FIELD_NAMES,
-        stop_time_class._DEPRECATED_FIELD_NAMES):
-      file_context = ('stop_times.txt', row_num, row, cols)
-      self._problems.SetFileContext(*file_context)
+    Problems are reported with the file context of the row being read."""
+    stop_time_class = self._gtfs_factory.StopTime
 
+    for (row, row_num, cols, arrival_secs, departure_secs) in \
+        self._ReadStopTimeRows(stop_time_class._FIELD_NAMES,
+                               stop_time_class._REQUIRED_FIELD_NAMES,
+                               stop_time_class._DEPRECATED_FIELD_NAMES):
       (trip_id, arrival_time, departure_time, stop_id, stop_sequence,
          stop_headsign, pickup_type, drop_off_type, shape_dist_traveled,
          timepoint) = row
+      if (trip_id in self._skipped_trip_ids or
+          stop_id in self._skipped_stop_ids):
+        continue
+
+      self._problems.SetFileContext('stop_times.txt', row_num, row, cols)
 
       try:
         sequence = int(stop_sequence)
@@ -568,27 +1260,135 @@ class Loader:
       # when called from Trip.Validate.
       stop_time = stop_time_class(self._problems, stop,
           arrival_time, departure_time, stop_headsign, pickup_type,
-          drop_off_type, shape_dist_traveled, stop_sequence=sequence,
+          drop_off_type, shape_dist_traveled, arrival_secs=arrival_secs,
+          departure_secs=departure_secs, stop_sequence=sequence,
           timepoint=timepoint)
-      trip._AddStopTimeObjectUnordered(stop_time, self._schedule)
+      yield (trip, stop_time)
       self._problems.ClearContext()
 
-    # stop_times are validated in Trip.ValidateChildren, called by
-    # Schedule.Validate
+  def _ReadStopTimeRows(self, cols, required, deprecated):
+    """Yield the (row, row_num, cols) tuples of _ReadCSV for stop_times.txt
+    with the arrival and departure times in seconds since midnight.
+
+    The times of stop_times_batch_size rows are converted at once. A time is
+    None if it is empty or invalid, so that StopTime reports it."""
+    if 'stop_times.txt' in self._table_results:
+      for item in self._ReplayTable('stop_times.txt'):
+        yield item
+      return
+
+    reader = self._ReadCSV('stop_times.txt', cols, required, deprecated)
+    while True:
+      batch = list(itertools.islice(reader, self._stop_times_batch_size))
+      if not batch:
+        break
+      arrival_secs = util.TimesToSecondsSinceMidnight(
+          [row[1] for (row, row_num, cols) in batch], self._time_memo)
+      departure_secs = util.TimesToSecondsSinceMidnight(
+          [row[2] for (row, row_num, cols) in batch], self._time_memo)
+      for i, (row, row_num, cols) in enumerate(batch):
+        yield (row, row_num, cols, arrival_secs[i], departure_secs[i])
 
   def Load(self):
     self._problems.ClearContext()
     if not self._DetermineFormat():
       return self._schedule
 
+    snapshot_path = feed_key = None
+    if self._snapshot_cache_dir:
+      feed_key = self._GetFeedKey()
+      snapshot_path = os.path.join(self._snapshot_cache_dir,
+                                   feed_key + '.snapshot')
+      if os.path.exists(snapshot_path):
+        self._schedule.LoadSnapshot(snapshot_path,
+                                    shared=self._share_snapshots)
+        if self._zip:
+          self._zip.close()
+          self._zip = None
+        return self._schedule
+
     self._CheckFileNames()
-    self._LoadCalendar()
-    self._LoadShapes()
-    self._LoadFeed()
+    self._LoadFiles()
+    self._FinishLoad(snapshot_path, feed_key)
+    return self._schedule
 
-    if self._load_stop_times:
-      self._LoadStopTimes()
+  def Reload(self):
+    """Update the schedule passed to __init__ with the current version of the
+    feed.
+
+    The schedule must have been loaded by Load or Reload from an earlier
+    version of the feed, with the same arguments. Only the files whose CRC or
+    size changed since then are read, together with the files in
+    _RELOAD_DEPENDENT_FILES that depend on them. The objects of all other
+    files and their stop_times rows are kept. Problems are only reported for
+    the files that are read; references between them and the unchanged files
+    are checked by Schedule.Validate.
+
+    Returns:
+      The schedule
+    """
+    assert not self._IsFilteringTrips() and not self._bounding_box, \
+        "Reload doesn't support loading with filters"
+    assert hasattr(self._schedule, '_feed_file_signatures'), \
+        "Reload needs a schedule loaded by Load"
+    self._problems.ClearContext()
+    if not self._DetermineFormat():
+      return self._schedule
+
+    old_signatures = self._schedule._feed_file_signatures
+    new_signatures = self._GetFileSignatures()
+    changed_files = set()
+    for file_name in set(old_signatures.keys() + new_signatures.keys()):
+      if old_signatures.get(file_name) != new_signatures.get(file_name):
+        changed_files.add(file_name)
+    files_to_load = set()
+    pending_files = list(changed_files)
+    while pending_files:
+      file_name = pending_files.pop()
+      if file_name not in files_to_load:
+        files_to_load.add(file_name)
+        pending_files.extend(self._RELOAD_DEPENDENT_FILES.get(file_name, []))
+    if not self._load_stop_times:
+      files_to_load.discard('stop_times.txt')
+
+    known_filenames = self._gtfs_factory.GetKnownFilenames()
+    for feed_file in sorted(changed_files):
+      if (feed_file in new_signatures and feed_file not in known_filenames and
+          not feed_file.startswith('.')):
+        self._problems.UnknownFile(feed_file)
+
+    self._files_to_load = files_to_load
+    try:
+      self._schedule._ClearTables(files_to_load)
+      self._LoadFiles()
+    finally:
+      self._files_to_load = None
+    self._FinishLoad(None, None)
+    return self._schedule
 
+  def _LoadFiles(self):
+    """Load the files of the feed into the schedule."""
+    pool = self._StartTableWorkers()
+    try:
+      self._LoadCalendar()
+      self._FindSkippedServiceIds()
+      if not self._IsFilteringTrips():
+        # Otherwise the shapes are loaded by _LoadFeed
+        self._LoadShapes()
+      self._LoadFeed()
+
+      if self._load_stop_times and self._ShouldLoad('stop_times.txt'):
+        self._LoadStopTimes()
+    finally:
+      if pool:
+        pool.terminate()
+        pool.join()
+        self._table_results = {}
+    self._schedule._feed_file_signatures = self._GetFileSignatures()
+
+  def _FinishLoad(self, snapshot_path, feed_key):
+    """Close the feed, validate the schedule if requested and save its
+    snapshot to snapshot_path unless it is None."""
     if self._zip:
       self._zip.close()
       self._zip = None
@@ -596,4 +1396,140 @@ class Loader:
     if self._extra_validation:
       self._schedule.Validate(self._problems, validate_children=False)
 
-    return self._schedule
+    if snapshot_path:
+      if not os.path.isdir(self._snapshot_cache_dir):
+        os.makedirs(self._snapshot_cache_dir)
+      self._schedule.SaveSnapshot(snapshot_path, feed_key)
+
+
+class _ProblemRecorder(object):
+  """Records the problem reporter calls made while a worker process reads a
+  file, with the number of rows read before each call."""
+
+  def __init__(self):
+    self.calls = []
+    self.row_count = 0
+
+  def __getattr__(self, name):
+    if name.startswith('_'):
+      raise AttributeError(name)
+    def Record(*args, **kwargs):
+      self.calls.append((self.row_count, name, args, kwargs))
+    return Record
+
+
+class _RowContext(object):
+  """Makes the file context of the current row of a block of rows, as
+  yielded by Loader._IterCsvColumnBlocks, when a problem is reported for it.
+  See ProblemReporter.SetFileContextFunction."""
+
+  def __init__(self, file_name, header, columns, row_nums, short_rows):
+    self.file_name = file_name
+    self.header = header
+    self.columns = columns
+    self.row_nums = row_nums
+    self.short_rows = short_rows
+    self.row_index = 0
+
+  def GetContext(self):
+    row_index = self.row_index
+    row = [column[row_index] for column in self.columns]
+    if row_index in self.short_rows:
+      row = row[:self.short_rows[row_index]]
+    return (self.file_name, self.row_nums[row_index], row, self.header)
+
+
+class _TableResult(object):
+  """Receives the batches of rows of a file put on a queue by the worker
+  process reading it, see _ReadTableInWorker."""
+  # Seconds to wait for a batch before checking if the worker failed
+  _POLL_SECONDS = 1
+
+  def __init__(self, queue, async_result):
+    self._queue = queue
+    self._async_result = async_result
+    self._batches = []  # Received batches kept by IterBatches
+    self._done = False
+
+  def _Receive(self):
+    """Return the next batch or None after the last one."""
+    while True:
+      try:
+        return self._queue.get(timeout=self._POLL_SECONDS)
+      except Queue.Empty:
+        if self._async_result.ready():
+          # Raises the exception of the worker if it failed
+          self._async_result.get()
+
+  def IterBatches(self, keep=False):
+    """Yield the batches of the file. If keep is True, all batches are
+    received and kept to be yielded again by the next call."""
+    if keep:
+      while not self._done:
+        batch = self._Receive()
+        if batch is None:
+          self._done = True
+        else:
+          self._batches.append(batch)
+      for batch in self._batches:
+        yield batch
+      return
+
+    while self._batches:
+      yield self._batches.pop(0)
+    while not self._done:
+      batch = self._Receive()
+      if batch is None:
+        self._done = True
+      else:
+        yield batch
+
+
+# Map from a file name to the queue of its batches in the worker processes of
+# a parallel Loader, see _InitTableWorker.
+_table_queues = None
+
+
+def _InitTableWorker(queues):
+  """Initialize a worker process of a parallel Loader."""
+  global _table_queues
+  _table_queues = queues
+
+
+def _ReadTableInWorker(task):
+  """Read one file of a feed in a worker process of a parallel Loader.
+
+  The rows yielded by the method reading the file are put on the queue of the
+  file in batches, followed by None. Each batch is a tuple of the columns of
+  the header row as stored by _ReadCsvDict or None, the list of rows and the
+  list of problem reporter calls recorded while reading them, with the number
+  of rows of the batch read before each call.
+
+  Args:
+    task: tuple of the feed path, the streaming flag, the stop_times batch
+      size, the file name, the name of the Loader method reading it, the tuple
+      of arguments of the method and the number of rows in a batch
+  """
+  (feed_path, streaming, stop_times_batch_size, file_name, method_name, args,
+   batch_size) = task
+  queue = _table_queues[file_name]
+  table_name = file_name[0:-4]
+  recorder = _ProblemRecorder()
+  loader = Loader(feed_path, problems=recorder, streaming=streaming,
+                  stop_times_batch_size=stop_times_batch_size)
+  rows = []
+  if loader._DetermineFormat():
+    for row in getattr(loader, method_name)(*args):
+      rows.append(row)
+      recorder.row_count += 1
+      if len(rows) == batch_size:
+        queue.put((loader._schedule._table_columns.get(table_name), rows,
+                   recorder.calls))
+        rows = []
+        recorder.calls = []
+        recorder.row_count = 0
+    if loader._zip:
+      loader._zip.close()
+  queue.put((loader._schedule._table_columns.get(table_name), rows,
+             recorder.calls))
+  queue.put(None)
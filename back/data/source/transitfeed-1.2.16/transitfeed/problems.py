@@ -52,9 +52,13 @@ class ProblemReporter(object):
   def GetAccumulator(self):
     return self.accumulator
 
+  # Function returning the current context, see SetFileContextFunction
+  _context_function = None
+
   def ClearContext(self):
     """Clear any previous context."""
     self._context = None
+    self._context_function = None
 
   def SetFileContext(self, file_name, row_num, row, headers):
     """Save the current context to be output with any errors.
@@ -66,60 +70,97 @@ class ProblemReporter(object):
       headers: list of column headers, its order corresponding to row's
     """
     self._context = (file_name, row_num, row, headers)
+    self._context_function = None
+
+  def SetFileContextFunction(self, context_function):
+    """Save a function returning the current context, a tuple of the
+    arguments of SetFileContext. It is only called when a problem is
+    reported, so that the row isn't made for every row without problems."""
+    self._context = None
+    self._context_function = context_function
 
   def GetFileContext(self):
+    if self._context_function is not None:
+      return self._context_function()
     return self._context
 
   def AddToAccumulator(self, e):
     """Report an exception to the Problem Accumulator"""
     self.accumulator._Report(e)
 
+  def _IsReported(self, exception_class, type=TYPE_ERROR):
+    """Return False if the Problem Accumulator discards problems of the given
+    class and type without looking at them. The exception object and its
+    copy of the file context are then never created."""
+    if type not in ALL_TYPES:
+      type = TYPE_ERROR
+    return self.accumulator._IsReported(exception_class, type)
+
   def NewVersionAvailable(self, version):
+    if not self._IsReported(NewVersionAvailable, TYPE_NOTICE):
+      return
     e = NewVersionAvailable(version=version, type=TYPE_NOTICE,
                             url='https://github.com/google/transitfeed')
     self.AddToAccumulator(e)
 
   def FeedNotFound(self, feed_name, context=None, type=TYPE_ERROR):
+    if not self._IsReported(FeedNotFound, type):
+      return
     e = FeedNotFound(feed_name=feed_name, context=context,
-                     context2=self._context, type=type)
+                     context2=self.GetFileContext(), type=type)
     self.AddToAccumulator(e)
 
   def UnknownFormat(self, feed_name, context=None, type=TYPE_ERROR):
+    if not self._IsReported(UnknownFormat, type):
+      return
     e = UnknownFormat(feed_name=feed_name, context=context,
-                      context2=self._context, type=type)
+                      context2=self.GetFileContext(), type=type)
     self.AddToAccumulator(e)
 
   def FileFormat(self, problem, context=None, type=TYPE_ERROR):
+    if not self._IsReported(FileFormat, type):
+      return
     e = FileFormat(problem=problem, context=context,
-                   context2=self._context, type=type)
+                   context2=self.GetFileContext(), type=type)
     self.AddToAccumulator(e)
 
   def MissingFile(self, file_name, context=None, type=TYPE_ERROR):
+    if not self._IsReported(MissingFile, type):
+      return
     e = MissingFile(file_name=file_name, context=context,
-                    context2=self._context, type=type)
+                    context2=self.GetFileContext(), type=type)
     self.AddToAccumulator(e)
 
   def UnknownFile(self, file_name, context=None, type=TYPE_WARNING):
+    if not self._IsReported(UnknownFile, type):
+      return
     e = UnknownFile(file_name=file_name, context=context,
-                  context2=self._context, type=type)
+                  context2=self.GetFileContext(), type=type)
     self.AddToAccumulator(e)
 
   def EmptyFile(self, file_name, context=None, type=TYPE_ERROR):
+    if not self._IsReported(EmptyFile, type):
+      return
     e = EmptyFile(file_name=file_name, context=context,
-                  context2=self._context, type=type)
+                  context2=self.GetFileContext(), type=type)
     self.AddToAccumulator(e)
 
   def MissingColumn(self, file_name, column_name, context=None,
                     type=TYPE_ERROR):
+    if not self._IsReported(MissingColumn, type):
+      return
     e = MissingColumn(file_name=file_name, column_name=column_name,
-                      context=context, context2=self._context,
+                      context=context, context2=self.GetFileContext(),
                       type=type)
     self.AddToAccumulator(e)
 
   def UnrecognizedColumn(self, file_name, column_name, context=None,
                          type=TYPE_WARNING):
+    if not self._IsReported(UnrecognizedColumn, type):
+      return
     e = UnrecognizedColumn(file_name=file_name, column_name=column_name,
-                           context=context, context2=self._context, type=type)
+                           context=context, context2=self.GetFileContext(),
+                           type=type)
     self.AddToAccumulator(e)
 
   def DeprecatedColumn(self, file_name, column_name, new_name, context=None,
@@ -127,48 +168,63 @@ class ProblemReporter(object):
     reason = None
     if not util.IsEmpty(new_name):
       reason = 'Please use the new column "%s" instead.' % (new_name)
+    if not self._IsReported(DeprecatedColumn, type):
+      return
     e = DeprecatedColumn(file_name=file_name, column_name=column_name,
-                         reason=reason, context=context, context2=self._context,
-                         type=type)
+                         reason=reason, context=context,
+                         context2=self.GetFileContext(), type=type)
     self.AddToAccumulator(e)
 
   def CsvSyntax(self, description=None, context=None, type=TYPE_ERROR):
+    if not self._IsReported(CsvSyntax, type):
+      return
     e = CsvSyntax(description=description, context=context,
-                  context2=self._context, type=type)
+                  context2=self.GetFileContext(), type=type)
     self.AddToAccumulator(e)
 
   def DuplicateColumn(self, file_name, header, count, type=TYPE_ERROR,
                       context=None):
+    if not self._IsReported(DuplicateColumn, type):
+      return
     e = DuplicateColumn(file_name=file_name,
                         header=header,
                         count=count,
                         type=type,
                         context=context,
-                        context2=self._context)
+                        context2=self.GetFileContext())
     self.AddToAccumulator(e)
 
   def MissingValue(self, column_name, reason=None, context=None,
                    type=TYPE_ERROR):
+    if not self._IsReported(MissingValue, type):
+      return
     e = MissingValue(column_name=column_name, reason=reason, context=context,
-                     context2=self._context, type=type)
+                     context2=self.GetFileContext(), type=type)
     self.AddToAccumulator(e)
 
   def InvalidValue(self, column_name, value, reason=None, context=None,
                    type=TYPE_ERROR):
+    if not self._IsReported(InvalidValue, type):
+      return
     e = InvalidValue(column_name=column_name, value=value, reason=reason,
-                     context=context, context2=self._context, type=type)
+                     context=context, context2=self.GetFileContext(), type=type)
     self.AddToAccumulator(e)
 
   def InvalidFloatValue(self, value, reason=None, context=None,
                         type=TYPE_WARNING):
+    if not self._IsReported(InvalidFloatValue, type):
+      return
     e = InvalidFloatValue(value=value, reason=reason, context=context,
-                          context2=self._context, type=type)
+                          context2=self.GetFileContext(), type=type)
     self.AddToAccumulator(e)
 
   def InvalidNonNegativeIntegerValue(self, value, reason=None, context=None,
                                      type=TYPE_WARNING):
+    if not self._IsReported(InvalidNonNegativeIntegerValue, type):
+      return
     e = InvalidNonNegativeIntegerValue(value=value, reason=reason,
-                                       context=context, context2=self._context,
+                                       context=context,
+                                       context2=self.GetFileContext(),
                                        type=type)
     self.AddToAccumulator(e)
 
@@ -177,66 +233,86 @@ class ProblemReporter(object):
       column_names = '(' + ', '.join(column_names) + ')'
     if isinstance(values, tuple):
       values = '(' + ', '.join(values) + ')'
+    if not self._IsReported(DuplicateID, type):
+      return
     e = DuplicateID(column_name=column_names, value=values,
-                    context=context, context2=self._context, type=type)
+                    context=context, context2=self.GetFileContext(), type=type)
     self.AddToAccumulator(e)
 
   def InvalidAgencyID(self, column_name, value, relating_type, relating_id,
                       context=None, type=TYPE_ERROR):
+    if not self._IsReported(InvalidAgencyID, type):
+      return
     e = InvalidAgencyID(column_name=column_name, value=value,
                         relating_type=relating_type, relating_id=relating_id,
-                        context=context, context2=self._context, type=type)
+                        context=context, context2=self.GetFileContext(),
+                        type=type)
     self.AddToAccumulator(e)
 
   def UnusedStop(self, stop_id, stop_name, context=None, type=TYPE_WARNING):
+    if not self._IsReported(UnusedStop, type):
+      return
     e = UnusedStop(stop_id=stop_id, stop_name=stop_name,
-                   context=context, context2=self._context, type=type)
+                   context=context, context2=self.GetFileContext(), type=type)
     self.AddToAccumulator(e)
 
   def UsedStation(self, stop_id, stop_name, context=None, type=TYPE_ERROR):
+    if not self._IsReported(UsedStation, type):
+      return
     e = UsedStation(stop_id=stop_id, stop_name=stop_name,
-                    context=context, context2=self._context, type=type)
+                    context=context, context2=self.GetFileContext(), type=type)
     self.AddToAccumulator(e)
 
   def StopTooFarFromParentStation(self, stop_id, stop_name, parent_stop_id,
                                   parent_stop_name, distance,
                                   type=TYPE_WARNING, context=None):
+    if not self._IsReported(StopTooFarFromParentStation, type):
+      return
     e = StopTooFarFromParentStation(
         stop_id=stop_id, stop_name=stop_name,
         parent_stop_id=parent_stop_id,
         parent_stop_name=parent_stop_name, distance=distance,
-        context=context, context2=self._context, type=type)
+        context=context, context2=self.GetFileContext(), type=type)
     self.AddToAccumulator(e)
 
   def StopsTooClose(self, stop_name_a, stop_id_a, stop_name_b, stop_id_b,
                     distance, type=TYPE_WARNING, context=None):
+    if not self._IsReported(StopsTooClose, type):
+      return
     e = StopsTooClose(
         stop_name_a=stop_name_a, stop_id_a=stop_id_a, stop_name_b=stop_name_b,
         stop_id_b=stop_id_b, distance=distance, context=context,
-        context2=self._context, type=type)
+        context2=self.GetFileContext(), type=type)
     self.AddToAccumulator(e)
 
   def StationsTooClose(self, stop_name_a, stop_id_a, stop_name_b, stop_id_b,
                        distance, type=TYPE_WARNING, context=None):
+    if not self._IsReported(StationsTooClose, type):
+      return
     e = StationsTooClose(
         stop_name_a=stop_name_a, stop_id_a=stop_id_a, stop_name_b=stop_name_b,
         stop_id_b=stop_id_b, distance=distance, context=context,
-        context2=self._context, type=type)
+        context2=self.GetFileContext(), type=type)
     self.AddToAccumulator(e)
 
   def DifferentStationTooClose(self, stop_name, stop_id,
                                station_stop_name, station_stop_id,
                                distance, type=TYPE_WARNING, context=None):
+    if not self._IsReported(DifferentStationTooClose, type):
+      return
     e = DifferentStationTooClose(
         stop_name=stop_name, stop_id=stop_id,
         station_stop_name=station_stop_name, station_stop_id=station_stop_id,
-        distance=distance, context=context, context2=self._context, type=type)
+        distance=distance, context=context, context2=self.GetFileContext(),
+        type=type)
     self.AddToAccumulator(e)
 
   def StopTooFarFromShapeWithDistTraveled(self, trip_id, stop_name, stop_id,
                                           shape_dist_traveled, shape_id,
                                           distance, max_distance,
                                           type=TYPE_WARNING):
+    if not self._IsReported(StopTooFarFromShapeWithDistTraveled, type):
+      return
     e = StopTooFarFromShapeWithDistTraveled(
         trip_id=trip_id, stop_name=stop_name, stop_id=stop_id,
         shape_dist_traveled=shape_dist_traveled, shape_id=shape_id,
@@ -244,88 +320,112 @@ class ProblemReporter(object):
     self.AddToAccumulator(e)
 
   def ExpirationDate(self, expiration, expiration_origin_file, context=None):
+    if not self._IsReported(ExpirationDate, TYPE_WARNING):
+      return
     e = ExpirationDate(expiration=expiration,
                        expiration_origin_file=expiration_origin_file,
-                       context=context, context2=self._context,
+                       context=context, context2=self.GetFileContext(),
                        type=TYPE_WARNING)
     self.AddToAccumulator(e)
 
   def FutureService(self, start_date, start_date_origin_file, context=None):
+    if not self._IsReported(FutureService, TYPE_WARNING):
+      return
     e = FutureService(start_date=start_date,
                       start_date_origin_file=start_date_origin_file,
-                      context=context, context2=self._context,
+                      context=context, context2=self.GetFileContext(),
                       type=TYPE_WARNING)
     self.AddToAccumulator(e)
 
   def DateOutsideValidRange(self, column_name, value, range_start_year,
                             range_end_year, reason=None, context=None,
                             type=TYPE_ERROR):
+    if not self._IsReported(DateOutsideValidRange, type):
+      return
     e = DateOutsideValidRange(column_name=column_name, value=value,
                               reason=reason, range_start_year=range_start_year,
                               range_end_year=range_end_year, context=context,
-                              context2=self._context, type=type)
+                              context2=self.GetFileContext(), type=type)
     self.AddToAccumulator(e)
 
   def NoServiceExceptions(self, start, end, type=TYPE_WARNING, context=None):
+    if not self._IsReported(NoServiceExceptions, type):
+      return
     e = NoServiceExceptions(start=start, end=end, context=context,
-                            context2=self._context, type=type);
+                            context2=self.GetFileContext(), type=type);
     self.AddToAccumulator(e)
 
   def InvalidLineEnd(self, bad_line_end, context=None, type=TYPE_WARNING):
     """bad_line_end is a human readable string."""
+    if not self._IsReported(InvalidLineEnd, type):
+      return
     e = InvalidLineEnd(bad_line_end=bad_line_end, context=context,
-                       context2=self._context, type=type)
+                       context2=self.GetFileContext(), type=type)
     self.AddToAccumulator(e)
 
   def TooFastTravel(self, trip_id, prev_stop, next_stop, dist, time, speed,
                     type=TYPE_ERROR):
+    if not self._IsReported(TooFastTravel, type):
+      return
     e = TooFastTravel(trip_id=trip_id, prev_stop=prev_stop,
                       next_stop=next_stop, time=time, dist=dist, speed=speed,
-                      context=None, context2=self._context, type=type)
+                      context=None, context2=self.GetFileContext(), type=type)
     self.AddToAccumulator(e)
 
   def StopWithMultipleRouteTypes(self, stop_name, stop_id, route_id1, route_id2,
                                  context=None, type=TYPE_WARNING):
+    if not self._IsReported(StopWithMultipleRouteTypes, type):
+      return
     e = StopWithMultipleRouteTypes(stop_name=stop_name, stop_id=stop_id,
                                    route_id1=route_id1, route_id2=route_id2,
-                                   context=context, context2=self._context,
-                                   type=type)
+                                   context=context,
+                                   context2=self.GetFileContext(), type=type)
     self.AddToAccumulator(e)
 
   def DuplicateTrip(self, trip_id1, route_id1, trip_id2, route_id2,
                     context=None, type=TYPE_WARNING):
+    if not self._IsReported(DuplicateTrip, type):
+      return
     e = DuplicateTrip(trip_id1=trip_id1, route_id1=route_id1, trip_id2=trip_id2,
                       route_id2=route_id2, context=context,
-                      context2=self._context, type=type)
+                      context2=self.GetFileContext(), type=type)
     self.AddToAccumulator(e)
 
   def OverlappingTripsInSameBlock(self, trip_id1, trip_id2, block_id,
                                   context=None, type=TYPE_WARNING):
+    if not self._IsReported(OverlappingTripsInSameBlock, type):
+      return
     e = OverlappingTripsInSameBlock(trip_id1=trip_id1, trip_id2=trip_id2,
                                     block_id=block_id, context=context,
-                                    context2=self._context, type=type);
+                                    context2=self.GetFileContext(), type=type);
     self.AddToAccumulator(e)
 
   def TransferDistanceTooBig(self, from_stop_id, to_stop_id, distance,
                              context=None, type=TYPE_ERROR):
+    if not self._IsReported(TransferDistanceTooBig, type):
+      return
     e = TransferDistanceTooBig(from_stop_id=from_stop_id, to_stop_id=to_stop_id,
                                distance=distance, context=context,
-                               context2=self._context, type=type)
+                               context2=self.GetFileContext(), type=type)
     self.AddToAccumulator(e)
 
   def TransferWalkingSpeedTooFast(self, from_stop_id, to_stop_id, distance,
                                   transfer_time, context=None,
                                   type=TYPE_WARNING):
+    if not self._IsReported(TransferWalkingSpeedTooFast, type):
+      return
     e = TransferWalkingSpeedTooFast(from_stop_id=from_stop_id,
                                     transfer_time=transfer_time,
                                     distance=distance,
                                     to_stop_id=to_stop_id, context=context,
-                                    context2=self._context, type=type)
+                                    context2=self.GetFileContext(), type=type)
     self.AddToAccumulator(e)
 
   def OtherProblem(self, description, context=None, type=TYPE_ERROR):
+    if not self._IsReported(OtherProblem, type):
+      return
     e = OtherProblem(description=description,
-                    context=context, context2=self._context, type=type)
+                    context=context, context2=self.GetFileContext(), type=type)
     self.AddToAccumulator(e)
 
   def TooManyDaysWithoutService(self,
@@ -334,12 +434,14 @@ class ProblemReporter(object):
                                 consecutive_days_without_service,
                                 context=None,
                                 type=TYPE_WARNING):
+    if not self._IsReported(TooManyDaysWithoutService, type):
+      return
     e = TooManyDaysWithoutService(
         first_day_without_service=first_day_without_service,
         last_day_without_service=last_day_without_service,
         consecutive_days_without_service=consecutive_days_without_service,
         context=context,
-        context2=self._context,
+        context2=self.GetFileContext(),
         type=type)
     self.AddToAccumulator(e)
 
@@ -347,8 +449,11 @@ class ProblemReporter(object):
                                                     transfer_type=None,
                                                     context=None,
                                                     type=TYPE_ERROR):
+    if not self._IsReported(MinimumTransferTimeSetWithInvalidTransferType,
+                            type):
+      return
     e = MinimumTransferTimeSetWithInvalidTransferType(context=context,
-        context2=self._context, transfer_type=transfer_type, type=type)
+        context2=self.GetFileContext(), transfer_type=transfer_type, type=type)
     self.AddToAccumulator(e)
 
 
@@ -357,11 +462,13 @@ class ProblemReporter(object):
       number_of_stop_times,
       time_in_secs,
       type=TYPE_WARNING):
+    if not self._IsReported(TooManyConsecutiveStopTimesWithSameTime, type):
+      return
     e = TooManyConsecutiveStopTimesWithSameTime(trip_id=trip_id,
         number_of_stop_times=number_of_stop_times,
         stop_time=util.FormatSecondsSinceMidnight(time_in_secs),
         context=None,
-        context2=self._context,
+        context2=self.GetFileContext(),
         type=type)
     self.AddToAccumulator(e)
 
@@ -372,6 +479,21 @@ class ProblemAccumulatorInterface(object):
     raise NotImplementedError("Please use a concrete Problem Accumulator that "
                               "implements error and warning handling.")
 
+  def _IsReported(self, exception_class, type):
+    """Return False if problems of exception_class and type would be ignored
+    by _Report. The ProblemReporter calls this once for each problem, before
+    creating the exception, so that ignored problems cost almost nothing. An
+    accumulator that counts problems must count the ones it returns False for.
+
+    Args:
+      exception_class: a subclass of ExceptionWithContext
+      type: one of TYPE_ERROR, TYPE_WARNING and TYPE_NOTICE
+
+    Returns:
+      True if _Report should be called with the exception
+    """
+    return True
+
 
 class SimpleProblemAccumulator(ProblemAccumulatorInterface):
   """This is a basic problem accumulator that just prints to console."""
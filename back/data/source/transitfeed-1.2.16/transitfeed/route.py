@@ -42,6 +42,7 @@ class Route(GtfsObjectBase):
   _ROUTE_TYPE_IDS = set(_ROUTE_TYPES.keys())
   _ROUTE_TYPE_NAMES = dict((v['name'], k) for k, v in _ROUTE_TYPES.items())
   _TABLE_NAME = 'routes'
+  __slots__ = tuple(_FIELD_NAMES) + ('_trips',)
 
   def __init__(self, short_name=None, long_name=None, route_type=None,
                route_id=None, agency_id=None, field_dict=None):
@@ -63,7 +64,9 @@ class Route(GtfsObjectBase):
         field_dict['route_id'] = route_id
       if agency_id is not None:
         field_dict['agency_id'] = agency_id
-    self.__dict__.update(field_dict)
+    self._SetAttributes(field_dict)
+
+  _FIELD_DICT_INIT = __init__
 
   def AddTrip(self, schedule=None, headsign=None, service_period=None,
               trip_id=None):
@@ -98,16 +101,16 @@ class Route(GtfsObjectBase):
     # Route.AddTrip or schedule.AddTripObject.
     self._trips.append(trip)
 
-  def __getattr__(self, name):
+  def _GetDefaultAttribute(self, name):
     """Return None or the default value if name is a known attribute.
 
-    This method overrides GtfsObjectBase.__getattr__ to provide backwards
-    compatible access to trips.
+    This method overrides GtfsObjectBase._GetDefaultAttribute to provide
+    backwards compatible access to trips.
     """
     if name == 'trips':
       return self._trips
     else:
-      return GtfsObjectBase.__getattr__(self, name)
+      return GtfsObjectBase._GetDefaultAttribute(self, name)
 
   def GetPatternIdTripDict(self):
     """Return a dictionary that maps pattern_id to a list of Trip objects."""
@@ -14,7 +14,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import bisect
+import cPickle as pickle
 import cStringIO as StringIO
 import datetime
 import itertools
@@ -41,25 +41,114 @@ import zipfile
 
 import gtfsfactory
 import problems as problems_module
+import stopindex
+import stoptimestore
 from transitfeed.util import defaultdict
 import util
 
+
+class _TripSummary(object):
+  """What Trip.GetStartTime, GetEndTime, GetCountStopTimes and pattern_id need
+  from the stop_times of a trip, see Schedule._GetTripSummary."""
+  __slots__ = ('count', 'first_times', 'last_times', 'pattern_id')
+
+  def __init__(self, rows, pattern_id):
+    """Args:
+      rows: (arrival_secs, departure_secs, stop_id) of each stop time of the
+        trip, ordered by stop_sequence
+      pattern_id: the id of the stop_ids of rows, see Schedule._GetPatternId
+    """
+    self.count = len(rows)
+    if rows:
+      self.first_times = rows[0][:2]
+      self.last_times = rows[-1][:2]
+    else:
+      self.first_times = self.last_times = None
+    self.pattern_id = pattern_id
+
+
 class Schedule(object):
   """Represents a Schedule, a collection of stops, routes, trips and
   an agency.  This is the main class for this module."""
 
+  # The maximum number of trips in the sets kept by GetTripsActiveOnDate
+  _ACTIVE_TRIPS_CACHE_SIZE = 1000000
+
+  # Version of the format written by SaveSnapshot
+  _SNAPSHOT_VERSION = 3
+  # Attributes that are not stored in a snapshot because they are tied to this
+  # process or are set by __init__
+  _SNAPSHOT_EXCLUDED_ATTRIBUTES = ['_connection', '_temp_db_file',
+                                   '_temp_db_filename', 'problem_reporter',
+                                   '_gtfs_factory', '_check_duplicate_trips',
+                                   '_stop_times_storage', '_stop_time_store',
+                                   '_stop_time_cache_size',
+                                   '_stop_times_cache', '_trip_summaries',
+                                   '_trusted_stop_time_trip_ids',
+                                   '_pattern_ids', '_patterns',
+                                   '_stop_time_index', '_table_column_sets',
+                                   '_stop_index', '_stop_index_count',
+                                   '_stop_search_index',
+                                   '_stop_search_index_count',
+                                   '_trips_by_service_id',
+                                   '_active_trips_cache',
+                                   '_active_trips_state']
+  # Indexes created on the tables written by SaveSnapshot, as (table name,
+  # columns). The indexes of stop_times are created by the stop_time store.
+  _SNAPSHOT_INDEXES = [('stops', ['stop_id']),
+                       ('routes', ['route_id']),
+                       ('trips', ['trip_id']),
+                       ('trips', ['route_id']),
+                       ('trips', ['service_id']),
+                       ('calendar', ['service_id']),
+                       ('calendar_dates', ['service_id', 'date']),
+                       ('frequencies', ['trip_id', 'start_time']),
+                       ('shapes', ['shape_id', 'shape_pt_sequence']),
+                       ('fare_rules', ['fare_id']),
+                       ('transfers', ['from_stop_id', 'to_stop_id'])]
+
   def __init__(self, problem_reporter=None,
                memory_db=True, check_duplicate_trips=False,
-               gtfs_factory=None):
+               gtfs_factory=None, stop_times_storage='sqlite',
+               stop_time_cache_size=100000):
+    """Create an empty schedule.
+
+    Args:
+      problem_reporter: ProblemReporter used by default to report problems
+      memory_db: use an in-memory sqlite database instead of creating one in
+        a temporary file
+      check_duplicate_trips: report trips that are identical to another one
+      gtfs_factory: the GtfsFactory of the classes to use
+      stop_times_storage: 'sqlite' to keep stop_times in the sqlite database
+        or 'array' to keep them in typed arrays, which use much less memory
+        and read the stop_times of a trip faster. See stoptimestore.
+      stop_time_cache_size: the maximum number of stop_times rows kept for
+        the trips whose stop times were read most recently, see
+        Trip.GetStopTimes. 0 disables the cache.
+    """
+    if stop_times_storage not in ('sqlite', 'array'):
+      raise ValueError('Unknown stop_times_storage %r' % stop_times_storage)
+    self._stop_times_storage = stop_times_storage
+    self._stop_time_cache_size = stop_time_cache_size
     if gtfs_factory is None:
       gtfs_factory = gtfsfactory.GetGtfsFactory()
     self._gtfs_factory = gtfs_factory
 
     # Map from table name to list of columns present in this schedule
     self._table_columns = {}
+    # Map from table name to the set of the columns in _table_columns, see
+    # _GetTableColumnSet
+    self._table_column_sets = {}
 
     self._agencies = {}
     self.stops = {}
+    # Spatial index of stops and the number of stops it was kept up to date
+    # with, see _GetStopIndex
+    self._stop_index = None
+    self._stop_index_count = 0
+    # Same for the search index of stops, see _GetStopSearchIndex
+    self._stop_search_index = None
+    self._stop_search_index_count = 0
     self.routes = {}
     self.trips = {}
     self.service_periods = {}
@@ -81,9 +170,25 @@ class Schedule(object):
     self._check_duplicate_trips = check_duplicate_trips
     self.ConnectDb(memory_db)
 
+  def _GetTableColumnSet(self, table):
+    """Return the set of the columns of table, which must be in
+    _table_columns.
+
+    The loader replaces the lists in _table_columns with the header of each
+    file so the set is rebuilt when it doesn't match the list any more."""
+    table_columns = self._table_columns[table]
+    column_set = self._table_column_sets.get(table)
+    if (column_set is None or column_set[0] is not table_columns or
+        len(column_set[1]) != len(table_columns)):
+      column_set = (table_columns, set(table_columns))
+      self._table_column_sets[table] = column_set
+    return column_set[1]
+
   def AddTableColumn(self, table, column):
     """Add column to table if it is not already there."""
-    if column not in self._table_columns[table]:
+    column_set = self._GetTableColumnSet(table)
+    if column not in column_set:
+      column_set.add(column)
       self._table_columns[table].append(column)
 
   def AddTableColumns(self, table, columns):
@@ -93,8 +198,14 @@ class Schedule(object):
       table: table name as a string
       columns: an iterable of column names"""
     table_columns = self._table_columns.setdefault(table, [])
+    column_set = self._GetTableColumnSet(table)
+    if not isinstance(columns, (set, frozenset)):
+      columns = list(columns)
+    if column_set.issuperset(columns):
+      return
     for attr in columns:
-      if attr not in table_columns:
+      if attr not in column_set:
+        column_set.add(attr)
         table_columns.append(attr)
 
   def GetTableColumns(self, table):
@@ -107,14 +218,16 @@ class Schedule(object):
     if hasattr(self, '_temp_db_filename'):
       os.remove(self._temp_db_filename)
 
-  def ConnectDb(self, memory_db):
-    def connector(db_file):
-      if native_sqlite:
-        return sqlite.connect(db_file)
-      else:
-        return sqlite.connect("jdbc:sqlite:%s" % db_file,
-                              "", "", "org.sqlite.JDBC")
+  @staticmethod
+  def _ConnectSqlite(db_file):
+    if native_sqlite:
+      return sqlite.connect(db_file)
+    else:
+      return sqlite.connect("jdbc:sqlite:%s" % db_file,
+                            "", "", "org.sqlite.JDBC")
 
+  def ConnectDb(self, memory_db):
+    connector = self._ConnectSqlite
     if memory_db:
       self._connection = connector(":memory:")
     else:
@@ -129,20 +242,348 @@ class Schedule(object):
         os.close(fd)
         self._connection = connector(self._temp_db_filename)
 
+    if self._stop_times_storage == 'array':
+      self._stop_time_store = stoptimestore.ArrayStopTimeStore()
+    else:
+      self._stop_time_store = stoptimestore.SqliteStopTimeStore(
+          self._connection, self._gtfs_factory.StopTime._SQL_FIELD_NAMES)
+    self._stop_times_cache = util.LruCache(self._stop_time_cache_size)
+    # Map from trip_id to _TripSummary, None until _GetTripSummary is called
+    self._trip_summaries = None
+    # trip_ids of the trips whose stored stop_times made StopTime objects
+    # without problems, see Trip._CreateStopTimes
+    self._trusted_stop_time_trip_ids = set()
+    # The pattern registry, see _GetPatternId
+    self._pattern_ids = {}
+    self._patterns = []
+    # See _GetStopTimeIndex
+    self._stop_time_index = None
+    # Map from service_id to the list of its trips and map from date ordinal
+    # to the frozenset of the trips active on that date, valid while
+    # _active_trips_state is current, see GetTripsActiveOnDate
+    self._trips_by_service_id = None
+    self._active_trips_cache = util.LruCache(self._ACTIVE_TRIPS_CACHE_SIZE)
+    self._active_trips_state = None
+
+  def _StopTimesChanged(self, trip_id=None):
+    """Drop the cached stop_times rows and trip summary of a trip after its
+    stop_times were changed.
+
+    Args:
+      trip_id: the trip_id of the trip, or None if the stop_times of any trip
+        may have changed
+    """
+    self._stop_time_index = None
+    if trip_id is None:
+      self._stop_times_cache.Clear()
+      self._trip_summaries = None
+      self._trusted_stop_time_trip_ids = set()
+      self._pattern_ids = {}
+      self._patterns = []
+    else:
+      self._stop_times_cache.Pop(trip_id)
+      self._trusted_stop_time_trip_ids.discard(trip_id)
+      if self._trip_summaries is not None:
+        self._trip_summaries.pop(trip_id, None)
+
+  def _GetPatternId(self, stop_ids):
+    """Return the pattern id of a sequence of stop_ids, registering it if it
+    is new. Pattern ids are small integers given out in the order patterns
+    are first seen, and each sequence is stored once in _patterns."""
+    stop_ids = tuple(stop_ids)
+    pattern_id = self._pattern_ids.get(stop_ids)
+    if pattern_id is None:
+      pattern_id = len(self._patterns)
+      self._patterns.append(stop_ids)
+      self._pattern_ids[stop_ids] = pattern_id
+    return pattern_id
+
+  def GetPattern(self, pattern_id):
+    """Return the tuple of Stop objects visited by the trips with pattern_id,
+    see Trip.pattern_id."""
+    return tuple([self.stops[stop_id]
+                  for stop_id in self._patterns[pattern_id]])
+
+  def _GetTripSummary(self, trip_id):
+    """Return the _TripSummary of the stop_times of trip_id.
+
+    The summaries of all the trips are made in one pass over the stop_times,
+    ordered by trip_id, the first time this is called, then kept up to date by
+    _StopTimesChanged. Pattern ids are registered in the same pass so the same
+    feed always gets the same ids.
+    """
+    field_names = ['arrival_secs', 'departure_secs', 'stop_id']
+    if self._trip_summaries is None:
+      self._trip_summaries = {}
+      for other_trip_id, rows in self._stop_time_store.IterTripRows(
+          field_names=field_names):
+        self._trip_summaries[other_trip_id] = _TripSummary(
+            rows, self._GetPatternId([row[2] for row in rows]))
+    summary = self._trip_summaries.get(trip_id)
+    if summary is None:
+      rows = dict(self._stop_time_store.IterTripRows(
+          [trip_id], field_names=field_names)).get(trip_id, [])
+      summary = _TripSummary(
+          rows, self._GetPatternId([row[2] for row in rows]))
+      self._trip_summaries[trip_id] = summary
+    return summary
+
+  def _GetStopTimeIndex(self):
+    """Return a dict mapping stop_id to a list of (secs, trip, index,
+    is_timepoint) for each stop time at the stop, sorted by secs.
+
+    secs and is_timepoint are as returned by Trip.GetTimeInterpolatedStops and
+    index is the offset of the stop time in trip.GetStopTimes(). If the times
+    of a trip can't be interpolated its secs and is_timepoint are None. The
+    index is made in one pass over the stop_times the first time it is needed
+    and dropped by _StopTimesChanged.
+    """
+    if self._stop_time_index is None:
+      stop_time_index = {}
+      for trip, stop_times in self.IterStopTimesByTrip():
+        try:
+          time_stops = trip.GetTimeInterpolatedStops(stop_times)
+        except (ValueError, ZeroDivisionError):
+          time_stops = [(None, st, None) for st in stop_times]
+        for index, (secs, st, is_timepoint) in enumerate(time_stops):
+          stop_time_index.setdefault(st.stop.stop_id, []).append(
+              (secs, trip, index, is_timepoint))
+      for entries in stop_time_index.itervalues():
+        entries.sort(key=lambda entry: (entry[0], entry[1].trip_id, entry[2]))
+      self._stop_time_index = stop_time_index
+    return self._stop_time_index
+
+  def _ClearTables(self, file_names):
+    """Remove the objects loaded from the given GTFS files so that they can be
+    loaded again, see Loader.Reload.
+
+    Args:
+      file_names: a collection of file names such as 'routes.txt'
+    """
+    if 'agency.txt' in file_names:
+      self._agencies = {}
+      self._default_agency = None
+    if 'stops.txt' in file_names:
+      # Cached StopTime objects refer to stops
+      self._stop_times_cache.Clear()
+      self._trusted_stop_time_trip_ids = set()
+      self.stops = {}
+      self._stop_index = None
+      self._stop_search_index = None
+      self.fare_zones = {}
+    if 'routes.txt' in file_names:
+      self.routes = {}
+    if 'trips.txt' in file_names:
+      self.trips = {}
+      self._stop_time_index = None
+      for route in self.routes.values():
+        route._trips = []
+    if 'frequencies.txt' in file_names:
+      for trip in self.trips.values():
+        trip.ClearFrequencies()
+    if 'stop_times.txt' in file_names:
+      self._stop_time_store.Clear()
+      self._StopTimesChanged()
+    if 'calendar.txt' in file_names or 'calendar_dates.txt' in file_names:
+      self.service_periods = {}
+      self._default_service_period = None
+    self._ActiveTripsChanged()
+    if 'shapes.txt' in file_names:
+      self._shapes = {}
+    if 'fare_attributes.txt' in file_names:
+      self.fares = {}
+    if 'fare_rules.txt' in file_names:
+      for fare in self.fares.values():
+        fare.ClearFareRules()
+    if 'transfers.txt' in file_names:
+      self._transfers = defaultdict(lambda: [])
+    if 'feed_info.txt' in file_names:
+      self.feed_info = None
+
+  def SaveSnapshot(self, path, feed_key=None):
+    """Save this schedule in a snapshot file that LoadSnapshot can restore
+    without parsing the feed again.
+
+    The snapshot is an SQLite database with the pickled objects of the
+    schedule and a table for each file of the feed, with indexes on the
+    columns used to join them, so other programs can query it too. It is
+    written to a temporary file that is renamed to path once complete.
+
+    Args:
+      path: name of the snapshot file
+      feed_key: optional string stored in the snapshot, for example to
+        identify the feed it was loaded from
+    """
+    state = {}
+    for name, value in self.__dict__.items():
+      if name not in self._SNAPSHOT_EXCLUDED_ATTRIBUTES:
+        state[name] = value
+    # defaultdict can't pickle its lambda default_factory
+    state['_transfers'] = dict(self._transfers)
+
+    data = StringIO.StringIO()
+    pickler = pickle.Pickler(data, pickle.HIGHEST_PROTOCOL)
+    # Proxies don't compare equal to their referent so they are found by id
+    proxy_ids = set(id(ref) for ref in weakref.getweakrefs(self))
+    def PersistentId(obj):
+      # Objects refer to the schedule and the factory, which are replaced by
+      # those of the schedule restoring the snapshot
+      if obj is self:
+        return 'schedule'
+      elif id(obj) in proxy_ids:
+        return 'schedule_proxy'
+      elif isinstance(obj, gtfsfactory.GtfsFactory):
+        return 'gtfs_factory'
+      return None
+    pickler.inst_persistent_id = PersistentId
+    pickler.dump(state)
+
+    temp_path = path + '.tmp'
+    if os.path.exists(temp_path):
+      os.remove(temp_path)
+    self._connection.commit()
     cursor = self._connection.cursor()
-    cursor.execute("""CREATE TABLE stop_times (
-                                           trip_id CHAR(50),
-                                           arrival_secs INTEGER,
-                                           departure_secs INTEGER,
-                                           stop_id CHAR(50),
-                                           stop_sequence INTEGER,
-                                           stop_headsign VAR CHAR(100),
-                                           pickup_type INTEGER,
-                                           drop_off_type INTEGER,
-                                           shape_dist_traveled FLOAT,
-                                           timepoint INTEGER);""")
-    cursor.execute("""CREATE INDEX trip_index ON stop_times (trip_id);""")
-    cursor.execute("""CREATE INDEX stop_index ON stop_times (stop_id);""")
+    cursor.execute("ATTACH DATABASE ? AS snapshot;", (temp_path, ))
+    try:
+      self._stop_time_store.SaveSnapshotRows(cursor)
+      self._SaveSnapshotTables(cursor)
+      cursor.execute("CREATE TABLE snapshot.schedule "
+                     "(version INTEGER, feed_key TEXT, state BLOB);")
+      cursor.execute("INSERT INTO snapshot.schedule VALUES (?, ?, ?);",
+                     (self._SNAPSHOT_VERSION, feed_key,
+                      sqlite.Binary(data.getvalue())))
+      self._connection.commit()
+    finally:
+      cursor.execute("DETACH DATABASE snapshot;")
+    if os.path.exists(path):
+      os.remove(path)  # rename doesn't replace files on Windows
+    os.rename(temp_path, path)
+
+  def _IterSnapshotTables(self):
+    """Yield (table name, column names, list of rows) for each file of the
+    feed except stop_times.txt, which is written by the stop_time store."""
+    for table, objects in (('agency', self._agencies.values()),
+                           ('stops', self.stops.values()),
+                           ('routes', self.routes.values()),
+                           ('trips', self.trips.values()),
+                           ('transfers', self.GetTransferList())):
+      if table in self._table_columns:
+        columns = self.GetTableColumns(table)
+        yield (table, columns, [[o[c] for c in columns] for o in objects])
+    if 'feed_info' in self._table_columns:
+      columns = self.GetTableColumns('feed_info')
+      yield ('feed_info', columns, [[self.feed_info[c] for c in columns]])
+
+    service_period_class = self._gtfs_factory.ServicePeriod
+    periods = self.service_periods.values()
+    yield ('calendar', service_period_class._FIELD_NAMES,
+           filter(None, [p.GetCalendarFieldValuesTuple() for p in periods]))
+    yield ('calendar_dates', service_period_class._FIELD_NAMES_CALENDAR_DATES,
+           [row for p in periods
+            for row in p.GenerateCalendarDatesFieldValuesTuples()])
+    yield ('frequencies', self._gtfs_factory.Frequency._FIELD_NAMES,
+           [row for trip in self.GetTripList()
+            for row in trip.GetFrequencyOutputTuples()])
+    fares = self.GetFareAttributeList()
+    yield ('fare_attributes', self._gtfs_factory.FareAttribute._FIELD_NAMES,
+           [fare.GetFieldValuesTuple() for fare in fares])
+    yield ('fare_rules', self._gtfs_factory.FareRule._FIELD_NAMES,
+           [rule.GetFieldValuesTuple() for fare in fares
+            for rule in fare.GetFareRuleList()])
+    yield ('shapes', self._gtfs_factory.Shape._FIELD_NAMES,
+           [(shape.shape_id, lat, lon, seq, dist)
+            for shape in self.GetShapeList()
+            for seq, (lat, lon, dist) in enumerate(shape.points, 1)])
+
+  @staticmethod
+  def _SnapshotValue(value):
+    """Return value as stored in the tables of a snapshot, where the empty
+    values of the feed are NULL and strings are unicode."""
+    if value == '':
+      return None
+    elif isinstance(value, str):
+      return value.decode('utf-8', 'replace')
+    return value
+
+  def _SaveSnapshotTables(self, cursor):
+    """Write the tables of _IterSnapshotTables and their _SNAPSHOT_INDEXES to
+    the database attached as snapshot to the connection of cursor."""
+    table_columns = {}
+    for table, columns, rows in self._IterSnapshotTables():
+      table_columns[table] = columns
+      cursor.execute('CREATE TABLE snapshot.%s (%s);' %
+                     (table, ','.join('"%s"' % c for c in columns)))
+      cursor.executemany(
+          'INSERT INTO snapshot.%s VALUES (%s);' %
+          (table, ','.join(['?'] * len(columns))),
+          ([self._SnapshotValue(v) for v in row] for row in rows))
+    for table, columns in self._SNAPSHOT_INDEXES:
+      if set(columns).issubset(table_columns.get(table, [])):
+        cursor.execute('CREATE INDEX snapshot.%s_%s_index ON %s (%s);' %
+                       (table, '_'.join(columns), table, ','.join(columns)))
+
+  def LoadSnapshot(self, path, shared=False):
+    """Restore a snapshot written by SaveSnapshot into this schedule, which
+    must be empty.
+
+    Args:
+      path: name of the snapshot file
+      shared: if True the stop_times are read from the snapshot file, which is
+        opened read-only, instead of being copied into the database of this
+        schedule. Processes sharing a snapshot this way share its pages in the
+        OS page cache instead of each keeping its own copy of the stop_times.
+        The stop_times of the schedule can't be changed afterwards: methods
+        that try raise sqlite.OperationalError.
+
+    Returns:
+      The feed_key passed to SaveSnapshot.
+    """
+    assert not self.stops and not self.trips, "schedule must be empty"
+    if shared:
+      connection = self._ConnectSqlite(path)
+      connection.cursor().execute("PRAGMA query_only = ON;")
+      try:
+        (feed_key, data) = self._ReadSnapshotState(connection.cursor(), '',
+                                                   path)
+      except:
+        connection.close()
+        raise
+      self._connection.close()
+      self._connection = connection
+      self._stop_time_store = stoptimestore.SqliteStopTimeStore(
+          connection, self._gtfs_factory.StopTime._SQL_FIELD_NAMES,
+          create_table=False)
+    else:
+      cursor = self._connection.cursor()
+      cursor.execute("ATTACH DATABASE ? AS snapshot;", (path, ))
+      try:
+        (feed_key, data) = self._ReadSnapshotState(cursor, 'snapshot.', path)
+        self._stop_time_store.LoadSnapshotRows(cursor)
+      finally:
+        cursor.execute("DETACH DATABASE snapshot;")
+
+    unpickler = pickle.Unpickler(StringIO.StringIO(str(data)))
+    persistent_objects = {'schedule': self,
+                          'schedule_proxy': weakref.proxy(self),
+                          'gtfs_factory': self._gtfs_factory}
+    unpickler.persistent_load = persistent_objects.__getitem__
+    state = unpickler.load()
+    transfers = state.pop('_transfers')
+    self.__dict__.update(state)
+    self._transfers = defaultdict(lambda: [])
+    self._transfers.update(transfers)
+    return feed_key
+
+  def _ReadSnapshotState(self, cursor, database, path):
+    """Return the feed_key and pickled state stored in the schedule table of
+    database, '' for the main database of cursor or 'snapshot.'."""
+    cursor.execute("SELECT version, feed_key, state FROM %sschedule;" %
+                   database)
+    (version, feed_key, data) = cursor.fetchone()
+    if version != self._SNAPSHOT_VERSION:
+      raise problems_module.Error('Snapshot %s has version %s, expected %s' %
+                                  (path, version, self._SNAPSHOT_VERSION))
+    return (feed_key, data)
 
   def GetStopBoundingBox(self):
     return (min(s.stop_lat for s in self.stops.values()),
@@ -320,20 +761,112 @@ class Schedule(object):
       A list of tuples. Each tuple contains a date object and a list of zero or
       more ServicePeriod objects.
     """
+    first_ordinal = date_start.toordinal()
+    count = max(date_end.toordinal() - first_ordinal, 0)
+    periods_by_offset = [[] for _ in xrange(count)]
+    for service in self.GetServicePeriodList():
+      for offset in service._GetActiveOffsets(first_ordinal, count):
+        periods_by_offset[offset].append(service)
     date_it = date_start
     one_day = datetime.timedelta(days=1)
     date_service_period_list = []
-    while date_it < date_end:
-      periods_today = []
-      date_it_string = date_it.strftime("%Y%m%d")
-      for service in self.GetServicePeriodList():
-        if service.IsActiveOn(date_it_string, date_it):
-          periods_today.append(service)
+    for periods_today in periods_by_offset:
       date_service_period_list.append((date_it, periods_today))
       date_it += one_day
     return date_service_period_list
 
 
+  def _ActiveTripsChanged(self):
+    """Drop the trips found by GetTripsActiveOnDate after trips were added
+    or the service_id of a trip changed."""
+    self._trips_by_service_id = None
+    self._active_trips_cache.Clear()
+    self._active_trips_state = None
+
+  def _TripAttributeChanged(self, trip, name):
+    """Called by Trip.__setattr__ when an attribute of a trip of this
+    schedule is set or deleted."""
+    if name == 'service_id':
+      self._ActiveTripsChanged()
+
+  def _GetActiveTripsState(self):
+    """Return a value that changes when the active trips of a date may have
+    changed without _ActiveTripsChanged being called, such as when a service
+    period is changed."""
+    return (self._gtfs_factory.ServicePeriod._GetCalendarGeneration(),
+            len(self.service_periods), len(self.trips))
+
+  def GetTripsActiveOnDate(self, date):
+    """Return the frozenset of the Trip objects whose service period is active
+    on date.
+
+    The trips are found from the service periods active on date and a map from
+    service_id to trips, then kept for the dates most recently asked about so
+    that asking again for the same date is cheap.
+
+    Args:
+      date: a string of form "YYYYMMDD" or a date object
+
+    Returns:
+      A frozenset of Trip objects, empty if date isn't a valid date.
+    """
+    if isinstance(date, basestring):
+      date_string = date
+      date = util.DateStringToDateObject(date_string)
+      if date is None:
+        return frozenset()
+    else:
+      date_string = date.strftime("%Y%m%d")
+    ordinal = date.toordinal()
+
+    state = self._GetActiveTripsState()
+    if state != self._active_trips_state:
+      self._ActiveTripsChanged()
+      self._active_trips_state = state
+    trips = self._active_trips_cache.Get(ordinal)
+    if trips is None:
+      if self._trips_by_service_id is None:
+        self._trips_by_service_id = {}
+        for trip in self.trips.itervalues():
+          self._trips_by_service_id.setdefault(trip.service_id, []).append(
+              trip)
+      active_trips = []
+      for service_id, service_trips in self._trips_by_service_id.iteritems():
+        service_period = self.service_periods.get(service_id)
+        if (service_period is not None and
+            service_period.IsActiveOn(date_string, date)):
+          active_trips.extend(service_trips)
+      trips = frozenset(active_trips)
+      self._active_trips_cache.Set(ordinal, trips, len(trips) + 1)
+    return trips
+
+  def GetTripRunsActiveOnDate(self, date):
+    """Return a list of (start_secs, trip) for each run of the trips active
+    on date, sorted by start_secs and trip_id.
+
+    Trips with frequencies have a run for each of their frequency start times,
+    other trips have one run starting at their first stop time. start_secs is
+    None for a trip without stop times or without a time at its first stop.
+
+    Args:
+      date: a string of form "YYYYMMDD" or a date object
+    """
+    runs = []
+    for trip in self.GetTripsActiveOnDate(date):
+      start_times = trip.GetFrequencyStartTimes()
+      if not start_times:
+        # The start time of Trip.GetStartTime, without reporting problems
+        arrival_secs, departure_secs = (
+            self._GetTripSummary(trip.trip_id).first_times or (None, None))
+        if arrival_secs is not None:
+          start_times = [arrival_secs]
+        else:
+          start_times = [departure_secs]
+      for start_secs in start_times:
+        runs.append((start_secs, trip))
+    runs.sort(key=lambda run: (run[0], run[1].trip_id))
+    return runs
+
   def AddStop(self, lat, lng, name, stop_id=None):
     """Add a stop to this schedule.
 
@@ -368,6 +901,12 @@ class Schedule(object):
     stop._schedule = weakref.proxy(self)
     self.AddTableColumns('stops', stop._ColumnNames())
     self.stops[stop.stop_id] = stop
+    if self._stop_index is not None:
+      self._stop_index.AddStop(stop)
+      self._stop_index_count += 1
+    if self._stop_search_index is not None:
+      self._stop_search_index.AddStop(stop)
+      self._stop_search_index_count += 1
     if hasattr(stop, 'zone_id') and stop.zone_id:
       self.fare_zones[stop.zone_id] = True
 
@@ -449,6 +988,7 @@ class Schedule(object):
     self.AddTableColumns('trips', trip._ColumnNames())
     trip._schedule = weakref.proxy(self)
     self.trips[trip.trip_id] = trip
+    self._ActiveTripsChanged()
 
     # Call Trip.Validate after setting trip._schedule so that references
     # are checked. trip.ValidateChildren will be called directly by
@@ -469,6 +1009,50 @@ class Schedule(object):
   def GetTrip(self, trip_id):
     return self.trips[trip_id]
 
+  def IterStopTimesByTrip(self, trip_ids=None, problems=None):
+    """Yield (trip, list of StopTime objects) for each trip, ordered by
+    trip_id. The stop_times of all the trips are read in one pass instead of
+    a query for each trip, and stop_times must not be added or removed until
+    the iteration is done.
+
+    Args:
+      trip_ids: the trip_ids of the trips to include or None for every trip
+        of this schedule. trip_ids not in this schedule are ignored.
+      problems: the ProblemReporter passed to StopTime objects as they are
+        created, see Trip.GetStopTimes
+
+    Returns:
+      a generator of (Trip, list of StopTime) tuples, including trips without
+      stop times with an empty list
+    """
+    if problems is None:
+      problems = problems_module.default_problem_reporter
+    if trip_ids is None:
+      ordered_trip_ids = sorted(self.trips)
+    else:
+      trip_ids = set(trip_id for trip_id in trip_ids if trip_id in self.trips)
+      ordered_trip_ids = sorted(trip_ids)
+    unvisited_trip_ids = set(ordered_trip_ids)
+    next_index = 0
+    for trip_id, rows in self._stop_time_store.IterTripRows(trip_ids):
+      if trip_id not in unvisited_trip_ids:
+        # stop_times of a trip that isn't in this schedule
+        continue
+      # Trips without stop_times come between those that have them
+      while (next_index < len(ordered_trip_ids) and
+             ordered_trip_ids[next_index] < trip_id):
+        other_trip_id = ordered_trip_ids[next_index]
+        if other_trip_id in unvisited_trip_ids:
+          unvisited_trip_ids.remove(other_trip_id)
+          yield self.trips[other_trip_id], []
+        next_index += 1
+      unvisited_trip_ids.remove(trip_id)
+      trip = self.trips[trip_id]
+      yield trip, trip._CreateStopTimes(rows, problems)
+    for trip_id in ordered_trip_ids[next_index:]:
+      if trip_id in unvisited_trip_ids:
+        yield self.trips[trip_id], []
+
   def AddFareObject(self, fare, problem_reporter=None):
     """Deprecated. Please use AddFareAttributeObject."""
     warnings.warn("No longer supported. The Fare class was renamed to "
@@ -578,29 +1162,72 @@ class Schedule(object):
     the stops that have been added."""
     return self.fare_zones.keys()
 
-  def GetNearestStops(self, lat, lon, n=1):
-    """Return the n nearest stops to lat,lon"""
-    dist_stop_list = []
-    for s in self.stops.values():
-      # TODO: Use util.ApproximateDistanceBetweenStops?
-      dist = (s.stop_lat - lat)**2 + (s.stop_lon - lon)**2
-      if len(dist_stop_list) < n:
-        bisect.insort(dist_stop_list, (dist, s))
-      elif dist < dist_stop_list[-1][0]:
-        bisect.insort(dist_stop_list, (dist, s))
-        dist_stop_list.pop()  # Remove stop with greatest distance
-    return [stop for dist, stop in dist_stop_list]
-
-  def GetStopsInBoundingBox(self, north, east, south, west, n):
-    """Return a sample of up to n stops in a bounding box"""
-    stop_list = []
-    for s in self.stops.values():
-      if (s.stop_lat <= north and s.stop_lat >= south and
-          s.stop_lon <= east and s.stop_lon >= west):
-        stop_list.append(s)
-        if len(stop_list) == n:
-          break
-    return stop_list
+  def _GetStopIndex(self):
+    """Return the StopGridIndex of the stops of this schedule.
+
+    The index is made the first time it is needed. AddStopObject adds to it
+    and _StopAttributeChanged moves the stops whose position changes. It is
+    made again if stops were added to or removed from self.stops directly.
+    """
+    if (self._stop_index is None or
+        self._stop_index_count != len(self.stops)):
+      self._stop_index = stopindex.StopGridIndex(self.stops.itervalues())
+      self._stop_index_count = len(self.stops)
+    return self._stop_index
+
+  def _GetStopSearchIndex(self):
+    """Return the StopSearchIndex of the stops of this schedule, kept up to
+    date like the index of _GetStopIndex."""
+    if (self._stop_search_index is None or
+        self._stop_search_index_count != len(self.stops)):
+      self._stop_search_index = stopindex.StopSearchIndex(
+          self.stops.itervalues())
+      self._stop_search_index_count = len(self.stops)
+    return self._stop_search_index
+
+  def _StopAttributeChanged(self, stop, name):
+    """Called by a Stop of this schedule after its attribute name was set."""
+    if name in ('stop_lat', 'stop_lon') and self._stop_index is not None:
+      self._stop_index.MoveStop(stop)
+    if (name in ('stop_id', 'stop_name') and
+        self._stop_search_index is not None):
+      self._stop_search_index.UpdateStop(stop)
+
+  def SearchStops(self, query, limit=None):
+    """Return a list of the stops with query in their stop_id or stop_name,
+    best matches first. Case, accents and repeated spaces are ignored.
+
+    Args:
+      query: the text to search for
+      limit: the maximum number of stops to return or None for all of them
+    """
+    return self._GetStopSearchIndex().Search(query, limit)
+
+  def GetNearestStops(self, lat, lon, n=1, max_distance=None):
+    """Return the n nearest stops to lat,lon, nearest first.
+
+    Stops across the 180th meridian from lat,lon are found at their distance
+    around it.
+
+    Args:
+      lat, lon: the position to search from, in degrees
+      n: the maximum number of stops to return
+      max_distance: if not None only return stops at most this many meters
+        from lat, lon
+    """
+    return self._GetStopIndex().GetNearestStops(lat, lon, n, max_distance)
+
+  def GetStopsInBoundingBox(self, north, east, south, west, n, sample=False):
+    """Return a sample of up to n stops in a bounding box.
+
+    Args:
+      north, east, south, west: the edges of the box, in degrees
+      n: the maximum number of stops to return
+      sample: if True and more than n stops are in the box return stops
+        spread over the whole box instead of the first n found
+    """
+    return self._GetStopIndex().GetStopsInBoundingBox(north, east, south, west,
+                                                      n, sample)
 
   def Load(self, feed_path, extra_validation=False):
     loader = self._gtfs_factory.Loader(feed_path,
@@ -735,8 +1362,9 @@ class Schedule(object):
     stop_times_string = StringIO.StringIO()
     writer = util.CsvUnicodeWriter(stop_times_string)
     writer.writerow(self._gtfs_factory.StopTime._FIELD_NAMES)
-    for t in self.trips.values():
-      writer.writerows(t._GenerateStopTimesTuples())
+    for trip, stop_times in self.IterStopTimesByTrip():
+      writer.writerows(st.GetFieldValuesTuple(trip.trip_id)
+                       for st in stop_times)
     self._WriteArchiveString(archive, 'stop_times.txt', stop_times_string)
 
     # write shapes (if applicable)
@@ -776,28 +1404,36 @@ class Schedule(object):
     Returns:
       a list of (date object, number of trips, number of departures) tuples
     """
-
+    # The stop_times are counted in one grouped query, then the totals of each
+    # service_id are added to the days its compiled calendar is active
+    stop_time_counts = self._stop_time_store.CountRowsByTrip()
     service_id_to_trips = defaultdict(lambda: 0)
     service_id_to_departures = defaultdict(lambda: 0)
     for trip in self.GetTripList():
-      headway_start_times = trip.GetFrequencyStartTimes()
-      if headway_start_times:
-        trip_runs = len(headway_start_times)
-      else:
-        trip_runs = 1
-
+      trip_runs = trip.GetCountFrequencyStartTimes() or 1
       service_id_to_trips[trip.service_id] += trip_runs
       service_id_to_departures[trip.service_id] += (
-          (trip.GetCountStopTimes() - 1) * trip_runs)
+          (stop_time_counts.get(trip.trip_id, 0) - 1) * trip_runs)
+
+    first_ordinal = date_start.toordinal()
+    count = max(date_end.toordinal() - first_ordinal, 0)
+    day_trips = [0] * count
+    day_departures = [0] * count
+    for service in self.GetServicePeriodList():
+      if service.service_id not in service_id_to_trips:
+        continue
+      trips = service_id_to_trips[service.service_id]
+      departures = service_id_to_departures[service.service_id]
+      for offset in service._GetActiveOffsets(first_ordinal, count):
+        day_trips[offset] += trips
+        day_departures[offset] += departures
 
-    date_services = self.GetServicePeriodsActiveEachDate(date_start, date_end)
     date_trips = []
-
-    for date, services in date_services:
-      day_trips = sum(service_id_to_trips[s.service_id] for s in services)
-      day_departures = sum(
-          service_id_to_departures[s.service_id] for s in services)
-      date_trips.append((date, day_trips, day_departures))
+    date = date_start
+    one_day = datetime.timedelta(days=1)
+    for offset in xrange(count):
+      date_trips.append((date, day_trips[offset], day_departures[offset]))
+      date += one_day
     return date_trips
 
   def ValidateAgenciesHaveSameAgencyTimezone(self, problems):
@@ -981,10 +1617,7 @@ class Schedule(object):
     for stop in self.stops.values():
       if validate_children:
         stop.Validate(problems)
-      cursor = self._connection.cursor()
-      cursor.execute("SELECT count(*) FROM stop_times WHERE stop_id=? LIMIT 1",
-                     (stop.stop_id,))
-      count = cursor.fetchone()[0]
+      count = self._stop_time_store.CountStopRows(stop.stop_id)
       if stop.location_type == 0 and count == 0:
           problems.UnusedStop(stop.stop_id, stop.stop_name)
       elif stop.location_type == 1 and count != 0:
@@ -1101,12 +1734,11 @@ class Schedule(object):
     # (trip_id, first_arrival_secs, last_arrival_secs)
     trip_intervals_by_block_id = defaultdict(lambda: [])
 
-    for trip in sorted(self.trips.values()):
-      if trip.route_id not in self.routes:
-        continue
+    trip_ids = [trip.trip_id for trip in self.trips.values()
+                if trip.route_id in self.routes]
+    for trip, stop_times in self.IterStopTimesByTrip(trip_ids, problems):
       route_type = self.GetRoute(trip.route_id).route_type
       stop_ids = []
-      stop_times = trip.GetStopTimes(problems)
       self.ValidateStopTimesForTrip(problems, trip, stop_times)
       for index, st in enumerate(stop_times):
         stop_id = st.stop.stop_id
@@ -1258,17 +1890,8 @@ class Schedule(object):
               service_period_a = self.GetServicePeriod(trip_a.service_id)
               service_period_b = self.GetServicePeriod(trip_b.service_id)
 
-              dates_a = service_period_a.ActiveDates()
-              dates_b = service_period_b.ActiveDates()
-
-              overlap = False
-
-              for date in dates_a:
-                if date in dates_b:
-                  overlap = True
-                  break
-
-              service_period_overlap_cache[service_id_pair_key] = overlap
+              service_period_overlap_cache[service_id_pair_key] = (
+                  service_period_a.HasActiveDateInCommon(service_period_b))
 
             if service_period_overlap_cache[service_id_pair_key]:
               problems.OverlappingTripsInSameBlock(trip_a.trip_id,
@@ -1287,9 +1910,9 @@ class Schedule(object):
     # Make sure all trips have stop_times
     # We're doing this here instead of in Trip.Validate() so that
     # Trips can be validated without error during the reading of trips.txt
-    for trip in self.trips.values():
-      trip.ValidateChildren(problems)
-      count_stop_times = trip.GetCountStopTimes()
+    for trip, stop_times in self.IterStopTimesByTrip(problems=problems):
+      trip.ValidateChildren(problems, stop_times)
+      count_stop_times = len(stop_times)
       if not count_stop_times:
         problems.OtherProblem('The trip with the trip_id "%s" doesn\'t have '
                               'any stop times defined.' % trip.trip_id,
@@ -1305,8 +1928,12 @@ class Schedule(object):
                               trip.trip_id, type=problems_module.TYPE_WARNING)
       else:
         # These methods report InvalidValue if there's no first or last time
-        trip.GetStartTime(problems=problems)
-        trip.GetEndTime(problems=problems)
+        trip._GetStartTimeFromTimes(
+            (stop_times[0].arrival_secs, stop_times[0].departure_secs),
+            problems)
+        trip._GetEndTimeFromTimes(
+            (stop_times[-1].arrival_secs, stop_times[-1].departure_secs),
+            problems)
 
   def ValidateUnusedShapes(self, problems):
     # Check for unused shapes
@@ -21,9 +21,102 @@ import time
 import problems as problems_module
 import util
 
+# Map from valid "YYYYMMDD" strings to their date ordinals, see
+# _DateStringToOrdinal, and back, see _OrdinalToDateString
+_date_ordinals = {}
+_date_strings = {}
+# Incremented whenever the calendar of any ServicePeriod may have changed, see
+# ServicePeriod._GetCalendarGeneration
+_calendar_generation = 0
+
+
+def _DateStringToOrdinal(date):
+  """Return the proleptic Gregorian ordinal of a "YYYYMMDD" string or None if
+  it isn't a valid date."""
+  try:
+    return _date_ordinals[date]
+  except KeyError:
+    pass
+  except TypeError:
+    # Not hashable, so not a date string either
+    return None
+  date_object = util.DateStringToDateObject(date)
+  if date_object is None:
+    return None
+  _date_ordinals[date] = date_object.toordinal()
+  return _date_ordinals[date]
+
+
+def _OrdinalToDateString(ordinal):
+  try:
+    return _date_strings[ordinal]
+  except KeyError:
+    date_object = datetime.date.fromordinal(ordinal)
+    # strftime doesn't support years before 1900
+    _date_strings[ordinal] = '%04d%02d%02d' % (
+        date_object.year, date_object.month, date_object.day)
+    return _date_strings[ordinal]
+
+
+def _ClearsCalendar(method):
+  """Return a method which calls method after clearing the compiled calendar
+  of the ServicePeriod of the container."""
+  def ClearCalendarAndCall(self, *args, **kwargs):
+    self._service_period._ClearCalendar()
+    return method(self, *args, **kwargs)
+  return ClearCalendarAndCall
+
+
+class _DayOfWeekList(list):
+  """The day_of_week list of a ServicePeriod, which clears its compiled
+  calendar when it is changed."""
+  __slots__ = ('_service_period',)
+
+  def __init__(self, service_period, values):
+    list.__init__(self, values)
+    self._service_period = service_period
+
+  __setitem__ = _ClearsCalendar(list.__setitem__)
+  __delitem__ = _ClearsCalendar(list.__delitem__)
+  __setslice__ = _ClearsCalendar(list.__setslice__)
+  __delslice__ = _ClearsCalendar(list.__delslice__)
+  __iadd__ = _ClearsCalendar(list.__iadd__)
+  __imul__ = _ClearsCalendar(list.__imul__)
+  append = _ClearsCalendar(list.append)
+  extend = _ClearsCalendar(list.extend)
+  insert = _ClearsCalendar(list.insert)
+  pop = _ClearsCalendar(list.pop)
+  remove = _ClearsCalendar(list.remove)
+  reverse = _ClearsCalendar(list.reverse)
+  sort = _ClearsCalendar(list.sort)
+
+
+class _DateExceptionsDict(dict):
+  """The date_exceptions dict of a ServicePeriod, which clears its compiled
+  calendar when it is changed."""
+  __slots__ = ('_service_period',)
+
+  def __init__(self, service_period, items):
+    dict.__init__(self, items)
+    self._service_period = service_period
+
+  __setitem__ = _ClearsCalendar(dict.__setitem__)
+  __delitem__ = _ClearsCalendar(dict.__delitem__)
+  clear = _ClearsCalendar(dict.clear)
+  pop = _ClearsCalendar(dict.pop)
+  popitem = _ClearsCalendar(dict.popitem)
+  setdefault = _ClearsCalendar(dict.setdefault)
+  update = _ClearsCalendar(dict.update)
+
+
 class ServicePeriod(object):
   """Represents a service, which identifies a set of dates when one or more
-  trips operate."""
+  trips operate.
+
+  The dates are compiled on first use into a bitset with one bit for each day
+  from the first to the last date with service, see _GetCalendar. Assigning
+  start_date, end_date, day_of_week or date_exceptions, or changing the
+  day_of_week list or date_exceptions dict, clears it."""
   _DAYS_OF_WEEK = [
     'monday', 'tuesday', 'wednesday', 'thursday', 'friday',
     'saturday', 'sunday'
@@ -45,7 +138,12 @@ class ServicePeriod(object):
   _EXCEPTION_TYPE_ADD = 1
   _EXCEPTION_TYPE_REMOVE = 2
 
+  # Attributes which the compiled calendar depends on
+  _CALENDAR_ATTRIBUTES = ('start_date', 'end_date', 'day_of_week',
+                          'date_exceptions')
+
   def __init__(self, id=None, field_list=None):
+    self._calendar = None
     self.original_day_values = []
     if field_list:
       self.service_id = field_list[self._FIELD_NAMES.index('service_id')]
@@ -67,6 +165,117 @@ class ServicePeriod(object):
                               # exception type (1 = add, 2 = remove) and
                               # its context (used for exceptions)
 
+  def __setattr__(self, name, value):
+    if name in self._CALENDAR_ATTRIBUTES:
+      if name == 'day_of_week' and value is not None:
+        value = _DayOfWeekList(self, value)
+      elif name == 'date_exceptions' and value is not None:
+        value = _DateExceptionsDict(self, value)
+      self._ClearCalendar()
+    object.__setattr__(self, name, value)
+
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    del state['_calendar']
+    # Pickle plain containers, __setstate__ wraps them again
+    for name, container_class in (('day_of_week', list),
+                                  ('date_exceptions', dict)):
+      if state.get(name) is not None:
+        state[name] = container_class(state[name])
+    return state
+
+  def __setstate__(self, state):
+    self._calendar = None
+    for name, value in state.iteritems():
+      if name != '_calendar':
+        setattr(self, name, value)
+
+  def _ClearCalendar(self):
+    global _calendar_generation
+    _calendar_generation += 1
+    object.__setattr__(self, '_calendar', None)
+
+  @staticmethod
+  def _GetCalendarGeneration():
+    """Return a number which changes whenever the dates of any ServicePeriod
+    may have changed, so results derived from the dates of many periods can
+    tell if they are current."""
+    return _calendar_generation
+
+  def _GetCalendar(self):
+    """Return the compiled calendar of this service period.
+
+    Returns:
+      A tuple (first, bits). Bit i of the integer bits is set iff this service
+      is active on the day with ordinal first + i. bits is None if start_date
+      or end_date isn't a valid date, in which case the calendar has to be
+      checked one date string at a time.
+    """
+    calendar = self._calendar
+    if calendar is None:
+      calendar = self._CompileCalendar()
+      object.__setattr__(self, '_calendar', calendar)
+    return calendar
+
+  def _CompileCalendar(self):
+    regular_first = regular_last = None
+    if self.start_date and self.end_date:
+      start = _DateStringToOrdinal(self.start_date)
+      end = _DateStringToOrdinal(self.end_date)
+      if start is None or end is None:
+        return (None, None)
+      if start <= end:
+        regular_first, regular_last = start, end
+    exceptions = []
+    for date, (exception_type, _) in self.date_exceptions.iteritems():
+      # Exception dates which aren't valid never match a valid date
+      ordinal = _DateStringToOrdinal(date)
+      if ordinal is not None:
+        exceptions.append(
+            (ordinal, exception_type == self._EXCEPTION_TYPE_ADD))
+
+    active_ordinals = [ordinal for ordinal, added in exceptions if added]
+    if regular_first is not None:
+      active_ordinals += [regular_first, regular_last]
+    if not active_ordinals:
+      return (0, 0)
+    first = min(active_ordinals)
+    days = bytearray('0') * (max(active_ordinals) - first + 1)
+    if regular_first is not None:
+      # Ordinal 1 is a Monday
+      first_weekday = (regular_first - 1) % 7
+      for weekday, has_service in enumerate(self.day_of_week):
+        if not has_service:
+          continue
+        start = regular_first - first + (weekday - first_weekday) % 7
+        stop = regular_last - first + 1
+        days[start:stop:7] = '1' * len(xrange(start, stop, 7))
+    for ordinal, added in exceptions:
+      if first <= ordinal < first + len(days):
+        days[ordinal - first] = added and '1' or '0'
+    days.reverse()
+    return (first, long(str(days), 2))
+
+  def _GetActiveOffsets(self, first_ordinal, count):
+    """Return the sorted list of the offsets i in [0, count) such that this
+    service is active on the day with ordinal first_ordinal + i."""
+    first, bits = self._GetCalendar()
+    if bits is None:
+      offsets = []
+      for offset in xrange(count):
+        date_object = datetime.date.fromordinal(first_ordinal + offset)
+        if self.IsActiveOn(_OrdinalToDateString(first_ordinal + offset),
+                           date_object):
+          offsets.append(offset)
+      return offsets
+    if first_ordinal >= first:
+      bits >>= first_ordinal - first
+    else:
+      bits <<= first - first_ordinal
+    bits &= (1 << max(count, 0)) - 1
+    return [offset for offset, bit in enumerate(bin(bits)[:1:-1])
+            if bit == '1']
+
   def HasExceptions(self):
     """Checks if the ServicePeriod has service exceptions."""
     if self.date_exceptions:
@@ -203,6 +412,14 @@ class ServicePeriod(object):
     Returns:
       True iff this service is active on date.
     """
+    first, bits = self._GetCalendar()
+    if bits is not None:
+      if date_object is not None:
+        ordinal = date_object.toordinal()
+      else:
+        ordinal = _DateStringToOrdinal(date)
+      if ordinal is not None:
+        return ordinal >= first and bool(bits >> (ordinal - first) & 1)
     if date in self.date_exceptions:
       exception_type, _ = self.date_exceptions[date]
       if exception_type == self._EXCEPTION_TYPE_ADD:
@@ -218,6 +435,10 @@ class ServicePeriod(object):
 
   def ActiveDates(self):
     """Return dates this service period is active as a list of "YYYYMMDD"."""
+    first, bits = self._GetCalendar()
+    if bits is not None:
+      return [_OrdinalToDateString(first + offset)
+              for offset, bit in enumerate(bin(bits)[:1:-1]) if bit == '1']
     (earliest, latest) = self.GetDateRange()
     if earliest is None:
       return []
@@ -232,11 +453,25 @@ class ServicePeriod(object):
       date_it = date_it + delta
     return dates
 
+  def HasActiveDateInCommon(self, other):
+    """Return True iff this service period and other are both active on at
+    least one date."""
+    first, bits = self._GetCalendar()
+    other_first, other_bits = other._GetCalendar()
+    if bits is None or other_bits is None:
+      return bool(set(self.ActiveDates()).intersection(other.ActiveDates()))
+    if first <= other_first:
+      return bool(bits >> (other_first - first) & other_bits)
+    else:
+      return bool(bits & other_bits >> (first - other_first))
+
   def __getattr__(self, name):
     try:
+      # Look up name first so that attributes such as __setstate__ don't use
+      # day_of_week, which isn't set while unpickling.
+      day_index = self._DAYS_OF_WEEK.index(name)
       # Return 1 if value in day_of_week is True, 0 otherwise
-      return (self.day_of_week[self._DAYS_OF_WEEK.index(name)]
-              and 1 or 0)
+      return self.day_of_week[day_index] and 1 or 0
     except KeyError:
       pass
     except ValueError:  # not a day of the week
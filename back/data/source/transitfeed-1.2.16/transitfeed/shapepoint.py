@@ -34,6 +34,7 @@ class ShapePoint(GtfsObjectBase):
   _REQUIRED_FIELD_NAMES = ['shape_id', 'shape_pt_lat', 'shape_pt_lon',
                            'shape_pt_sequence']
   _FIELD_NAMES = _REQUIRED_FIELD_NAMES + ['shape_dist_traveled']
+  __slots__ = tuple(_FIELD_NAMES)
   def __init__(self, shape_id=None, lat=None, lon=None,seq=None, dist=None,
                field_dict=None):
     """Initialize a new ShapePoint object.
@@ -44,10 +45,9 @@ class ShapePoint(GtfsObjectBase):
     self._schedule = None
     if field_dict:
       if isinstance(field_dict, self.__class__):
-        for k, v in field_dict.iteritems():
-          self.__dict__[k] = v
+        self._SetAttributes(dict(field_dict.iteritems()))
       else:
-        self.__dict__.update(field_dict)
+        self._SetAttributes(field_dict)
     else:
       self.shape_id = shape_id
       self.shape_pt_lat = lat
@@ -41,6 +41,7 @@ class Stop(GtfsObjectBase):
                   'location_type', 'parent_station', 'stop_timezone',
                   'wheelchair_boarding']
   _TABLE_NAME = 'stops'
+  __slots__ = tuple(_FIELD_NAMES)
 
   LOCATION_TYPE_STATION = 1
 
@@ -61,10 +62,9 @@ class Stop(GtfsObjectBase):
       if isinstance(field_dict, self.__class__):
         # Special case so that we don't need to re-parse the attributes to
         # native types iteritems returns all attributes that don't start with _
-        for k, v in field_dict.iteritems():
-          self.__dict__[k] = v
+        self._SetAttributes(dict(field_dict.iteritems()))
       else:
-        self.__dict__.update(field_dict)
+        self._SetAttributes(field_dict)
     else:
       if lat is not None:
         self.stop_lat = lat
@@ -77,6 +77,8 @@ class Stop(GtfsObjectBase):
       if stop_code is not None:
         self.stop_code = stop_code
 
+  _FIELD_DICT_INIT = __init__
+
   def GetTrips(self, schedule=None):
     """Return iterable containing trips that visit this stop."""
     return [trip for trip, ss in self._GetTripSequence(schedule)]
@@ -90,36 +92,30 @@ class Stop(GtfsObjectBase):
     Args:
       schedule: Deprecated, do not use.
     """
+    schedule = self._GetSchedule(schedule)
+    return [(schedule.GetTrip(row[0]), row[1]) for row in
+            schedule._stop_time_store.GetStopVisits(self.stop_id)]
+
+  def _GetSchedule(self, schedule):
     if schedule is None:
       schedule = getattr(self, "_schedule", None)
     if schedule is None:
       warnings.warn("No longer supported. _schedule attribute is  used to get "
                     "stop_times table", DeprecationWarning)
-    cursor = schedule._connection.cursor()
-    cursor.execute("SELECT trip_id,stop_sequence FROM stop_times "
-                   "WHERE stop_id=?",
-                   (self.stop_id, ))
-    return [(schedule.GetTrip(row[0]), row[1]) for row in cursor]
+    return schedule
 
   def _GetTripIndex(self, schedule=None):
-    """Return a list of (trip, index).
+    """Return a list of (trip, index), ordered by time.
 
     trip: a Trip object
     index: an offset in trip.GetStopTimes()
     """
-    trip_index = []
-    for trip, sequence in self._GetTripSequence(schedule):
-      for index, st in enumerate(trip.GetStopTimes()):
-        if st.stop_sequence == sequence:
-          trip_index.append((trip, index))
-          break
-      else:
-        raise RuntimeError("stop_sequence %d not found in trip_id %s" %
-                           sequence, trip.trip_id)
-    return trip_index
+    schedule = self._GetSchedule(schedule)
+    return [(trip, index) for _, trip, index, _ in
+            schedule._GetStopTimeIndex().get(self.stop_id, [])]
 
   def GetStopTimeTrips(self, schedule=None):
-    """Return a list of (time, (trip, index), is_timepoint).
+    """Return a list of (time, (trip, index), is_timepoint), sorted by time.
 
     time: an integer. It might be interpolated.
     trip: a Trip object.
@@ -127,23 +123,35 @@ class Stop(GtfsObjectBase):
       different from the stop_sequence.
     is_timepoint: a bool
     """
+    schedule = self._GetSchedule(schedule)
     time_trips = []
-    for trip, index in self._GetTripIndex(schedule):
-      secs, stoptime, is_timepoint = trip.GetTimeInterpolatedStops()[index]
+    for secs, trip, index, is_timepoint in \
+        schedule._GetStopTimeIndex().get(self.stop_id, []):
+      if secs is None:
+        # Raises the error found when the index was made
+        trip.GetTimeInterpolatedStops()
       time_trips.append((secs, (trip, index), is_timepoint))
     return time_trips
 
-  def __getattr__(self, name):
-    """Return None or the default value if name is a known attribute.
-
-    This method is only called when name is not found in __dict__.
-    """
+  def _GetDefaultAttribute(self, name):
+    """Return None or the default value if name is a known attribute."""
     if name == "location_type":
       return 0
     elif name == "trip_index":
       return self._GetTripIndex()
     else:
-      return super(Stop, self).__getattr__(name)
+      return super(Stop, self)._GetDefaultAttribute(name)
+
+  def __setattr__(self, name, value):
+    """Set an attribute and let the schedule update its stop indexes."""
+    super(Stop, self).__setattr__(name, value)
+    if name[0] != '_' and self._schedule:
+      self._schedule._StopAttributeChanged(self, name)
+
+  def __delattr__(self, name):
+    super(Stop, self).__delattr__(name)
+    if name[0] != '_' and self._schedule:
+      self._schedule._StopAttributeChanged(self, name)
 
   def ValidateStopLatitude(self, problems):
     if self.stop_lat is not None:
@@ -0,0 +1,568 @@
+#!/usr/bin/python2.5
+
+# Copyright (C) 2007 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Indexes of the stops of a Schedule.
+
+StopGridIndex answers Schedule.GetNearestStops and
+Schedule.GetStopsInBoundingBox and StopSearchIndex answers
+Schedule.SearchStops.
+"""
+
+import bisect
+import heapq
+import itertools
+import math
+import re
+import unicodedata
+
+import util
+
+
+class StopGridIndex(object):
+  """Stops bucketed by their position in a grid of square lat/lon cells.
+
+  Cells are cell_size degrees on each side and are only stored when they
+  contain a stop. Stops without a numeric stop_lat and stop_lon are not
+  indexed. The grid does not wrap around the 180th meridian, so
+  GetNearestStops searches it a second time from the longitude shifted by
+  360 degrees when a stop across the meridian may be nearer.
+  """
+  # Number of stops per cell the cell size is chosen for
+  _STOPS_PER_CELL = 8
+  # Limits of the cell size chosen from the stops, in degrees
+  _MIN_CELL_SIZE = 0.0005
+  _MAX_CELL_SIZE = 1.0
+
+  def __init__(self, stops=(), cell_size=None):
+    """Args:
+      stops: an iterable of the Stop objects to index
+      cell_size: size of the cells in degrees, or None to pick one from the
+        number and extent of stops
+    """
+    stops = list(stops)
+    if cell_size is None:
+      cell_size = self._ChooseCellSize(stops)
+    self._cell_size = cell_size
+    # Map from (row, col) to the list of the stops in that cell
+    self._cells = {}
+    # Map from Stop to the (row, col) of its cell
+    self._stop_cells = {}
+    # Rows and columns of the cells that have ever held a stop
+    self._min_row = self._min_col = self._max_row = self._max_col = None
+    for stop in stops:
+      self.AddStop(stop)
+
+  @staticmethod
+  def _GetPosition(stop):
+    """Return (lat, lon) of stop as floats or None if it has no position."""
+    try:
+      return (float(stop.stop_lat), float(stop.stop_lon))
+    except (TypeError, ValueError):
+      return None
+
+  @classmethod
+  def _ChooseCellSize(cls, stops):
+    positions = filter(None, map(cls._GetPosition, stops))
+    if len(positions) < 2:
+      return cls._MAX_CELL_SIZE
+    lats = [lat for lat, lon in positions]
+    lons = [lon for lat, lon in positions]
+    area = max(max(lats) - min(lats), cls._MIN_CELL_SIZE) * \
+        max(max(lons) - min(lons), cls._MIN_CELL_SIZE)
+    cell_size = math.sqrt(area * cls._STOPS_PER_CELL / len(positions))
+    return min(max(cell_size, cls._MIN_CELL_SIZE), cls._MAX_CELL_SIZE)
+
+  def _GetCell(self, lat, lon):
+    return (int(math.floor(lat / self._cell_size)),
+            int(math.floor(lon / self._cell_size)))
+
+  def __len__(self):
+    return len(self._stop_cells)
+
+  def __contains__(self, stop):
+    return stop in self._stop_cells
+
+  def AddStop(self, stop):
+    """Add stop to the index at its current position."""
+    if stop in self._stop_cells:
+      self.RemoveStop(stop)
+    position = self._GetPosition(stop)
+    if position is None:
+      return
+    cell = self._GetCell(*position)
+    self._cells.setdefault(cell, []).append(stop)
+    self._stop_cells[stop] = cell
+    row, col = cell
+    if self._min_row is None:
+      self._min_row = self._max_row = row
+      self._min_col = self._max_col = col
+    else:
+      self._min_row = min(self._min_row, row)
+      self._max_row = max(self._max_row, row)
+      self._min_col = min(self._min_col, col)
+      self._max_col = max(self._max_col, col)
+
+  def RemoveStop(self, stop):
+    """Remove stop from the index if it is in it."""
+    cell = self._stop_cells.pop(stop, None)
+    if cell is None:
+      return
+    cell_stops = self._cells[cell]
+    for index, cell_stop in enumerate(cell_stops):
+      if cell_stop is stop:
+        del cell_stops[index]
+        break
+    if not cell_stops:
+      del self._cells[cell]
+
+  def MoveStop(self, stop):
+    """Update the index after the stop_lat or stop_lon of stop changed."""
+    self.AddStop(stop)
+
+  def _GetRingCells(self, row, col, ring):
+    """Return a list of the cells ring cells away from (row, col), that is on
+    the border of the square of side 2 * ring + 1 centered on it, which are
+    within the rows and columns that have held a stop."""
+    if ring == 0:
+      return [(row, col)]
+    ring_cells = []
+    first_col = max(col - ring, self._min_col)
+    last_col = min(col + ring, self._max_col)
+    for ring_row in (row - ring, row + ring):
+      if self._min_row <= ring_row <= self._max_row:
+        ring_cells.extend((ring_row, ring_col)
+                          for ring_col in xrange(first_col, last_col + 1))
+    first_row = max(row - ring + 1, self._min_row)
+    last_row = min(row + ring - 1, self._max_row)
+    for ring_col in (col - ring, col + ring):
+      if self._min_col <= ring_col <= self._max_col:
+        ring_cells.extend((ring_row, ring_col)
+                          for ring_row in xrange(first_row, last_row + 1))
+    return ring_cells
+
+  def _IterRingCells(self, row, col, ring):
+    """Yield (ring, list of cells) for the rings of cells around (row, col)
+    that may hold a stop, starting at ring.
+
+    Cells of the rings are looked up until a ring has more cells than the
+    index holds. The remaining cells that hold stops are then sorted by ring
+    instead, so that sparse areas are not scanned cell by cell."""
+    last_ring = max(row - self._min_row, self._max_row - row,
+                    col - self._min_col, self._max_col - col)
+    while ring <= last_ring:
+      ring_cells = self._GetRingCells(row, col, ring)
+      if len(ring_cells) > len(self._cells):
+        break
+      yield ring, ring_cells
+      ring += 1
+    else:
+      return
+    cells_by_ring = {}
+    for cell in self._cells:
+      cell_ring = max(abs(cell[0] - row), abs(cell[1] - col))
+      if cell_ring >= ring:
+        cells_by_ring.setdefault(cell_ring, []).append(cell)
+    for cell_ring in sorted(cells_by_ring):
+      yield cell_ring, cells_by_ring[cell_ring]
+
+  def _GetDistanceOutsideSquare(self, lat, lon, row, col, ring):
+    """Return a lower bound in meters of the distance from lat, lon to any
+    point outside the square of the cells at most ring cells away from
+    (row, col)."""
+    cell_size = self._cell_size
+    degree_lat = min(lat - (row - ring) * cell_size,
+                     (row + ring + 1) * cell_size - lat)
+    degree_lon = min(lon - (col - ring) * cell_size,
+                     (col + ring + 1) * cell_size - lon)
+    lat_distance = math.radians(max(degree_lat, 0.0))
+    # Distance to the nearest meridian outside the square, which is at least
+    # the distance to the great circle it is on
+    lon_distance = math.asin(min(1.0, math.cos(math.radians(lat)) *
+        math.sin(math.radians(min(max(degree_lon, 0.0), 90.0)))))
+    return util.EARTH_RADIUS * min(lat_distance, lon_distance)
+
+  @staticmethod
+  def _GetDistanceToAntimeridian(lat, lon):
+    """Return a lower bound in meters of the distance from lat, lon to any
+    point of the 180th meridian."""
+    degree_lon = 180.0 - abs(lon)
+    # Past 90 degrees the nearest point of the meridian is the pole
+    return util.EARTH_RADIUS * math.asin(min(1.0, math.cos(math.radians(lat)) *
+        math.sin(math.radians(min(max(degree_lon, 0.0), 90.0)))))
+
+  def GetNearestStops(self, lat, lon, n=1, max_distance=None):
+    """Return a list of the n stops nearest to lat, lon, ordered by distance.
+
+    Distances are computed with util.ApproximateDistance. Rings of cells
+    around the cell of lat, lon are searched until no stop outside of them
+    can be nearer than the n-th stop found. If a stop across the 180th
+    meridian may still be nearer the rings around lon shifted by 360 degrees
+    are searched too.
+
+    Args:
+      lat, lon: the position to search from, in degrees
+      n: the maximum number of stops to return
+      max_distance: if not None only stops at most this many meters away are
+        returned
+    """
+    if n <= 0 or not self._stop_cells:
+      return []
+    nearest = self._FindNearestStops(lat, lon, n, max_distance)
+    if len(nearest) == n:
+      distance_limit = nearest[-1][0]
+    else:
+      distance_limit = max_distance
+    if (distance_limit is None or
+        distance_limit > self._GetDistanceToAntimeridian(lat, lon)):
+      if lon >= 0:
+        shifted_lon = lon - 360.0
+      else:
+        shifted_lon = lon + 360.0
+      found = set(stop for _, stop in nearest)
+      nearest.extend(entry for entry in self._FindNearestStops(
+                         lat, shifted_lon, n, max_distance)
+                     if entry[1] not in found)
+      nearest.sort(key=lambda entry: entry[0])
+    return [stop for _, stop in nearest[:n]]
+
+  def _FindNearestStops(self, lat, lon, n, max_distance):
+    """Return a list of (distance, stop) for the n stops nearest to lat, lon
+    without wrapping around the 180th meridian, ordered by distance."""
+    row, col = self._GetCell(lat, lon)
+    # Rings that are entirely outside the cells holding stops are empty
+    first_ring = max(0, self._min_row - row, row - self._max_row,
+                     self._min_col - col, col - self._max_col)
+    # Heap of (-distance, -order, stop) for the n nearest stops found so far
+    nearest = []
+    order = 0
+    for ring, ring_cells in self._IterRingCells(row, col, first_ring):
+      for stop in itertools.chain(*[self._cells.get(cell, ())
+                                    for cell in ring_cells]):
+        position = self._GetPosition(stop)
+        if position is None:
+          continue
+        distance = util.ApproximateDistance(lat, lon, *position)
+        if max_distance is not None and distance > max_distance:
+          continue
+        order += 1
+        entry = (-distance, -order, stop)
+        if len(nearest) < n:
+          heapq.heappush(nearest, entry)
+        elif entry > nearest[0]:
+          heapq.heapreplace(nearest, entry)
+      bound = self._GetDistanceOutsideSquare(lat, lon, row, col, ring)
+      if len(nearest) == n and -nearest[0][0] <= bound:
+        break
+      if max_distance is not None and bound > max_distance:
+        break
+    nearest.sort(reverse=True)
+    return [(-distance, stop) for distance, _, stop in nearest]
+
+  def _IterBoxCells(self, north, east, south, west):
+    """Yield the cells that hold stops and overlap the box, by row and then
+    column."""
+    first_row, first_col = self._GetCell(south, west)
+    last_row, last_col = self._GetCell(north, east)
+    first_row = max(first_row, self._min_row)
+    last_row = min(last_row, self._max_row)
+    first_col = max(first_col, self._min_col)
+    last_col = min(last_col, self._max_col)
+    if first_row > last_row or first_col > last_col:
+      return
+    if (last_row - first_row + 1) * (last_col - first_col + 1) > \
+        len(self._cells):
+      # Most cells of the box are empty
+      for cell in sorted(self._cells):
+        if (first_row <= cell[0] <= last_row and
+            first_col <= cell[1] <= last_col):
+          yield cell
+      return
+    for row in xrange(first_row, last_row + 1):
+      for col in xrange(first_col, last_col + 1):
+        if (row, col) in self._cells:
+          yield (row, col)
+
+  def _IterStopsInBox(self, cells, north, east, south, west):
+    """Yield the stops of cells that are within the box. Only the stops of
+    the cells on the edges of the box need to be checked."""
+    cell_size = self._cell_size
+    for cell in cells:
+      row, col = cell
+      if (south <= row * cell_size and (row + 1) * cell_size <= north and
+          west <= col * cell_size and (col + 1) * cell_size <= east):
+        for stop in self._cells[cell]:
+          yield stop
+        continue
+      for stop in self._cells[cell]:
+        position = self._GetPosition(stop)
+        if (position is not None and south <= position[0] <= north and
+            west <= position[1] <= east):
+          yield stop
+
+  def GetStopsInBoundingBox(self, north, east, south, west, n=None,
+                            sample=False):
+    """Return a list of up to n stops within the bounding box.
+
+    Boxes crossing the 180th meridian are not handled.
+
+    Args:
+      north, east, south, west: the edges of the box, in degrees
+      n: the maximum number of stops to return or None for all of them
+      sample: if False the first n stops found are returned, which are near
+        each other when more than n stops are in the box. If True they are
+        picked from all over the box.
+    """
+    if n is not None and n <= 0:
+      return []
+    cells = self._IterBoxCells(north, east, south, west)
+    if sample and n is not None:
+      return self._SampleStops(list(cells), north, east, south, west, n)
+    return list(itertools.islice(
+        self._IterStopsInBox(cells, north, east, south, west), n))
+
+  def _SampleStops(self, cells, north, east, south, west, n):
+    """Return up to n stops of cells within the box, spread over it.
+
+    The box is split in about n parts of equal size and stops are taken
+    from each part that has some in turn, so that dense areas don't get
+    more than their share until the sparse areas run out of stops. Only the
+    stops that are returned are looked at."""
+    side = int(math.ceil(math.sqrt(n)))
+    height = max(float(north - south), 1e-9) / side
+    width = max(float(east - west), 1e-9) / side
+    cell_size = self._cell_size
+    def GetPartIndex(index, start, part_size):
+      # The part of the center of the cells in row or column index
+      part_index = int(((index + 0.5) * cell_size - start) // part_size)
+      return min(max(part_index, 0), side - 1)
+    part_rows = {}
+    part_cols = {}
+    parts = {}
+    for cell in cells:
+      row, col = cell
+      if row not in part_rows:
+        part_rows[row] = GetPartIndex(row, south, height)
+      if col not in part_cols:
+        part_cols[col] = GetPartIndex(col, west, width)
+      parts.setdefault((part_rows[row], part_cols[col]), []).append(cell)
+    part_stops = [self._IterStopsInBox(parts[part], north, east, south, west)
+                  for part in sorted(parts)]
+    sample = []
+    while part_stops:
+      remaining_part_stops = []
+      for stops in part_stops:
+        for stop in stops:
+          sample.append(stop)
+          if len(sample) == n:
+            return sample
+          remaining_part_stops.append(stops)
+          break
+      part_stops = remaining_part_stops
+    return sample
+
+
+class StopSearchIndex(object):
+  """Index of the normalized stop_id and stop_name of stops for substring
+  search.
+
+  Texts are normalized by NormalizeText. Each stop is listed under every
+  trigram of its texts, so the stops containing a query of three or more
+  characters are among those listed under the rarest trigram of the query.
+  Shorter queries use the sorted list of the words of the texts to find the
+  texts starting with them, then scan the rest.
+  """
+  _GRAM_SIZE = 3
+  # Ranks of the ways a stop can match a query, best first
+  _RANK_EXACT = 0
+  _RANK_PREFIX = 1
+  _RANK_WORD_PREFIX = 2
+  _RANK_SUBSTRING = 3
+
+  def __init__(self, stops=()):
+    # Map from Stop to the tuple of its normalized texts
+    self._stop_texts = {}
+    # Map from trigram to the list of the stops with a text containing it
+    self._gram_stops = {}
+    # Sorted list of (word, id(stop)) for the words of the texts, and the map
+    # from id(stop) back to the stop
+    self._words = []
+    self._stops_by_id = {}
+    for stop in stops:
+      self._AddStopTexts(stop)
+    self._words.sort()
+
+  @staticmethod
+  def NormalizeText(text):
+    """Return text as lower case unicode without accents and with runs of
+    white space replaced by one space."""
+    if text is None:
+      return u''
+    if not isinstance(text, unicode):
+      text = str(text).decode('utf-8', 'replace')
+    try:
+      # Most texts are ASCII, which has no accents to strip
+      text.encode('ascii')
+    except UnicodeError:
+      text = unicodedata.normalize('NFKD', text)
+      text = u''.join(c for c in text if not unicodedata.combining(c))
+    return u' '.join(text.lower().split())
+
+  def _GetTexts(self, stop):
+    texts = []
+    for text in (stop.stop_id, stop.stop_name):
+      text = self.NormalizeText(text)
+      if text and text not in texts:
+        texts.append(text)
+    return tuple(texts)
+
+  def _GetGrams(self, texts):
+    grams = set()
+    for text in texts:
+      for start in xrange(len(text) - self._GRAM_SIZE + 1):
+        grams.add(text[start:start + self._GRAM_SIZE])
+    return grams
+
+  @staticmethod
+  def _GetWords(texts):
+    words = set()
+    for text in texts:
+      words.add(text)
+      words.update(re.findall(r'\w+', text, re.UNICODE))
+    return words
+
+  def _AddStopTexts(self, stop):
+    texts = self._GetTexts(stop)
+    self._stop_texts[stop] = texts
+    for gram in self._GetGrams(texts):
+      self._gram_stops.setdefault(gram, []).append(stop)
+    self._stops_by_id[id(stop)] = stop
+    for word in self._GetWords(texts):
+      self._words.append((word, id(stop)))
+
+  def __len__(self):
+    return len(self._stop_texts)
+
+  def __contains__(self, stop):
+    return stop in self._stop_texts
+
+  def AddStop(self, stop):
+    """Add stop to the index with its current stop_id and stop_name."""
+    if stop in self._stop_texts:
+      self.RemoveStop(stop)
+    texts = self._GetTexts(stop)
+    self._stop_texts[stop] = texts
+    self._stops_by_id[id(stop)] = stop
+    for gram in self._GetGrams(texts):
+      self._gram_stops.setdefault(gram, []).append(stop)
+    for word in self._GetWords(texts):
+      bisect.insort(self._words, (word, id(stop)))
+
+  def RemoveStop(self, stop):
+    """Remove stop from the index if it is in it."""
+    texts = self._stop_texts.pop(stop, None)
+    if texts is None:
+      return
+    del self._stops_by_id[id(stop)]
+    for gram in self._GetGrams(texts):
+      gram_stops = self._gram_stops[gram]
+      for index, gram_stop in enumerate(gram_stops):
+        if gram_stop is stop:
+          del gram_stops[index]
+          break
+      if not gram_stops:
+        del self._gram_stops[gram]
+    for word in self._GetWords(texts):
+      del self._words[bisect.bisect_left(self._words, (word, id(stop)))]
+
+  def UpdateStop(self, stop):
+    """Update the index after the stop_id or stop_name of stop changed."""
+    self.AddStop(stop)
+
+  def _GetRank(self, texts, query):
+    """Return the best rank of query in texts or None if it isn't in any."""
+    best_rank = None
+    for text in texts:
+      position = text.find(query)
+      if position == -1:
+        continue
+      if text == query:
+        return self._RANK_EXACT
+      elif position == 0:
+        rank = self._RANK_PREFIX
+      elif re.search(r'(?<!\w)' + re.escape(query), text, re.UNICODE):
+        rank = self._RANK_WORD_PREFIX
+      else:
+        rank = self._RANK_SUBSTRING
+      if best_rank is None or rank < best_rank:
+        best_rank = rank
+    return best_rank
+
+  def _SortKey(self, rank, stop):
+    texts = self._stop_texts[stop]
+    return (rank, texts[-1], texts[0], id(stop))
+
+  def Search(self, query, limit=None):
+    """Return a list of the stops with query in their stop_id or stop_name.
+
+    Stops are ordered by how they match: exact matches, then texts starting
+    with query, then texts with a word starting with query, then other
+    matches. Stops that match the same way are ordered by name and id.
+
+    Args:
+      query: the text to search for, normalized like the texts of the stops
+      limit: the maximum number of stops to return or None for all of them
+    """
+    query = self.NormalizeText(query)
+    if not query or (limit is not None and limit <= 0):
+      return []
+    if len(query) >= self._GRAM_SIZE:
+      candidates = None
+      for gram in self._GetGrams([query]):
+        gram_stops = self._gram_stops.get(gram, ())
+        if candidates is None or len(gram_stops) < len(candidates):
+          candidates = gram_stops
+      matches = []
+      for stop in candidates:
+        rank = self._GetRank(self._stop_texts[stop], query)
+        if rank is not None:
+          matches.append(self._SortKey(rank, stop) + (stop,))
+      return [match[-1] for match in heapq.nsmallest(
+          len(matches) if limit is None else limit, matches)]
+
+    # Short queries match many stops so the stops with a word starting with
+    # the query are found first and the others are only scanned if needed
+    ranks = {}
+    index = bisect.bisect_left(self._words, (query, ))
+    while (index < len(self._words) and
+           self._words[index][0].startswith(query)):
+      stop = self._stops_by_id[self._words[index][1]]
+      if stop not in ranks:
+        ranks[stop] = self._GetRank(self._stop_texts[stop], query)
+      index += 1
+    matches = [self._SortKey(rank, stop) + (stop,)
+               for stop, rank in ranks.iteritems()]
+    if limit is None:
+      matches.sort()
+    else:
+      matches = heapq.nsmallest(limit, matches)
+    stops = [match[-1] for match in matches]
+    if limit is None or len(stops) < limit:
+      others = [stop for stop, texts in self._stop_texts.iteritems()
+                if stop not in ranks and
+                any(query in text for text in texts)]
+      others.sort(key=lambda stop: self._SortKey(self._RANK_SUBSTRING, stop))
+      stops.extend(others)
+    return stops[:limit]
@@ -160,6 +160,29 @@ class StopTime(object):
     if stop_sequence is not None:
       self.stop_sequence = stop_sequence
 
+  @classmethod
+  def _FromStoredRow(cls, stop, row):
+    """Return a new StopTime for a row returned by GetTripRows of a stop_times
+    store, without the checks and conversions of __init__.
+
+    The values of the row were converted by the StopTime stored in it, so this
+    gives the same object as __init__ when that doesn't find a problem. Use it
+    only for rows known to be valid, see Trip._CreateStopTimes. Subclasses
+    that set other attributes in __init__ should override it.
+    """
+    stop_time = cls.__new__(cls)
+    (stop_time.arrival_secs, stop_time.departure_secs, stop_time.stop_headsign,
+     stop_time.pickup_type, stop_time.drop_off_type, shape_dist_traveled, _,
+     stop_sequence, stop_time.timepoint) = row
+    stop_time.stop = stop
+    if shape_dist_traveled == "":
+      stop_time.shape_dist_traveled = None
+    else:
+      stop_time.shape_dist_traveled = shape_dist_traveled
+    if stop_sequence is not None:
+      stop_time.stop_sequence = stop_sequence
+    return stop_time
+
   def GetFieldValuesTuple(self, trip_id):
     """Return a tuple that outputs a row of _FIELD_NAMES to be written to a
        GTFS file.
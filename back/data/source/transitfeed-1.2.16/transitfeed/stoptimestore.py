@@ -0,0 +1,626 @@
+#!/usr/bin/python2.5
+
+# Copyright (C) 2007 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Storage engines for the stop_times of a Schedule.
+
+A Schedule keeps its stop_times in one of the stores below instead of in Trip
+objects. Rows are added as the tuples returned by StopTime.GetSqlValuesTuple,
+with the columns of StopTime._SQL_FIELD_NAMES, and the rows of one trip are
+read back as tuples of _TRIP_ROW_FIELD_NAMES ordered by stop_sequence.
+"""
+
+import array
+import itertools
+import operator
+
+import util
+
+# Columns of the rows returned by GetTripRows
+_TRIP_ROW_FIELD_NAMES = ['arrival_secs', 'departure_secs', 'stop_headsign',
+                         'pickup_type', 'drop_off_type', 'shape_dist_traveled',
+                         'stop_id', 'stop_sequence', 'timepoint']
+
+_CREATE_TABLE_SQL = """CREATE TABLE %s (
+                                       trip_id CHAR(50),
+                                       arrival_secs INTEGER,
+                                       departure_secs INTEGER,
+                                       stop_id CHAR(50),
+                                       stop_sequence INTEGER,
+                                       stop_headsign VAR CHAR(100),
+                                       pickup_type INTEGER,
+                                       drop_off_type INTEGER,
+                                       shape_dist_traveled FLOAT,
+                                       timepoint INTEGER);"""
+
+
+def _CreateIndexes(cursor, database):
+  """Create the indexes of the stop_times table of database, '' for the main
+  database or 'snapshot.' for the one attached as snapshot."""
+  cursor.execute("""CREATE INDEX IF NOT EXISTS %strip_index
+                    ON stop_times (trip_id, stop_sequence);""" % database)
+  cursor.execute("""CREATE INDEX IF NOT EXISTS %sstop_index
+                    ON stop_times (stop_id);""" % database)
+
+
+class SqliteStopTimeStore(object):
+  """Keeps stop_times in the stop_times table of a SQLite database."""
+
+  def __init__(self, connection, sql_field_names, create_table=True):
+    """Create the stop_times table and its indexes.
+
+    Args:
+      connection: a connection to the SQLite database
+      sql_field_names: the columns of the rows passed to AddRows
+      create_table: False to use the stop_times table and indexes already in
+        the database, for example those of a snapshot written by
+        SaveSnapshotRows
+    """
+    self._connection = connection
+    self._insert_query = "INSERT INTO stop_times (%s) VALUES (%s);" % (
+        ','.join(sql_field_names), ','.join(['?'] * len(sql_field_names)))
+    if create_table:
+      cursor = self._connection.cursor()
+      cursor.execute(_CREATE_TABLE_SQL % 'stop_times')
+      self._CreateIndexes()
+
+  def _CreateIndexes(self):
+    _CreateIndexes(self._connection.cursor(), '')
+
+  def _DropIndexes(self):
+    cursor = self._connection.cursor()
+    cursor.execute("DROP INDEX IF EXISTS trip_index;")
+    cursor.execute("DROP INDEX IF EXISTS stop_index;")
+
+  def BeginBulkAdd(self):
+    """Prepare for adding many rows. Inserting many rows and then rebuilding
+    the indexes in EndBulkAdd is much faster than updating the indexes for
+    every row."""
+    self._DropIndexes()
+
+  def EndBulkAdd(self):
+    """Finish adding the rows added since BeginBulkAdd."""
+    self._connection.commit()
+    self._CreateIndexes()
+
+  def AddRows(self, rows):
+    """Add rows, a list of tuples as returned by StopTime.GetSqlValuesTuple."""
+    if not rows:
+      return
+    cursor = self._connection.cursor()
+    cursor.executemany(self._insert_query, rows)
+
+  def Clear(self):
+    """Remove all rows."""
+    self._connection.cursor().execute("DELETE FROM stop_times;")
+
+  def GetTripRows(self, trip_id):
+    """Return a list of rows of _TRIP_ROW_FIELD_NAMES for the trip, ordered by
+    stop_sequence."""
+    cursor = self._connection.cursor()
+    cursor.execute(
+        'SELECT arrival_secs,departure_secs,stop_headsign,pickup_type,'
+        'drop_off_type,shape_dist_traveled,stop_id,stop_sequence,timepoint '
+        'FROM stop_times '
+        'WHERE trip_id=? '
+        'ORDER BY stop_sequence', (trip_id,))
+    return cursor.fetchall()
+
+  def IterTripRows(self, trip_ids=None, field_names=_TRIP_ROW_FIELD_NAMES):
+    """Yield (trip_id, rows) for each trip that has rows, ordered by trip_id,
+    where rows is a list of tuples of field_names values ordered by
+    stop_sequence, by default the list returned by GetTripRows. If trip_ids is
+    not None only the trips in it are included. Rows must not be added or
+    deleted until the iteration is done."""
+    select = 'SELECT trip_id,%s FROM stop_times ' % ','.join(field_names)
+    cursor = self._connection.cursor()
+    if trip_ids is None:
+      cursor.execute(select + 'ORDER BY trip_id, stop_sequence')
+      queries = [cursor]
+    else:
+      trip_ids = sorted(set(trip_ids))
+      queries = self._IterTripIdQueries(cursor, select, trip_ids)
+    for query in queries:
+      for trip_id, rows in itertools.groupby(query, operator.itemgetter(0)):
+        yield trip_id, [row[1:] for row in rows]
+
+  def _IterTripIdQueries(self, cursor, select, trip_ids):
+    """Execute select for the rows of trip_ids a few hundred trips at a time,
+    staying below the SQLite limit on query parameters, and yield cursor after
+    each query."""
+    for start in xrange(0, len(trip_ids), 500):
+      batch = trip_ids[start:start + 500]
+      cursor.execute(select + 'WHERE trip_id IN (%s) '
+                     'ORDER BY trip_id, stop_sequence' %
+                     ','.join(['?'] * len(batch)), batch)
+      yield cursor
+
+  def CountTripRows(self, trip_id):
+    cursor = self._connection.cursor()
+    cursor.execute(
+        'SELECT count(*) FROM stop_times WHERE trip_id=?', (trip_id,))
+    return cursor.fetchone()[0]
+
+  def CountRowsByTrip(self):
+    """Return a dict mapping the trip_id of each trip that has rows to its
+    number of rows."""
+    cursor = self._connection.cursor()
+    cursor.execute('SELECT trip_id,count(*) FROM stop_times GROUP BY trip_id')
+    return dict(cursor.fetchall())
+
+  def GetTripFirstTimes(self, trip_id):
+    """Return (arrival_secs, departure_secs) of the first row of the trip or
+    None if it has no rows."""
+    cursor = self._connection.cursor()
+    cursor.execute(
+        'SELECT arrival_secs,departure_secs FROM stop_times WHERE '
+        'trip_id=? ORDER BY stop_sequence LIMIT 1', (trip_id,))
+    return cursor.fetchone()
+
+  def GetTripLastTimes(self, trip_id):
+    """Return (arrival_secs, departure_secs) of the last row of the trip or
+    None if it has no rows."""
+    cursor = self._connection.cursor()
+    cursor.execute(
+        'SELECT arrival_secs,departure_secs FROM stop_times WHERE '
+        'trip_id=? ORDER BY stop_sequence DESC LIMIT 1', (trip_id,))
+    return cursor.fetchone()
+
+  def GetTripMaxima(self, trip_id):
+    """Return the greatest (stop_sequence, arrival_secs, departure_secs) of
+    the trip, each None if the trip has no value for it."""
+    cursor = self._connection.cursor()
+    cursor.execute("SELECT max(stop_sequence), max(arrival_secs), "
+                   "max(departure_secs) FROM stop_times WHERE trip_id=?",
+                   (trip_id,))
+    return cursor.fetchone()
+
+  def GetTripDuplicateSequences(self, trip_id):
+    """Return the sorted list of stop_sequence values found in more than one
+    row of the trip."""
+    cursor = self._connection.cursor()
+    cursor.execute("SELECT COUNT(stop_sequence) AS a, stop_sequence "
+                   "FROM stop_times "
+                   "WHERE trip_id=? GROUP BY stop_sequence HAVING a > 1",
+                   (trip_id,))
+    return [row[1] for row in cursor]
+
+  def DeleteTripRows(self, trip_id):
+    cursor = self._connection.cursor()
+    cursor.execute('DELETE FROM stop_times WHERE trip_id=?', (trip_id,))
+
+  def DeleteTripRow(self, trip_id, stop_sequence, stop_id):
+    """Delete the rows of the trip with stop_sequence and stop_id and return
+    the number of rows deleted."""
+    cursor = self._connection.cursor()
+    cursor.execute("DELETE FROM stop_times WHERE trip_id=? and "
+                   "stop_sequence=? and stop_id=?",
+                   (trip_id, stop_sequence, stop_id))
+    return cursor.rowcount
+
+  def GetStopVisits(self, stop_id):
+    """Return a list of (trip_id, stop_sequence) for the rows of the stop."""
+    cursor = self._connection.cursor()
+    cursor.execute("SELECT trip_id,stop_sequence FROM stop_times "
+                   "WHERE stop_id=?",
+                   (stop_id, ))
+    return cursor.fetchall()
+
+  def CountStopRows(self, stop_id):
+    cursor = self._connection.cursor()
+    cursor.execute("SELECT count(*) FROM stop_times WHERE stop_id=? LIMIT 1",
+                   (stop_id,))
+    return cursor.fetchone()[0]
+
+  def SaveSnapshotRows(self, cursor):
+    """Copy all rows to the stop_times table of the database attached as
+    snapshot to the connection of cursor and index it. The rows are written
+    in trip order so that the rows of a trip are stored together."""
+    cursor.execute(_CREATE_TABLE_SQL % 'snapshot.stop_times')
+    cursor.execute("INSERT INTO snapshot.stop_times SELECT * FROM stop_times "
+                   "ORDER BY trip_id, stop_sequence;")
+    _CreateIndexes(cursor, 'snapshot.')
+
+  def LoadSnapshotRows(self, cursor):
+    """Add the rows of the stop_times table of the database attached as
+    snapshot to the connection of cursor."""
+    self.BeginBulkAdd()
+    try:
+      cursor.execute("INSERT INTO stop_times SELECT * FROM "
+                     "snapshot.stop_times;")
+    finally:
+      self.EndBulkAdd()
+
+
+class ArrayStopTimeStore(object):
+  """Keeps stop_times in typed arrays, one per column, which use much less
+  memory than SQLite or StopTime objects.
+
+  The rows are kept sorted by trip and stop_sequence so the rows of a trip are
+  a slice of the arrays, found in _trip_slices. Rows added later are kept in
+  the tail of the arrays and deleted rows are marked in place, until there
+  are enough of them to sort the arrays again. Strings are stored as an index
+  in _strings, None values as the smallest value of the array type.
+  """
+  # (typecode, name) of each array in the order of StopTime._SQL_FIELD_NAMES.
+  # Integer arrays are replaced by a larger type when a value doesn't fit and
+  # by a 'd' array when a value is a float, such as a fractional time.
+  _COLUMNS = [('i', 'trip_id'), ('i', 'arrival_secs'), ('i', 'departure_secs'),
+              ('i', 'stop_id'), ('i', 'stop_sequence'), ('i', 'stop_headsign'),
+              ('b', 'pickup_type'), ('b', 'drop_off_type'),
+              ('d', 'shape_dist_traveled'), ('b', 'timepoint')]
+  _STRING_COLUMNS = (0, 3, 5)
+  _TRIP, _ARRIVAL, _DEPARTURE, _STOP, _SEQUENCE = range(5)
+  # Index in the rows of StopTime._SQL_FIELD_NAMES of each column of
+  # _TRIP_ROW_FIELD_NAMES
+  _TRIP_ROW_COLUMNS = [1, 2, 5, 6, 7, 8, 3, 4, 9]
+  # Rows in the tail, or deleted, before the arrays are sorted again
+  _MIN_UNSORTED_ROWS = 1000
+
+  def __init__(self):
+    self.Clear()
+
+  def Clear(self):
+    """Remove all rows."""
+    self._columns = [array.array(typecode) for typecode, _ in self._COLUMNS]
+    self._strings = []
+    self._string_indexes = {}
+    self._sorted_count = 0  # Rows before this index are sorted
+    self._trip_slices = {}  # trip index to (start, end) in the sorted rows
+    self._tail_rows = {}  # trip index to indexes of the rows in the tail
+    self._deleted_count = 0
+    self._stop_rows = None  # stop index to row indexes, see _GetStopRows
+    self._bulk_add = False  # True between BeginBulkAdd and EndBulkAdd
+
+  @staticmethod
+  def _NoneValue(column):
+    if column.typecode == 'd':
+      return float('nan')
+    return -1 << (column.itemsize * 8 - 1)
+
+  def _StringIndex(self, value):
+    if value is None:
+      return None
+    try:
+      return self._string_indexes[value]
+    except KeyError:
+      index = len(self._strings)
+      self._strings.append(value)
+      self._string_indexes[value] = index
+      return index
+
+  _WIDER_TYPECODES = {'b': 'i', 'i': 'l'}
+
+  def _ReplaceColumn(self, i, typecode):
+    """Replace column i by an array of typecode with the same values."""
+    column = self._columns[i]
+    none_value = self._NoneValue(column)
+    wider_column = array.array(typecode)
+    wider_none_value = self._NoneValue(wider_column)
+    wider_column.extend(wider_none_value if v == none_value else v
+                        for v in column)
+    self._columns[i] = wider_column
+
+  def _ExtendColumn(self, i, values):
+    """Append values to column i, replacing it by a wider array if needed.
+    The column is left unchanged if a value can't be stored."""
+    column = self._columns[i]
+    if column.typecode == 'd':
+      values = [None if v == '' else v for v in values]
+    name = self._COLUMNS[i][1]
+    length = len(column)
+    while True:
+      none_value = self._NoneValue(column)
+      try:
+        column.extend([none_value if v is None else v for v in values])
+        return
+      except TypeError:
+        del column[length:]
+        if column.typecode == 'd' or not all(
+            isinstance(v, (int, long, float)) or v is None for v in values):
+          raise TypeError("Can't store %r in the %s column of stop_times" %
+                          ([v for v in values if v is not None], name))
+        typecode = 'd'
+      except OverflowError:
+        del column[length:]
+        if column.typecode not in self._WIDER_TYPECODES:
+          raise OverflowError("Value too large for the %s column of "
+                              "stop_times" % name)
+        typecode = self._WIDER_TYPECODES[column.typecode]
+      self._ReplaceColumn(i, typecode)
+      column = self._columns[i]
+
+  def _GetColumnValues(self, i, row_indexes):
+    """Return the list of values of column i in the rows row_indexes, which
+    is a list or an xrange of consecutive rows."""
+    column = self._columns[i]
+    if isinstance(row_indexes, xrange):
+      if not row_indexes:
+        return []
+      values = column[row_indexes[0]:row_indexes[-1] + 1]
+    else:
+      values = [column[row_index] for row_index in row_indexes]
+    if column.typecode == 'd':
+      if self._COLUMNS[i][0] != 'd':
+        # An integer column that was given a float
+        return [None if v != v else (int(v) if v.is_integer() else v)
+                for v in values]
+      return [None if v != v else v for v in values]  # nan is None
+    none_value = self._NoneValue(column)
+    if i in self._STRING_COLUMNS:
+      strings = self._strings
+      return [None if v == none_value else strings[v] for v in values]
+    return [None if v == none_value else v for v in values]
+
+  def BeginBulkAdd(self):
+    """Prepare for adding many rows, which are only sorted by EndBulkAdd."""
+    self._bulk_add = True
+
+  def EndBulkAdd(self):
+    self._bulk_add = False
+    self._Sort()
+
+  def AddRows(self, rows):
+    """Add rows, a list of tuples as returned by StopTime.GetSqlValuesTuple."""
+    if not rows:
+      return
+    first_row_index = len(self._columns[0])
+    try:
+      for i, values in enumerate(itertools.izip(*rows)):
+        if i in self._STRING_COLUMNS:
+          values = map(self._StringIndex, values)
+        self._ExtendColumn(i, values)
+    except:
+      # Remove the rows from the columns that were extended
+      for column in self._columns:
+        del column[first_row_index:]
+      raise
+    if not self._bulk_add:
+      trips = self._columns[self._TRIP]
+      for row_index in xrange(first_row_index, len(trips)):
+        self._tail_rows.setdefault(trips[row_index], []).append(row_index)
+    self._stop_rows = None
+
+  def _HasUnsortedRows(self):
+    return len(self._columns[0]) > self._sorted_count or self._deleted_count
+
+  def _MaybeSort(self):
+    """Sort the rows if there are many rows in the tail or deleted."""
+    unsorted_count = (len(self._columns[0]) - self._sorted_count +
+                      self._deleted_count)
+    if unsorted_count > max(self._MIN_UNSORTED_ROWS, self._sorted_count / 4):
+      self._Sort()
+
+  def _Sort(self):
+    """Sort all rows by trip and stop_sequence, removing deleted rows, and
+    update _trip_slices."""
+    if not self._HasUnsortedRows():
+      return
+    trips = self._columns[self._TRIP]
+    sequences = self._columns[self._SEQUENCE]
+    row_count = len(trips)
+    if util.numpy is not None and row_count:
+      numpy = util.numpy
+      trip_values = numpy.frombuffer(trips, dtype=trips.typecode)
+      order = numpy.lexsort(
+          (numpy.frombuffer(sequences, dtype=sequences.typecode), trip_values))
+      # Deleted rows have the smallest trip value so they are sorted first
+      order = order[self._deleted_count:]
+      if (len(order) != row_count or
+          (order[1:] - order[:-1] != 1).any()):
+        for i, column in enumerate(self._columns):
+          column_values = numpy.frombuffer(column, dtype=column.typecode)
+          self._columns[i] = array.array(column.typecode,
+                                         column_values[order].tostring())
+        trip_values = numpy.frombuffer(self._columns[self._TRIP],
+                                       dtype=trips.typecode)
+      starts = [0] + list(numpy.flatnonzero(numpy.diff(trip_values)) + 1)
+    else:
+      keys = zip(trips, sequences)
+      if self._deleted_count or any(keys[i] > keys[i + 1]
+                                    for i in xrange(row_count - 1)):
+        order = sorted(xrange(row_count), key=keys.__getitem__)
+        order = order[self._deleted_count:]
+        for i, column in enumerate(self._columns):
+          self._columns[i] = array.array(column.typecode,
+                                         [column[j] for j in order])
+      trips = self._columns[self._TRIP]
+      starts = [i for i in xrange(len(trips))
+                if i == 0 or trips[i] != trips[i - 1]]
+    trips = self._columns[self._TRIP]
+    ends = starts[1:] + [len(trips)]
+    self._trip_slices = dict((trips[start], (start, end))
+                             for start, end in zip(starts, ends)
+                             if start != end)
+    self._sorted_count = len(trips)
+    self._tail_rows = {}
+    self._deleted_count = 0
+
+  def _GetTripRowIndexes(self, trip_id):
+    """Return the indexes of the rows of the trip, ordered by stop_sequence."""
+    trip = self._string_indexes.get(trip_id)
+    if trip is None:
+      return []
+    self._MaybeSort()
+    (start, end) = self._trip_slices.get(trip, (0, 0))
+    row_indexes = xrange(start, end)
+    if not self._HasUnsortedRows():
+      return row_indexes
+    trips = self._columns[self._TRIP]
+    row_indexes = [i for i in row_indexes if trips[i] == trip]
+    tail_rows = self._tail_rows.get(trip)
+    if tail_rows:
+      row_indexes.extend(i for i in tail_rows if trips[i] == trip)
+      sequences = self._columns[self._SEQUENCE]
+      row_indexes.sort(key=sequences.__getitem__)
+    return row_indexes
+
+  def GetTripRows(self, trip_id):
+    """Return a list of rows of _TRIP_ROW_FIELD_NAMES for the trip, ordered by
+    stop_sequence."""
+    row_indexes = self._GetTripRowIndexes(trip_id)
+    return zip(*[self._GetColumnValues(i, row_indexes)
+                 for i in self._TRIP_ROW_COLUMNS])
+
+  def IterTripRows(self, trip_ids=None, field_names=_TRIP_ROW_FIELD_NAMES):
+    """Yield (trip_id, rows) for each trip that has rows, ordered by trip_id,
+    where rows is a list of tuples of field_names values ordered by
+    stop_sequence, by default the list returned by GetTripRows. If trip_ids is
+    not None only the trips in it are included. Rows must not be added or
+    deleted until the iteration is done."""
+    column_names = [name for _, name in self._COLUMNS]
+    columns = [column_names.index(name) for name in field_names]
+    self._Sort()
+    if trip_ids is None:
+      trips = self._trip_slices.keys()
+    else:
+      trips = set(self._string_indexes.get(trip_id) for trip_id in trip_ids)
+      trips = [trip for trip in trips if trip in self._trip_slices]
+    strings = self._strings
+    trips.sort(key=strings.__getitem__)
+    for trip in trips:
+      (start, end) = self._trip_slices[trip]
+      row_indexes = xrange(start, end)
+      yield strings[trip], zip(*[self._GetColumnValues(i, row_indexes)
+                                 for i in columns])
+
+  def CountTripRows(self, trip_id):
+    return len(self._GetTripRowIndexes(trip_id))
+
+  def CountRowsByTrip(self):
+    """Return a dict mapping the trip_id of each trip that has rows to its
+    number of rows."""
+    self._Sort()
+    strings = self._strings
+    return dict((strings[trip], end - start)
+                for trip, (start, end) in self._trip_slices.iteritems())
+
+  def _GetTimes(self, row_index):
+    return (self._GetColumnValues(self._ARRIVAL, [row_index])[0],
+            self._GetColumnValues(self._DEPARTURE, [row_index])[0])
+
+  def GetTripFirstTimes(self, trip_id):
+    """Return (arrival_secs, departure_secs) of the first row of the trip or
+    None if it has no rows."""
+    row_indexes = self._GetTripRowIndexes(trip_id)
+    if not row_indexes:
+      return None
+    return self._GetTimes(row_indexes[0])
+
+  def GetTripLastTimes(self, trip_id):
+    """Return (arrival_secs, departure_secs) of the last row of the trip or
+    None if it has no rows."""
+    row_indexes = self._GetTripRowIndexes(trip_id)
+    if not row_indexes:
+      return None
+    return self._GetTimes(row_indexes[-1])
+
+  def GetTripMaxima(self, trip_id):
+    """Return the greatest (stop_sequence, arrival_secs, departure_secs) of
+    the trip, each None if the trip has no value for it."""
+    maxima = []
+    row_indexes = self._GetTripRowIndexes(trip_id)
+    for i in (self._SEQUENCE, self._ARRIVAL, self._DEPARTURE):
+      values = [v for v in self._GetColumnValues(i, row_indexes)
+                if v is not None]
+      if values:
+        maxima.append(max(values))
+      else:
+        maxima.append(None)
+    return tuple(maxima)
+
+  def GetTripDuplicateSequences(self, trip_id):
+    """Return the sorted list of stop_sequence values found in more than one
+    row of the trip."""
+    # _GetTripRowIndexes can sort the rows, replacing the columns
+    row_indexes = self._GetTripRowIndexes(trip_id)
+    sequences = self._columns[self._SEQUENCE]
+    values = [sequences[i] for i in row_indexes]
+    return sorted(set(v for i, v in enumerate(values[1:]) if v == values[i]))
+
+  def _DeleteRows(self, row_indexes):
+    trips = self._columns[self._TRIP]
+    none_trip = self._NoneValue(trips)
+    for row_index in row_indexes:
+      trips[row_index] = none_trip
+    self._deleted_count += len(row_indexes)
+    self._stop_rows = None
+
+  def DeleteTripRows(self, trip_id):
+    self._DeleteRows(list(self._GetTripRowIndexes(trip_id)))
+
+  def DeleteTripRow(self, trip_id, stop_sequence, stop_id):
+    """Delete the rows of the trip with stop_sequence and stop_id and return
+    the number of rows deleted."""
+    # _GetTripRowIndexes can sort the rows, replacing the columns
+    trip_row_indexes = self._GetTripRowIndexes(trip_id)
+    sequences = self._columns[self._SEQUENCE]
+    stop = self._string_indexes.get(stop_id)
+    stops = self._columns[self._STOP]
+    row_indexes = [i for i in trip_row_indexes
+                   if sequences[i] == stop_sequence and stops[i] == stop]
+    self._DeleteRows(row_indexes)
+    return len(row_indexes)
+
+  def _GetStopRows(self, stop_id):
+    """Return the indexes of the rows of stop_id."""
+    if self._stop_rows is None:
+      self._Sort()
+      self._stop_rows = {}
+      for row_index, stop in enumerate(self._columns[self._STOP]):
+        self._stop_rows.setdefault(stop, array.array('l')).append(row_index)
+    return self._stop_rows.get(self._string_indexes.get(stop_id), ())
+
+  def GetStopVisits(self, stop_id):
+    """Return a list of (trip_id, stop_sequence) for the rows of the stop."""
+    row_indexes = self._GetStopRows(stop_id)
+    return zip(self._GetColumnValues(self._TRIP, row_indexes),
+               self._GetColumnValues(self._SEQUENCE, row_indexes))
+
+  def CountStopRows(self, stop_id):
+    return len(self._GetStopRows(stop_id))
+
+  def IterRows(self):
+    """Yield every row as a tuple of StopTime._SQL_FIELD_NAMES values."""
+    self._Sort()
+    row_count = len(self._columns[0])
+    for start in xrange(0, row_count, 10000):
+      row_indexes = xrange(start, min(start + 10000, row_count))
+      for row in zip(*[self._GetColumnValues(i, row_indexes)
+                       for i in xrange(len(self._columns))]):
+        yield row
+
+  def SaveSnapshotRows(self, cursor):
+    """Copy all rows to the stop_times table of the database attached as
+    snapshot to the connection of cursor and index it."""
+    cursor.execute(_CREATE_TABLE_SQL % 'snapshot.stop_times')
+    cursor.executemany("INSERT INTO snapshot.stop_times VALUES (%s);" %
+                       ','.join(['?'] * len(self._COLUMNS)), self.IterRows())
+    _CreateIndexes(cursor, 'snapshot.')
+
+  def LoadSnapshotRows(self, cursor):
+    """Add the rows of the stop_times table of the database attached as
+    snapshot to the connection of cursor."""
+    cursor.execute("SELECT %s FROM snapshot.stop_times;" %
+                   ','.join(name for _, name in self._COLUMNS))
+    self.BeginBulkAdd()
+    try:
+      while True:
+        rows = cursor.fetchmany(10000)
+        if not rows:
+          break
+        self.AddRows(rows)
+    finally:
+      self.EndBulkAdd()
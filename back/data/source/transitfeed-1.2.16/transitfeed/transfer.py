@@ -23,13 +23,14 @@ class Transfer(GtfsObjectBase):
   _REQUIRED_FIELD_NAMES = ['from_stop_id', 'to_stop_id', 'transfer_type']
   _FIELD_NAMES = _REQUIRED_FIELD_NAMES + ['min_transfer_time']
   _TABLE_NAME = 'transfers'
+  __slots__ = tuple(_FIELD_NAMES)
   _ID_COLUMNS = ['from_stop_id', 'to_stop_id']
 
   def __init__(self, schedule=None, from_stop_id=None, to_stop_id=None, transfer_type=None,
                min_transfer_time=None, field_dict=None):
     self._schedule = None
     if field_dict:
-      self.__dict__.update(field_dict)
+      self._SetAttributes(field_dict)
     else:
       self.from_stop_id = from_stop_id
       self.to_stop_id = to_stop_id
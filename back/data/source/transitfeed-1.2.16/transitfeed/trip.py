@@ -14,12 +14,26 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import math
 import warnings
 
 from gtfsobjectbase import GtfsObjectBase
 import problems as problems_module
 import util
 
+
+class _ProblemCountingAccumulator(problems_module.ProblemAccumulatorInterface):
+  """Counts the problems found while creating StopTime objects without creating
+  the exceptions."""
+
+  def __init__(self):
+    self.count = 0
+
+  def _IsReported(self, exception_class, type):
+    self.count += 1
+    return False
+
+
 class Trip(GtfsObjectBase):
   _REQUIRED_FIELD_NAMES = ['route_id', 'service_id', 'trip_id']
   _FIELD_NAMES = _REQUIRED_FIELD_NAMES + [
@@ -27,6 +41,7 @@ class Trip(GtfsObjectBase):
     'bikes_allowed', 'wheelchair_accessible', 'original_trip_id'
     ]
   _TABLE_NAME= "trips"
+  __slots__ = tuple(_FIELD_NAMES) + ('_headways',)
 
   def __init__(self, headsign=None, service_period=None,
                route=None, trip_id=None, field_dict=None):
@@ -50,7 +65,20 @@ class Trip(GtfsObjectBase):
       if service_period is not None:
         # For backwards compatibility
         self.service_id = service_period.service_id
-    self.__dict__.update(field_dict)
+    self._SetAttributes(field_dict)
+
+  _FIELD_DICT_INIT = __init__
+
+  def __setattr__(self, name, value):
+    """Set an attribute and let the schedule update its trip indexes."""
+    super(Trip, self).__setattr__(name, value)
+    if name[0] != '_' and self._schedule:
+      self._schedule._TripAttributeChanged(self, name)
+
+  def __delattr__(self, name):
+    super(Trip, self).__delattr__(name)
+    if name[0] != '_' and self._schedule:
+      self._schedule._TripAttributeChanged(self, name)
 
   def GetFieldValuesTuple(self):
     return [getattr(self, fn) or '' for fn in self._FIELD_NAMES]
@@ -78,14 +106,9 @@ class Trip(GtfsObjectBase):
 
     The trip isn't checked for duplicate sequence numbers so it must be
     validated later."""
-    stop_time_class = self.GetGtfsFactory().StopTime
-    cursor = schedule._connection.cursor()
-    insert_query = "INSERT INTO stop_times (%s) VALUES (%s);" % (
-       ','.join(stop_time_class._SQL_FIELD_NAMES),
-       ','.join(['?'] * len(stop_time_class._SQL_FIELD_NAMES)))
-    cursor = schedule._connection.cursor()
-    cursor.execute(
-        insert_query, stoptime.GetSqlValuesTuple(self.trip_id))
+    schedule._StopTimesChanged(self.trip_id)
+    schedule._stop_time_store.AddRows(
+        [stoptime.GetSqlValuesTuple(self.trip_id)])
 
   def ReplaceStopTimeObject(self, stoptime, schedule=None):
     """Replace a StopTime object from this trip with the given one.
@@ -98,11 +121,10 @@ class Trip(GtfsObjectBase):
       schedule = self._schedule
 
     new_secs = stoptime.GetTimeSecs()
-    cursor = schedule._connection.cursor()
-    cursor.execute("DELETE FROM stop_times WHERE trip_id=? and "
-                   "stop_sequence=? and stop_id=?",
-                   (self.trip_id, stoptime.stop_sequence, stoptime.stop_id))
-    if cursor.rowcount == 0:
+    schedule._StopTimesChanged(self.trip_id)
+    deleted_count = schedule._stop_time_store.DeleteTripRow(
+        self.trip_id, stoptime.stop_sequence, stoptime.stop_id)
+    if deleted_count == 0:
       raise problems_module.Error, 'Attempted replacement of StopTime object which does not exist'
     self._AddStopTimeObjectUnordered(stoptime, schedule)
 
@@ -128,11 +150,7 @@ class Trip(GtfsObjectBase):
       problems = schedule.problem_reporter
 
     new_secs = stoptime.GetTimeSecs()
-    cursor = schedule._connection.cursor()
-    cursor.execute("SELECT max(stop_sequence), max(arrival_secs), "
-                   "max(departure_secs) FROM stop_times WHERE trip_id=?",
-                   (self.trip_id,))
-    row = cursor.fetchone()
+    row = schedule._stop_time_store.GetTripMaxima(self.trip_id)
     if row[0] is None:
       # This is the first stop_time of the trip
       stoptime.stop_sequence = 1
@@ -161,24 +179,26 @@ class Trip(GtfsObjectBase):
 
   def GetCountStopTimes(self):
     """Return the number of stops made by this trip."""
-    cursor = self._schedule._connection.cursor()
-    cursor.execute(
-        'SELECT count(*) FROM stop_times WHERE trip_id=?', (self.trip_id,))
-    return cursor.fetchone()[0]
+    return self._schedule._GetTripSummary(self.trip_id).count
 
-  def GetTimeInterpolatedStops(self):
+  def GetTimeInterpolatedStops(self, stoptimes=None):
     """Return a list of (secs, stoptime, is_timepoint) tuples.
 
     secs will always be an int. If the StopTime object does not have explict
     times this method guesses using distance. stoptime is a StopTime object and
     is_timepoint is a bool.
 
+    Args:
+      stoptimes: the StopTime objects of this trip, such as those yielded by
+        Schedule.IterStopTimesByTrip, or None to use GetStopTimes()
+
     Raises:
       ValueError if this trip does not have the times needed to interpolate
     """
     rv = []
 
-    stoptimes = self.GetStopTimes()
+    if stoptimes is None:
+      stoptimes = self.GetStopTimes()
     # If there are no stoptimes [] is the correct return value but if the start
     # or end are missing times there is no correct return value.
     if not stoptimes:
@@ -220,27 +240,65 @@ class Trip(GtfsObjectBase):
     StopTime objects previously returned by GetStopTimes are unchanged but are
     no longer associated with this trip.
     """
-    cursor = self._schedule._connection.cursor()
-    cursor.execute('DELETE FROM stop_times WHERE trip_id=?', (self.trip_id,))
+    self._schedule._StopTimesChanged(self.trip_id)
+    self._schedule._stop_time_store.DeleteTripRows(self.trip_id)
 
   def GetStopTimes(self, problems=None):
-    """Return a sorted list of StopTime objects for this trip."""
+    """Return a sorted list of StopTime objects for this trip.
+
+    The stored rows of the trips read most recently are cached by the
+    schedule and new StopTime objects are made from them on every call, so
+    changing the returned objects doesn't change the trip. Use
+    ReplaceStopTimeObject to change a stop time.
+    """
     # In theory problems=None should be safe because data from database has been
     # validated. See comment in _LoadStopTimes for why this isn't always true.
-    cursor = self._schedule._connection.cursor()
-    cursor.execute(
-        'SELECT arrival_secs,departure_secs,stop_headsign,pickup_type,'
-        'drop_off_type,shape_dist_traveled,stop_id,stop_sequence,timepoint '
-        'FROM stop_times '
-        'WHERE trip_id=? '
-        'ORDER BY stop_sequence', (self.trip_id,))
-    stop_times = []
-    stoptime_class = self.GetGtfsFactory().StopTime
     if problems is None:
       # TODO: delete this branch when StopTime.__init__ doesn't need a
       # ProblemReporter
       problems = problems_module.default_problem_reporter
-    for row in cursor.fetchall():
+    schedule = self._schedule
+    rows = schedule._stop_times_cache.Get(self.trip_id)
+    if rows is None:
+      rows = schedule._stop_time_store.GetTripRows(self.trip_id)
+      stop_times = self._CreateStopTimes(rows, problems)
+      # Only cache the rows of trusted trips, so that the problems of the
+      # others are reported on every call as before
+      if self.trip_id in schedule._trusted_stop_time_trip_ids:
+        schedule._stop_times_cache.Set(self.trip_id, tuple(rows), len(rows))
+      return stop_times
+    return self._CreateStopTimes(rows, problems)
+
+  def _CreateStopTimes(self, rows, problems):
+    """Return a list of new StopTime objects for rows, as returned by
+    GetTripRows of the stop_times store, reporting problems found in their
+    values to problems.
+
+    Once the rows of this trip have made StopTime objects without a problem
+    the trip_id is added to the trusted trips of the schedule. Until its
+    stop_times change the objects are then made by StopTime._FromStoredRow,
+    which skips the checks of StopTime.__init__.
+    """
+    schedule = self._schedule
+    stoptime_class = self.GetGtfsFactory().StopTime
+    if self.trip_id in schedule._trusted_stop_time_trip_ids:
+      stops = schedule.stops
+      from_stored_row = stoptime_class._FromStoredRow
+      return [from_stored_row(stops[row[6]], row) for row in rows]
+
+    counter = _ProblemCountingAccumulator()
+    stop_times = self._CheckStopTimes(
+        rows, problems_module.ProblemReporter(counter), stoptime_class)
+    if counter.count:
+      return self._CheckStopTimes(rows, problems, stoptime_class)
+    schedule._trusted_stop_time_trip_ids.add(self.trip_id)
+    return stop_times
+
+  def _CheckStopTimes(self, rows, problems, stoptime_class):
+    """Return a list of StopTime objects made by stoptime_class.__init__ for
+    rows, see _CreateStopTimes."""
+    stop_times = []
+    for row in rows:
       stop = self._schedule.GetStop(row[6])
       stop_times.append(stoptime_class(problems=problems,
                                        stop=stop,
@@ -302,11 +360,13 @@ class Trip(GtfsObjectBase):
   def GetStartTime(self, problems=problems_module.default_problem_reporter):
     """Return the first time of the trip. TODO: For trips defined by frequency
     return the first time of the first trip."""
-    cursor = self._schedule._connection.cursor()
-    cursor.execute(
-        'SELECT arrival_secs,departure_secs FROM stop_times WHERE '
-        'trip_id=? ORDER BY stop_sequence LIMIT 1', (self.trip_id,))
-    (arrival_secs, departure_secs) = cursor.fetchone()
+    return self._GetStartTimeFromTimes(
+        self._schedule._GetTripSummary(self.trip_id).first_times, problems)
+
+  def _GetStartTimeFromTimes(self, first_times, problems):
+    """Return GetStartTime() given the (arrival_secs, departure_secs) of the
+    first stop time."""
+    (arrival_secs, departure_secs) = first_times
     if arrival_secs != None:
       return arrival_secs
     elif departure_secs != None:
@@ -341,14 +401,26 @@ class Trip(GtfsObjectBase):
         run_secs += headway_secs
     return start_times
 
+  def GetCountFrequencyStartTimes(self):
+    """Return the number of headway-based runs, the length of
+    GetFrequencyStartTimes() without making the list."""
+    count = 0
+    for freq_tuple in self.GetFrequencyTuples():
+      (start_secs, end_secs, headway_secs) = freq_tuple[0:3]
+      if end_secs > start_secs:
+        count += int(math.ceil(float(end_secs - start_secs) / headway_secs))
+    return count
+
   def GetEndTime(self, problems=problems_module.default_problem_reporter):
     """Return the last time of the trip. TODO: For trips defined by frequency
     return the last time of the last trip."""
-    cursor = self._schedule._connection.cursor()
-    cursor.execute(
-        'SELECT arrival_secs,departure_secs FROM stop_times WHERE '
-        'trip_id=? ORDER BY stop_sequence DESC LIMIT 1', (self.trip_id,))
-    (arrival_secs, departure_secs) = cursor.fetchone()
+    return self._GetEndTimeFromTimes(
+        self._schedule._GetTripSummary(self.trip_id).last_times, problems)
+
+  def _GetEndTimeFromTimes(self, last_times, problems):
+    """Return GetEndTime() given the (arrival_secs, departure_secs) of the
+    last stop time."""
+    (arrival_secs, departure_secs) = last_times
     if departure_secs != None:
       return departure_secs
     elif arrival_secs != None:
@@ -372,8 +444,7 @@ class Trip(GtfsObjectBase):
 
   def GetPattern(self):
     """Return a tuple of Stop objects, in the order visited"""
-    stoptimes = self.GetStopTimes()
-    return tuple(st.stop for st in stoptimes)
+    return self._schedule.GetPattern(self.pattern_id)
 
   def AddHeadwayPeriodObject(self, headway_period, problem_reporter):
     """Deprecated. Please use AddFrequencyObject instead."""
@@ -488,26 +559,28 @@ class Trip(GtfsObjectBase):
   def GetFrequencyTuples(self):
     return self._headways
 
-  def __getattr__(self, name):
+  def _GetDefaultAttribute(self, name):
     if name == 'service_period':
       assert self._schedule, "Must be in a schedule to get service_period"
       return self._schedule.GetServicePeriod(self.service_id)
     elif name == 'pattern_id':
-      if '_pattern_id' not in self.__dict__:
-        self.__dict__['_pattern_id'] = hash(self.GetPattern())
-      return self.__dict__['_pattern_id']
+      # Trips visiting the same stops in the same order have the same
+      # pattern_id, an int registered by the schedule
+      assert self._schedule, "Must be in a schedule to get pattern_id"
+      return self._schedule._GetTripSummary(self.trip_id).pattern_id
     else:
-      return GtfsObjectBase.__getattr__(self, name)
+      return GtfsObjectBase._GetDefaultAttribute(self, name)
 
   def ValidateRouteId(self, problems):
     if util.IsEmpty(self.route_id):
       problems.MissingValue('route_id')
 
   def ValidateServicePeriod(self, problems):
-    if 'service_period' in self.__dict__:
+    service_period = self._GetSetAttribute('service_period')
+    if service_period is not None:
       # Some tests assign to the service_period attribute. Patch up self before
       # proceeding with validation. See also comment in Trip.__init__.
-      self.service_id = self.__dict__['service_period'].service_id
+      self.service_id = service_period.service_id
       del self.service_period
     if util.IsEmpty(self.service_id):
       problems.MissingValue('service_id')
@@ -572,13 +645,9 @@ class Trip(GtfsObjectBase):
       self.ValidateChildren(problems)
 
   def ValidateNoDuplicateStopSequences(self, problems):
-    cursor = self._schedule._connection.cursor()
-    cursor.execute("SELECT COUNT(stop_sequence) AS a, stop_sequence "
-                   "FROM stop_times "
-                   "WHERE trip_id=? GROUP BY stop_sequence HAVING a > 1",
-                   (self.trip_id,))
-    for row in cursor:
-      problems.InvalidValue('stop_sequence', row[1],
+    store = self._schedule._stop_time_store
+    for stop_sequence in store.GetTripDuplicateSequences(self.trip_id):
+      problems.InvalidValue('stop_sequence', stop_sequence,
                             'Duplicate stop_sequence in trip_id %s' %
                             self.trip_id)
 
@@ -693,13 +762,22 @@ class Trip(GtfsObjectBase):
                                 (self._HeadwayOutputTuple(headway),
                                  self._HeadwayOutputTuple(other)))
 
-  def ValidateChildren(self, problems):
-    """Validate StopTimes and headways of this trip."""
+  def ValidateChildren(self, problems, stoptimes=None):
+    """Validate StopTimes and headways of this trip.
+
+    Args:
+      problems: a ProblemReporter
+      stoptimes: the StopTime objects of this trip, such as those yielded by
+        Schedule.IterStopTimesByTrip, or None to use GetStopTimes(problems)
+    """
     assert self._schedule, "Trip must be in a schedule to ValidateChildren"
     # TODO: validate distance values in stop times (if applicable)
 
     self.ValidateNoDuplicateStopSequences(problems)
-    stoptimes = self.GetStopTimes(problems)
+    if stoptimes is None:
+      stoptimes = self.GetStopTimes(problems)
+    else:
+      stoptimes = list(stoptimes)
     stoptimes.sort(key=lambda x: x.stop_sequence)
     self.ValidateTripStartAndEndTimes(problems, stoptimes)
     self.ValidateStopTimesSequenceHasIncreasingTimeAndDistance(problems,
@@ -15,6 +15,7 @@
 # limitations under the License.
 
 import codecs
+import collections
 import csv
 import datetime
 import math
@@ -25,6 +26,10 @@ import socket
 import sys
 import time
 import urllib2
+try:
+  import numpy
+except ImportError:
+  numpy = None
 
 import problems as problems_module
 from trip import Trip
@@ -453,17 +458,81 @@ def FindUniqueId(dic):
     name = str(random.randint(1000000, 999999999))
   return name
 
+_TIME_RE = re.compile(r'(\d{1,3}):([0-5]\d):([0-5]\d)$')
+
 def TimeToSecondsSinceMidnight(time_string):
   """Convert HHH:MM:SS into seconds since midnight.
 
   For example "01:02:03" returns 3723. The leading zero of the hours may be
   omitted. HH may be more than 23 if the time is on the following day."""
-  m = re.match(r'(\d{1,3}):([0-5]\d):([0-5]\d)$', time_string)
+  m = _TIME_RE.match(time_string)
   # ignored: matching for leap seconds
   if not m:
     raise problems_module.Error, 'Bad HH:MM:SS "%s"' % time_string
   return int(m.group(1)) * 3600 + int(m.group(2)) * 60 + int(m.group(3))
 
+# Below this many new strings converting them with numpy doesn't pay off
+_NUMPY_MIN_TIMES = 1000
+
+def TimesToSecondsSinceMidnight(time_strings, memo=None):
+  """Convert a list of HHH:MM:SS strings into seconds since midnight.
+
+  Returns a list with the seconds since midnight of each string, or None for
+  a string that is empty, None or not a valid time so that the caller can
+  report it with TimeToSecondsSinceMidnight. Each distinct string is only
+  parsed once. memo is an optional dict from string to seconds, or None for
+  an invalid string, that is shared between calls.
+
+  When numpy is available and there are many distinct strings, those in the
+  common "HH:MM:SS" form are converted by array operations.
+  """
+  if memo is None:
+    memo = {}
+  new_strings = [s for s in set(time_strings) if s and s not in memo]
+  if numpy is not None and len(new_strings) >= _NUMPY_MIN_TIMES:
+    secs = _NumpyTimesToSecondsSinceMidnight(new_strings)
+    for time_string, time_secs in zip(new_strings, secs):
+      if time_secs is not None:
+        memo[time_string] = time_secs
+  for time_string in new_strings:
+    if time_string not in memo:
+      try:
+        memo[time_string] = TimeToSecondsSinceMidnight(time_string)
+      except problems_module.Error:
+        memo[time_string] = None
+  return map(memo.get, time_strings)
+
+def _NumpyTimesToSecondsSinceMidnight(time_strings):
+  """Convert the "HH:MM:SS" strings in time_strings with numpy.
+
+  Returns a list with the seconds for each string in this form and None for
+  the others."""
+  values = numpy.array(time_strings)
+  if values.dtype.kind == 'U':
+    code_type = numpy.uint32
+  elif values.dtype.kind == 'S':
+    code_type = numpy.uint8
+  else:  # A mix of str and unicode
+    return [None] * len(time_strings)
+  width = values.dtype.itemsize / numpy.dtype(code_type).itemsize
+  if width < 8:
+    return [None] * len(time_strings)
+
+  codes = values.view(code_type).reshape(len(values), width).astype(numpy.int32)
+  digits = codes[:, [0, 1, 3, 4, 6, 7]] - ord('0')
+  valid = ((digits >= 0) & (digits <= 9)).all(axis=1)
+  valid &= (codes[:, 2] == ord(':')) & (codes[:, 5] == ord(':'))
+  valid &= (digits[:, 2] <= 5) & (digits[:, 4] <= 5)
+  if width > 8:
+    valid &= codes[:, 8] == 0  # Longer strings are padded with zeros
+  secs = ((digits[:, 0] * 10 + digits[:, 1]) * 3600 +
+          (digits[:, 2] * 10 + digits[:, 3]) * 60 +
+          digits[:, 4] * 10 + digits[:, 5])
+  result = secs.tolist()
+  for i in numpy.flatnonzero(~valid).tolist():
+    result[i] = None
+  return result
+
 def FormatSecondsSinceMidnight(s):
   """Formats an int number of seconds past midnight into a string
   as "HH:MM:SS"."""
@@ -614,6 +683,20 @@ class EndOfLineChecker:
       self._FinalCheck()
       raise
 
+    next_line_contents = self._CheckLine(next_line)
+    if next_line[-1:] not in ("\x0a", "\x0d"):
+      # Should only happen at the end of the file
+      try:
+        self._f.next()
+        raise RuntimeError("Unexpected row without new line sequence")
+      except StopIteration:
+        # Will be raised again when EndOfLineChecker.next() is next called
+        pass
+    return next_line_contents
+
+  def _CheckLine(self, next_line):
+    """Check the end of line and contents of the next line and return it
+    without end of line marker."""
     self._line_number += 1
     m_eol = re.search(r"[\x0a\x0d]*$", next_line)
     if m_eol.group() == "\x0d\x0a":
@@ -624,15 +707,7 @@ class EndOfLineChecker:
       self._lf += 1
       if self._lf <= 5:
         self._lf_examples.append(self._line_number)
-    elif m_eol.group() == "":
-      # Should only happen at the end of the file
-      try:
-        self._f.next()
-        raise RuntimeError("Unexpected row without new line sequence")
-      except StopIteration:
-        # Will be raised again when EndOfLineChecker.next() is next called
-        pass
-    else:
+    elif m_eol.group() != "":
       self._problems.InvalidLineEnd(
         codecs.getencoder('string_escape')(m_eol.group())[0],
         (self._name, self._line_number))
@@ -668,6 +743,181 @@ class EndOfLineChecker:
       self._lf = 0
 
 
+class BulkEndOfLineChecker(EndOfLineChecker):
+  """EndOfLineChecker for text that is read in large buffers, such as the
+  contents of a file or the chunks of a file that is streamed.
+
+  Each buffer is checked with a few passes of str methods instead of a regular
+  expression and several find calls per line. Only buffers with carriage
+  returns that aren't part of a CR LF are checked a line at a time. The same
+  problems as EndOfLineChecker are reported, when the line they were found in
+  is returned.
+  """
+  _CRLF_RE = re.compile(r"\x0d\x0a")
+  _LF_RE = re.compile(r"(?<!\x0d)\x0a")
+  # Larger strings are split in slices of this many bytes, so that only the
+  # lines of one slice are held at once
+  _BUFFER_SIZE = 1 << 20
+
+  def __init__(self, chunks, name, problems):
+    """Create new object.
+
+    Args:
+      chunks: iterable of strings, which joined are the checked text
+      name: name to use for the text in problems
+      problems: a ProblemReporterBase object
+    """
+    EndOfLineChecker.__init__(self, None, name, problems)
+    self._lines = self._IterLines(chunks)
+
+  def next(self):
+    """Return next line without end of line marker or raise StopIteration."""
+    return self._lines.next()
+
+  def _IterLines(self, chunks):
+    partial_line = ''
+    buffer_size = self._BUFFER_SIZE
+    for chunk in chunks:
+      for start in xrange(0, len(chunk), buffer_size):
+        data = chunk[start:start + buffer_size]
+        if partial_line:
+          data = partial_line + data
+        end = data.rfind("\x0a") + 1
+        partial_line = data[end:]
+        if end:
+          for line in self._IterBufferLines(data[:end]):
+            yield line
+    if partial_line:
+      yield self._CheckLine(partial_line)
+    self._FinalCheck()
+
+  def _IterBufferLines(self, data):
+    """Yield the lines of data, which ends with a LF, without end of line
+    marker."""
+    line_count = data.count("\x0a")
+    crlf_count = data.count("\x0d\x0a")
+    if data.count("\x0d") != crlf_count:
+      for line in data.split("\x0a")[:-1]:
+        yield self._CheckLine(line + "\x0a")
+      return
+
+    first_line_number = self._line_number + 1
+    if crlf_count == line_count:
+      lines = data[:-2].split("\x0d\x0a")
+    elif crlf_count:
+      lines = data.replace("\x0d\x0a", "\x0a")[:-1].split("\x0a")
+    else:
+      lines = data[:-1].split("\x0a")
+    self._crlf = self._AddLineEndExamples(
+        data, first_line_number, self._CRLF_RE, crlf_count, self._crlf,
+        self._crlf_examples)
+    self._lf = self._AddLineEndExamples(
+        data, first_line_number, self._LF_RE, line_count - crlf_count,
+        self._lf, self._lf_examples)
+    self._line_number += line_count
+
+    # Map from line number to the names of the separators found in the line.
+    # Every CR in data is part of a line end so it isn't searched for.
+    separators = {}
+    for seq, name in INVALID_LINE_SEPARATOR_UTF8.items():
+      if seq == "\x0d":
+        continue
+      index = data.find(seq)
+      line_number = first_line_number
+      line_start = 0
+      while index != -1:
+        line_number += data.count("\x0a", line_start, index)
+        separators.setdefault(line_number, []).append(name)
+        line_start = data.find("\x0a", index) + 1
+        line_number += 1
+        index = data.find(seq, line_start)
+
+    if not separators:
+      for line in lines:
+        yield line
+      return
+    for line_number, line in enumerate(lines, first_line_number):
+      for name in separators.get(line_number, ()):
+        self._problems.OtherProblem(
+          "Line contains %s" % name,
+          context=(self._name, line_number))
+      yield line
+
+  def _AddLineEndExamples(self, data, first_line_number, line_end_re,
+                          line_end_count, count, examples):
+    """Add the numbers of the first lines of data that end with line_end_re to
+    examples, up to 5 examples in total, and return count + line_end_count."""
+    if line_end_count and count < 5:
+      line_number = first_line_number
+      line_start = 0
+      for m in line_end_re.finditer(data):
+        line_number += data.count("\x0a", line_start, m.start())
+        examples.append(line_number)
+        if len(examples) == 5:
+          break
+        line_start = m.end()
+        line_number += 1
+    return count + line_end_count
+
+
+class LruCache(object):
+  """A dict-like cache that keeps the values most recently used while the sum
+  of their weights stays within max_weight.
+
+  Each value has a weight, such as the number of objects it holds, so that the
+  bound approximates the memory used by the cache. A max_weight of 0 disables
+  the cache.
+  """
+
+  def __init__(self, max_weight):
+    self._max_weight = max_weight
+    self._weight = 0
+    # Map from key to (value, weight), least recently used first
+    self._entries = collections.OrderedDict()
+
+  def __len__(self):
+    return len(self._entries)
+
+  def __contains__(self, key):
+    return key in self._entries
+
+  def Get(self, key, default=None):
+    """Return the value of key and mark it as the most recently used, or
+    default if key is not in the cache."""
+    entry = self._entries.pop(key, None)
+    if entry is None:
+      return default
+    self._entries[key] = entry
+    return entry[0]
+
+  def Set(self, key, value, weight=1):
+    """Add or replace the value of key, evicting the least recently used values
+    until the total weight is at most max_weight. A value heavier than
+    max_weight is not cached."""
+    self.Pop(key)
+    if weight > self._max_weight:
+      return
+    self._entries[key] = (value, weight)
+    self._weight += weight
+    while self._weight > self._max_weight:
+      _, (_, evicted_weight) = self._entries.popitem(last=False)
+      self._weight -= evicted_weight
+
+  def Pop(self, key):
+    """Remove key from the cache if it is there."""
+    entry = self._entries.pop(key, None)
+    if entry is not None:
+      self._weight -= entry[1]
+
+  def Clear(self):
+    self._entries.clear()
+    self._weight = 0
+
+  def GetWeight(self):
+    """Return the sum of the weights of the cached values."""
+    return self._weight
+
+
 class ISO639(object):
   # Set of all the 2-letter ISO 639-1 language codes.
   codes_2letter = set([